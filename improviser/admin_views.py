@@ -4,11 +4,39 @@ from flask_admin.contrib.sqla import ModelView
 from flask_login import current_user
 from flask_security import utils
 from markupsafe import Markup
-from database import Riff
+from database import db, Riff
+from chord_transpositions import CHORD_COLUMNS, fill_chord_transpositions
+from quick_search import escape_like, search_condition
+from render_queue import enqueue_render_job, PRIORITY_ADMIN
 from sqlalchemy import String
 from wtforms import PasswordField, TextAreaField
 
 
+class QuickSearchModelView(ModelView):
+    """ModelView that searches the column_searchable_list with quick_search.py, so the search uses the indexes."""
+
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        if any(path for field, path in self._search_fields):
+            # searching on columns of related models needs the joins of Flask-Admin
+            return super()._apply_search(query, count_query, joins, count_joins, search)
+        columns = [field for field, path in self._search_fields]
+        for term in search.split(" "):
+            # Flask-Admin search syntax: ^term for a prefix and =term for an exact match
+            if term.startswith("^"):
+                term, pattern = term[1:], escape_like(term[1:]) + "%"
+            elif term.startswith("="):
+                term, pattern = term[1:], escape_like(term[1:])
+            else:
+                pattern = None
+            if not term:
+                continue
+            condition = search_condition(columns, term, pattern)
+            query = query.filter(condition)
+            if count_query is not None:
+                count_query = count_query.filter(condition)
+        return query, count_query, joins, count_joins
+
+
 class UserAdminView(ModelView):
     # Don't display the password on the list of Users
     column_exclude_list = list = ("password",)
@@ -94,7 +122,7 @@ class InstrumentAdminView(ModelView):
             return False
 
 
-class RiffAdminView(ModelView):
+class RiffAdminView(QuickSearchModelView):
     Riff.image = String
     column_list = [
         "id",
@@ -113,6 +141,7 @@ class RiffAdminView(ModelView):
     column_default_sort = ("created_at", True)
     column_filters = ("render_valid", "number_of_bars", "chord")
     column_searchable_list = ("id", "name", "chord", "notes", "number_of_bars")
+    form_excluded_columns = ("search_vector", "user")
     can_set_page_size = True
 
     def is_accessible(self):
@@ -124,6 +153,17 @@ class RiffAdminView(ModelView):
         except:
             return False
 
+    def on_model_change(self, form, model, is_created):
+        if is_created or any(getattr(form, column).object_data != getattr(model, column)
+                             for column in ("notes", "chord_info") if hasattr(form, column)):
+            # new riffs only get their id on flush
+            self.session.flush()
+            enqueue_render_job(model.id)
+        if is_created or any(getattr(form, column).object_data != getattr(model, column)
+                             for column in CHORD_COLUMNS if hasattr(form, column)):
+            self.session.flush()
+            fill_chord_transpositions(model)
+
     @action("render", "Render", "Are you sure you want to re-render selected riffs?")
     def action_approve(self, ids):
         try:
@@ -131,7 +171,10 @@ class RiffAdminView(ModelView):
             count = 0
             for riff in query.all():
                 riff.render_valid = False
-                flash("{} render of riffs successfully rescheduled.".format(count))
+                enqueue_render_job(riff.id, priority=PRIORITY_ADMIN)
+                count += 1
+            db.session.commit()
+            flash("{} render of riffs successfully rescheduled.".format(count))
         except Exception as error:
             if not self.handle_view_exception(error):
                 flash("Failed to schedule re-render riff. {error}".format(error=str(error)))
@@ -142,7 +185,7 @@ class RiffAdminView(ModelView):
     column_formatters = {"image": _list_thumbnail}
 
 
-class RiffExerciseAdminView(ModelView):
+class RiffExerciseAdminView(QuickSearchModelView):
     column_list = [
         "id",
         "name",
@@ -158,6 +201,7 @@ class RiffExerciseAdminView(ModelView):
     ]
     column_default_sort = ("created_at", True)
     column_searchable_list = ("id", "name", "created_by")
+    form_excluded_columns = ("search_vector",)
     can_set_page_size = True
     form_overrides = dict(description_nl=TextAreaField)
 
@@ -171,7 +215,7 @@ class RiffExerciseAdminView(ModelView):
             return False
 
 
-class RiffExerciseItemAdminView(ModelView):
+class RiffExerciseItemAdminView(QuickSearchModelView):
     column_list = [
         "id",
         "riff_exercise_id",
@@ -198,7 +242,7 @@ class RiffExerciseItemAdminView(ModelView):
             return False
 
 
-class BackingTrackAdminView(ModelView):
+class BackingTrackAdminView(QuickSearchModelView):
     column_list = [
         "id",
         "name",
@@ -0,0 +1,86 @@
+"""
+The `fields` query parameter: sparse fieldsets, the fields that are selected and serialized.
+
+`fields=name,chord` only loads those columns (load_only, the other columns are deferred) and only serializes those
+fields, the id is always part of the response. Fields of nested objects are selected with a dotted name, e.g.
+`fields=name,riffs.name,riffs.chord` on an exercise. Endpoints have a default fieldset: list views leave out their
+large fields, e.g. the image_info of riffs, a client that needs them asks for them.
+"""
+from apis.includes import INCLUDE_FIELDS
+from flask_restx import abort, fields
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+
+
+def known(marshaller, name):
+    key, _, nested_name = name.partition(".")
+    field = marshaller.get(key)
+    if field is None:
+        return False
+    if not nested_name:
+        return True
+    return isinstance(field, fields.Nested) and known(field.nested, nested_name)
+
+
+def parse_fields(marshaller, value, default=None):
+    """
+    The field names of a comma separated `value`, `default` when it's not given, None for all fields. Aborts on names
+    that aren't fields of the marshaller.
+    """
+    if value is None:
+        return default
+    names = tuple(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in names if not known(marshaller, name)]
+    if unknown:
+        abort(400, f"Unknown field: {', '.join(unknown)}")
+    return names
+
+
+def selected(names, key):
+    """Whether the field is in the fieldset, itself or with some of its nested fields."""
+    return names is None or key == "id" or any(name.partition(".")[0] == key for name in names)
+
+
+def nested_names(names, key):
+    """The fieldset of a nested field: None (all fields) unless only some of its fields are selected."""
+    if names is None or key in names:
+        return None
+    return tuple(name.partition(".")[2] for name in names if name.partition(".")[0] == key) or None
+
+
+def fieldset(marshaller, names):
+    """The marshaller trimmed to a fieldset."""
+    if names is None:
+        return marshaller
+    result = {}
+    for key, field in marshaller.items():
+        if not selected(names, key):
+            continue
+        nested = nested_names(names, key)
+        if nested is not None:
+            field = fields.Nested(
+                fieldset(field.nested, nested),
+                allow_null=field.allow_null,
+                skip_none=field.skip_none,
+                as_list=field.as_list,
+                attribute=field.attribute,
+            )
+        result[key] = field
+    return result
+
+
+def fieldset_options(model, names, required=()):
+    """
+    Loader options that only load the columns of a fieldset and the `required` columns that the endpoint uses, e.g.
+    the sort column for the cursor. No options for all fields.
+    """
+    if names is None:
+        return []
+    columns = inspect(model).column_attrs.keys()
+    keys = [key for key in dict.fromkeys(("id",) + tuple(names) + tuple(required)) if key in columns]
+    return [load_only(*[getattr(model, key) for key in keys])]
+
+
+def fieldset_include(include, names):
+    """The includes of which a field is in the fieldset: relations that aren't serialized aren't loaded either."""
+    return tuple(name for name in include if any(selected(names, field) for field in INCLUDE_FIELDS[name]))
@@ -0,0 +1,154 @@
+"""
+Compiler for the react-admin `filter` query parameter of the list endpoints.
+
+A filter like {"name": "bebop", "number_of_bars_gte": 2, "is_public": true} is parsed as JSON and compiled into
+SQLAlchemy criteria with bind parameters. The compiled plan only depends on the shape of the filter (the keys and the
+kind of their values), so it's cached per model and shape and the values are bound per request. Columns are validated
+against the columns of the model: relationships, private attributes and secrets can't be filtered on.
+
+Supported keys:
+- <column>: a case insensitive substring match, or IS for booleans
+- <column>_gt, _gte, _lt, _lte, _ne: comparisons
+- id: an exact match, or a list of ids (react-admin GET_MANY)
+- q: a quick search on the quick search columns of the endpoint, see quick_search.py
+- tags: rows with any of the tags, a tag name or a list of them, see tag_filter.py
+- tags_all: rows with all of the tags
+"""
+import functools
+import json
+from typing import Dict, List, Optional
+
+import structlog
+from database import User
+from flask_restx import abort
+from quick_search import search_condition
+from sqlalchemy import Enum, String, bindparam, cast
+from tag_filter import tag_condition
+
+logger = structlog.get_logger(__name__)
+
+OPERATORS = {
+    "_gte": lambda column, value: column >= value,
+    "_gt": lambda column, value: column > value,
+    "_lte": lambda column, value: column <= value,
+    "_lt": lambda column, value: column < value,
+    "_ne": lambda column, value: column != value,
+}
+
+TAG_KEYS = ("tags", "tags_all")
+
+# Columns that are never filterable, per table
+SECRET_COLUMNS = {User.__tablename__: {"password", "quick_token", "quick_token_created_at", "fs_uniquifier"}}
+
+
+def parse_filter(value: str) -> Optional[Dict]:
+    """
+    Parse the filter query parameter: JSON as sent by react-admin. Filters with single quoted strings, as sent by
+    older clients, are accepted too. Returns None when the filter can't be parsed.
+    """
+    for candidate in (value, value.replace("'", '"')):
+        try:
+            filter = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(filter, dict):
+            return filter
+    return None
+
+
+def filterable_columns(model):
+    """The whitelist of columns of a model that can be used in a filter."""
+    table = model.__table__
+    return {column.key for column in table.columns} - SECRET_COLUMNS.get(table.name, set())
+
+
+def column_of(model, name):
+    if name not in filterable_columns(model):
+        abort(400, f"Unknown filter column: {name}")
+    return getattr(model, name)
+
+
+def value_kind(value):
+    if isinstance(value, list):
+        return "list"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "none"
+    return "value"
+
+
+def filter_shape(filters: Dict):
+    return tuple(sorted((key, value_kind(value)) for key, value in filters.items()))
+
+
+def same(value):
+    return value
+
+
+def contains(value):
+    return f"%{value}%"
+
+
+def filter_quick_search(columns, query, value):
+    return query.filter(search_condition(columns, str(value)))
+
+
+def filter_tags(model, match_all, query, value):
+    return query.filter(tag_condition(model, value, match_all))
+
+
+@functools.lru_cache(maxsize=256)
+def compile_filter(model, shape, quick_search_columns):
+    """
+    Compile a filter shape into a plan: a list of (key, criterion, bind) with the criterion using a bind parameter
+    named "filter_<key>" and `bind` turning the value of the filter into the bound value, or None when the criterion
+    has no parameter. Keys that depend on the value beyond a parameter (q, tags) get a function instead of a
+    criterion.
+    """
+    plan = []
+    for key, kind in shape:
+        param = bindparam(f"filter_{key}")
+        if kind == "none":
+            continue
+        if key in TAG_KEYS:
+            plan.append((key, functools.partial(filter_tags, model, key == "tags_all"), None))
+        elif kind == "list":
+            # GET_MANY: react-admin asks for a list of ids
+            plan.append((key, column_of(model, "id").in_(bindparam(f"filter_{key}", expanding=True)), list))
+        elif kind in ("true", "false"):
+            plan.append((key, column_of(model, key).is_(kind == "true"), None))
+        elif key == "id":
+            plan.append((key, column_of(model, "id") == param, same))
+        elif key == "q":
+            columns = [column_of(model, column) for column in quick_search_columns]
+            plan.append((key, functools.partial(filter_quick_search, columns), None))
+        else:
+            suffix = next((suffix for suffix in OPERATORS if key.endswith(suffix)), None)
+            if suffix and key[: -len(suffix)] in filterable_columns(model):
+                plan.append((key, OPERATORS[suffix](column_of(model, key[: -len(suffix)]), param), same))
+            else:
+                column = column_of(model, key)
+                # without a cast on text columns, so the trigram indexes can be used
+                is_text = isinstance(column.type, String) and not isinstance(column.type, Enum)
+                text = column if is_text else cast(column, String)
+                plan.append((key, text.ilike(param), contains))
+    return plan
+
+
+def filter_query(model, query, filters: Optional[Dict] = None, quick_search_columns: List = ["name"]):
+    """Apply a parsed filter to the query, with the compiled plan for its shape."""
+    if not filters:
+        return query
+    plan = compile_filter(model, filter_shape(filters), tuple(quick_search_columns))
+    params = {}
+    for key, criterion, bind in plan:
+        value = filters[key]
+        if callable(criterion):
+            query = criterion(query, value)
+            continue
+        query = query.filter(criterion)
+        if bind is not None:
+            params[f"filter_{key}"] = bind(value)
+    logger.debug("Applied filter", filter=filters, plan_cache=compile_filter.cache_info()._asdict())
+    return query.params(**params) if params else query
@@ -1,14 +1,19 @@
 import base64
+import datetime
+import json
 import os
-from ast import literal_eval
 from typing import Dict, List, Optional
 from uuid import UUID
 
 import boto3
 import structlog
-from database import db, RiffTag, Tag, Riff, RiffExercise, RiffExerciseTag
+from apis.fieldsets import parse_fields
+from apis.filters import filter_query, filterable_columns, parse_filter
+from apis.includes import parse_include
+from counts import count_query
+from database import db
 from flask_restx import abort
-from sqlalchemy import String, cast, or_
+from sqlalchemy import and_, literal, or_, tuple_
 from sqlalchemy.sql import expression
 
 s3 = boto3.resource(
@@ -18,6 +23,9 @@ s3 = boto3.resource(
 )
 logger = structlog.get_logger(__name__)
 
+# datetime.fromisoformat() is Python >= 3.7
+CURSOR_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
 
 def get_range_from_args(args):
     if args["range"]:
@@ -53,14 +61,11 @@ def get_sort_from_args(args, default_sort="name", default_sort_order="ASC"):
 
 def get_filter_from_args(args, default_filter={}):
     if args["filter"]:
-        print(args["filter"])
-        try:
-
-            filter = literal_eval(args["filter"].replace(":true", ":True").replace(":false", ":False"))
+        filter = parse_filter(args["filter"])
+        if filter is not None:
             logger.info("Query parameters set to custom filter", filter=filter)
             return filter
-        except:  # noqa: E722
-            logger.warning("Query parameters not parsable", args=args.get(["filter"], "No filter provided"))
+        logger.warning("Query parameters not parsable", filter=args["filter"])
     logger.info("Query parameters set to default filter", filter=default_filter)
     return default_filter
 
@@ -104,6 +109,30 @@ def delete(item):
         abort(400, "DB error: {}".format(str(error)))
 
 
+def get_cursor_from_args(args):
+    """The opaque pagination cursor of the request, None when the client uses offset pagination."""
+    return args.get("cursor") or None
+
+
+def get_exact_count_from_args(args):
+    """Whether the client asked for an exact total instead of a cached or estimated one."""
+    return str(args.get("exact_count") or "").lower() in ("1", "true")
+
+
+def get_include_from_args(args, model, default=()):
+    """The relations to load and serialize with the rows, see includes.py."""
+    include = parse_include(model, args.get("include"), default)
+    logger.info("Query parameters set to include", include=include)
+    return include
+
+
+def get_fields_from_args(args, marshaller, default=None):
+    """The fields to load and serialize, None for all fields, see fieldsets.py."""
+    fields = parse_fields(marshaller, args.get("fields"), default)
+    logger.info("Query parameters set to fields", fields=fields)
+    return fields
+
+
 def query_with_filters(
     model,
     query,
@@ -111,62 +140,9 @@ def query_with_filters(
     sort: List[str] = None,
     filters: Optional[Dict] = None,
     quick_search_columns: List = ["name"],
+    options: List = (),
 ):
-    if filters != "":
-        logger.info("filters dict", filters=filters)
-        for column, searchPhrase in filters.items():
-            if isinstance(searchPhrase, list):
-                logger.info(
-                    "Query parameters set to GET_MANY, ID column only", column=column, searchPhrase=searchPhrase
-                )
-                conditions = []
-                for item in searchPhrase:
-                    conditions.append(model.__dict__["id"] == item)
-                query = query.filter(or_(*conditions))
-            elif searchPhrase is not None:
-                logger.info(
-                    "Query parameters set to custom filter for column", column=column, searchPhrase=searchPhrase
-                )
-                if type(searchPhrase) == bool:
-                    query = query.filter(model.__dict__[column].is_(searchPhrase))
-                elif column.endswith("_gt"):
-                    query = query.filter(model.__dict__[column[:-3]] > searchPhrase)
-                elif column.endswith("_gte"):
-                    query = query.filter(model.__dict__[column[:-4]] >= searchPhrase)
-                elif column.endswith("_lte"):
-                    query = query.filter(model.__dict__[column[:-4]] <= searchPhrase)
-                elif column.endswith("_lt"):
-                    query = query.filter(model.__dict__[column[:-3]] < searchPhrase)
-                elif column.endswith("_ne"):
-                    query = query.filter(model.__dict__[column[:-3]] != searchPhrase)
-                elif column == "id":
-                    query = query.filter_by(id=searchPhrase)
-                elif column == "q":
-                    logger.debug(
-                        "Activating multi kolom filter", column=column, quick_search_columns=quick_search_columns
-                    )
-                    conditions = []
-                    for item in quick_search_columns:
-                        conditions.append(cast(model.__dict__[item], String).ilike("%" + searchPhrase + "%"))
-                    query = query.filter(or_(*conditions))
-                elif column == "tags":
-                    # First fetch all the tags that match
-                    tags = Tag.query.filter(Tag.name.ilike(searchPhrase + "%")).all()
-                    if len(tags):
-                        # Todo: cleanup tag mess and somehow make it generic
-                        if "database.RiffExercise" in str(model):
-                            query = query.join(RiffExerciseTag)
-                        elif "database.Riff" in str(model):
-                            query = query.join(RiffTag)
-                        conditions = []
-                        for tag in tags:
-                            if "database.RiffExercise" in str(model):
-                                conditions.append(RiffExerciseTag.tag_id == tag.id)
-                            elif "database.Riff" in str(model):
-                                conditions.append(RiffTag.tag_id == tag.id)
-                        query = query.filter(or_(*conditions))
-                else:
-                    query = query.filter(cast(model.__dict__[column], String).ilike("%" + searchPhrase + "%"))
+    query = filter_query(model, query, filters, quick_search_columns)
 
     if sort and len(sort) == 2:
         if sort[1].upper() == "DESC":
@@ -177,17 +153,116 @@ def query_with_filters(
     range_start = int(range[0])
     range_end = int(range[1])
     if len(range) >= 2:
-        total = query.count()
+        total = count_query(query)
         # Range is inclusive so we need to add one
         range_length = max(range_end - range_start + 1, 0)
         query = query.offset(range_start)
         query = query.limit(range_length)
     else:
-        total = query.count()
+        total = count_query(query)
 
     content_range = f"items {range_start}-{range_end}/{total}"
 
-    return query.all(), content_range
+    return query.options(*options).all(), content_range
+
+
+def encode_cursor(sort: List[str], item):
+    """Opaque cursor that points after `item`: the sort column, the sort order and the sort value and id of the item."""
+    value = getattr(item, sort[0])
+    kind = None
+    if isinstance(value, datetime.datetime):
+        value, kind = value.strftime(CURSOR_DATETIME_FORMAT), "datetime"
+    elif isinstance(value, UUID):
+        value, kind = str(value), "uuid"
+    cursor = json.dumps([sort[0], sort[1].upper(), value, kind, str(item.id)])
+    return base64.urlsafe_b64encode(cursor.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: List[str]):
+    """The sort value and id a cursor points after. Aborts with a 400 for invalid cursors or a different sort."""
+    try:
+        column, order, value, kind, id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if kind == "datetime":
+            value = datetime.datetime.strptime(value, CURSOR_DATETIME_FORMAT)
+    except (ValueError, TypeError):
+        abort(400, "Invalid cursor")
+    if [column, order] != [sort[0], sort[1].upper()]:
+        abort(400, "Cursor doesn't match the sort of the query")
+    return value, id
+
+
+def seek_condition(column, id_column, descending, value, id):
+    """
+    Rows after (value, id) when ordered by column and id, with NULLs last for ASC and first for DESC as Postgres does.
+    """
+    value = literal(value, column.type) if value is not None else None
+    id = literal(id, id_column.type)
+    if descending:
+        if value is None:
+            return or_(and_(column.is_(None), id_column < id), column.isnot(None))
+        return tuple_(column, id_column) < tuple_(value, id)
+    if value is None:
+        return and_(column.is_(None), id_column > id)
+    return or_(tuple_(column, id_column) > tuple_(value, id), column.is_(None))
+
+
+def query_with_cursor(
+    model,
+    query,
+    range: List[int] = None,
+    sort: List[str] = None,
+    filters: Optional[Dict] = None,
+    cursor: Optional[str] = None,
+    quick_search_columns: List = ["name"],
+    exact_count: bool = False,
+    options: List = (),
+):
+    """
+    query_with_filters() with keyset pagination. Returns the items, the Content-Range and the cursor of the next page.
+
+    Without a cursor the page is selected with OFFSET, like query_with_filters(). With a cursor from a previous page
+    the query seeks to the rows after it with WHERE (sort column, id) > (...), which stays fast for deep pages. The
+    range is only used for the page length then, the Content-Range is kept for react-admin.
+
+    The total is a cached or estimated count (see counts.py), unless `exact_count` is set. Loader `options` only apply
+    to the page, not to the count.
+    """
+    if not sort or len(sort) != 2:
+        sort = ["id", "ASC"]
+    # the sort value ends up in the cursor: only the columns that can be filtered on
+    if sort[0] not in filterable_columns(model):
+        abort(400, f"Unknown sort column: {sort[0]}")
+    query = filter_query(model, query, filters, quick_search_columns)
+    total = count_query(query, exact=exact_count)
+
+    column = model.__dict__[sort[0]]
+    id_column = model.__dict__["id"]
+    descending = sort[1].upper() == "DESC"
+    if cursor:
+        query = query.filter(seek_condition(column, id_column, descending, *decode_cursor(cursor, sort)))
+    order = expression.desc if descending else expression.asc
+    # the id breaks ties, so every row has a unique position
+    query = query.order_by(order(column), order(id_column))
+
+    range = range or [0, 19]
+    range_start = int(range[0])
+    range_end = int(range[1])
+    # Range is inclusive so we need to add one
+    range_length = max(range_end - range_start + 1, 0)
+    if not cursor:
+        query = query.offset(range_start)
+    items = query.options(*options).limit(range_length).all()
+
+    next_cursor = encode_cursor(sort, items[-1]) if items and len(items) == range_length else None
+    content_range = f"items {range_start}-{range_end}/{total}"
+    return items, content_range, next_cursor
+
+
+def pagination_headers(content_range, next_cursor=None):
+    headers = {"Content-Range": content_range}
+    if next_cursor:
+        headers["Next-Cursor"] = next_cursor
+    return headers
 
 
 def upload_file(blob, file_name):
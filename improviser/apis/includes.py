@@ -0,0 +1,74 @@
+"""
+The `include` query parameter of the list endpoints: the relations that are loaded and serialized with the rows.
+
+Relations are eager loaded with a SELECT ... WHERE id IN (...) per relation for the whole page (selectinload), instead
+of a lazy load per row: a page costs a fixed number of queries, whatever its length. Relations that aren't included
+aren't loaded at all and their fields are left out of the response, e.g. `include=` returns the bare rows and
+`include=tags,user` adds the tags and the owner of every row. Every endpoint has a default that keeps its response
+backwards compatible.
+"""
+from database import Riff, RiffExercise, RiffExerciseTag, RiffTag
+from flask_restx import abort, fields
+from sqlalchemy.orm import selectinload
+
+user_info_marshaller = {
+    "id": fields.String,
+    "username": fields.String,
+}
+
+# {model: {include name: loader option}}
+INCLUDES = {
+    Riff: {
+        "tags": selectinload(Riff.riff_to_tags).selectinload(RiffTag.tag),
+        "user": selectinload(Riff.user),
+    },
+    RiffExercise: {
+        "tags": selectinload(RiffExercise.riff_exercise_to_tags).selectinload(RiffExerciseTag.tag),
+        "user": selectinload(RiffExercise.user),
+        "instruments": selectinload(RiffExercise.instruments),
+    },
+}
+
+# The serialized fields of an include: they're left out of the response when it's not included
+INCLUDE_FIELDS = {
+    "tags": ("tags",),
+    "user": ("user", "gravatar_image"),
+    "instruments": ("instruments",),
+}
+
+# The columns of the rows that an include is loaded with: the foreign key of a many to one relation
+INCLUDE_COLUMNS = {
+    "user": ("created_by",),
+}
+
+
+def parse_include(model, value, default=()):
+    """The include names of a comma separated `value`, `default` when it's not given. Aborts on unknown names."""
+    if value is None:
+        return tuple(default)
+    include = tuple(dict.fromkeys(name.strip().lower() for name in value.split(",") if name.strip()))
+    unknown = [name for name in include if name not in INCLUDES[model]]
+    if unknown:
+        abort(400, f"Unknown include: {', '.join(unknown)}, use one of: {', '.join(INCLUDES[model])}")
+    return include
+
+
+def include_options(model, include):
+    """Loader options that eager load the included relations."""
+    return [INCLUDES[model][name] for name in include]
+
+
+def include_columns(include):
+    """The columns that the included relations need, see fieldsets.py."""
+    return tuple(column for name in include for column in INCLUDE_COLUMNS.get(name, ()))
+
+
+def include_fields(marshaller, include):
+    """The fields of a marshaller without the fields of the relations that aren't included."""
+    excluded = {field for name, names in INCLUDE_FIELDS.items() if name not in include for field in names}
+    return {key: field for key, field in marshaller.items() if key not in excluded}
+
+
+def tag_infos(associations):
+    """The tags of a row for the response, with the id of the association (riff_tags or riff_exercise_tags)."""
+    return [{"id": association.id, "name": association.tag.name} for association in associations]
@@ -6,12 +6,16 @@ from apis.helpers import (
     get_range_from_args,
     get_sort_from_args,
     get_filter_from_args,
-    query_with_filters,
+    get_cursor_from_args,
+    get_exact_count_from_args,
+    pagination_headers,
+    query_with_cursor,
     load,
     upload_file,
     update,
     save,
 )
+from chords import ChordError, chords_before_bar, number_of_bars, parse_chord_info, serialize
 from flask import request
 from flask_restx import Namespace, Resource, fields, marshal_with, reqparse, abort
 from database import BackingTrack, RiffExercise
@@ -77,6 +81,8 @@ parser = api.parser()
 parser.add_argument("range", location="args", help="Pagination: default=[0,19]")
 parser.add_argument("sort", location="args", help='Sort: default=["name","ASC"]')
 parser.add_argument("filter", location="args", help="Filter default=[]")
+parser.add_argument("cursor", location="args", help="Keyset pagination: the Next-Cursor header of the previous page")
+parser.add_argument("exact_count", location="args", help="Count the total exactly: default=false")
 
 file_upload = reqparse.RequestParser()
 file_upload.add_argument("file", type=FileStorage, location="files", help="file")
@@ -93,16 +99,18 @@ class BackingTrackResourceList(Resource):
         sort = get_sort_from_args(args)
         filter = get_filter_from_args(args)
 
-        query_result, content_range = query_with_filters(
+        query_result, content_range, next_cursor = query_with_cursor(
             BackingTrack,
             BackingTrack.query,
             range,
             sort,
             filter,
+            get_cursor_from_args(args),
             quick_search_columns=["name", "file", "tempo"],
+            exact_count=get_exact_count_from_args(args),
         )
 
-        return query_result, 200, {"Content-Range": content_range}
+        return query_result, 200, pagination_headers(content_range, next_cursor)
 
     @roles_accepted("admin")
     @marshal_with(backing_track_serializer)
@@ -250,10 +258,15 @@ class BackingTrackScaleResourceList(Resource):
         for item in api.payload["chords"]:
             print(item)
             conditions.append(BackingTrack.chord_info == item["chord"])
-            if ":" not in item["chord"] or ("maj" in item["chord"] and not "7" in item["chord"]):
-                # quick transpose hack: check for accidentals
-                new_pitch = item["chord"][0] if item["chord"][1] == "1" else item["chord"][0:3]
-                conditions.append(BackingTrack.chord_info == f"{new_pitch}1:maj7")
+            try:
+                chords = parse_chord_info(item["chord"])
+            except ChordError:
+                logger.warning("Couldn't parse scale chord", chord=item["chord"])
+                continue
+            if len(chords) == 1 and chords[0].quality in (None, "maj"):
+                # a major triad also matches a backing track on the major 7 chord
+                maj7 = chords[0]._replace(duration="1", quality="maj7")
+                conditions.append(BackingTrack.chord_info == serialize([maj7]))
 
         query = query.filter(or_(*conditions))
         full_match = query.all()
@@ -268,35 +281,14 @@ class BackingTrackScaleResourceList(Resource):
         return {"full_match": full_match, "loop_match": [], "fuzzy_match": [], "atonal_match": atonal_match}, 200
 
 
-# Todo: test
-def get_number_of_bars(chord_string:str):
-    chords = chord_string.split(" ")
-    number_of_bars = 0
-    number_of_half_bars = 0
-    for chord in chords:
-        if "2" in chord:
-            number_of_half_bars += 1
-        if "1" in chord:
-            number_of_bars += 1
-
+def get_number_of_bars(chord_string: str):
+    bars = number_of_bars(parse_chord_info(chord_string))
     # Check correctness:
-    if number_of_half_bars %2 == 1:
+    if bars.denominator != 1:
         raise ValueError(f"Chord string doesn't finish on a bar boundary: {chord_string}")
-
-    return number_of_bars + int(number_of_half_bars/2)
+    return int(bars)
 
 
-# Todo: test
 def split_chord_string_on_bar(chord_string: str, bar_number_to_split: int):
-    chords = chord_string.split(" ")
-
-    number_of_bars = 0
-    number_of_half_bars = 0
-    for index, chord in enumerate(chords):
-        if "2" in chord:
-            number_of_half_bars += 1
-        if "1" in chord:
-            number_of_bars += 1
-        if number_of_half_bars %2 == 0 and number_of_bars + int(number_of_half_bars/2) >= bar_number_to_split:
-            return " ".join(chords[0:index])
-    return chord_string
+    """Return the chords of the chord string before bar `bar_number_to_split` starts."""
+    return serialize(chords_before_bar(parse_chord_info(chord_string), bar_number_to_split))
@@ -1,19 +1,43 @@
 import datetime
-import re
 import uuid
 import structlog
-from apis.helpers import query_with_filters, get_range_from_args, get_sort_from_args, get_filter_from_args
+from apis.helpers import (
+    query_with_cursor,
+    query_with_filters,
+    get_cursor_from_args,
+    get_exact_count_from_args,
+    get_fields_from_args,
+    get_include_from_args,
+    get_range_from_args,
+    get_sort_from_args,
+    get_filter_from_args,
+    is_valid_uuid,
+    load,
+    pagination_headers,
+)
 
 from flask_login import current_user
 from flask_security import roles_accepted
-from musthe import Note, Interval
 from security import quick_token_required
+from chord_transpositions import fill_chord_transpositions, load_chord_transpositions, riff_chord_info, riff_chords
+from chords import ChordError
+from full_text_search import update_search_vectors
+from transpose import (
+    SEMITONE_PITCHES,
+    cached_transpose_chord_info,
+    interval_pitch,
+    transpose_pitch,
+    transposition_cache,
+)
 
-from flask_restx import Namespace, Resource, fields, marshal_with, reqparse, abort
+from flask_restx import Namespace, Resource, fields, marshal, marshal_with, reqparse, abort
+from apis.fieldsets import fieldset, fieldset_include, fieldset_options, nested_names, selected
+from apis.includes import include_columns, include_fields, include_options, tag_infos, user_info_marshaller
 
-from database import db, Riff, RiffExercise, RiffExerciseItem, Instrument
+from database import db, Riff, RiffChordTransposition, RiffExercise, RiffExerciseItem, Instrument
+from sqlalchemy import and_, case, exists, select
 
-from .riffs import riff_fields, riff_arguments
+from .riffs import riff_fields, riff_list_fields, riff_arguments
 
 logger = structlog.get_logger(__name__)
 
@@ -47,6 +71,7 @@ exercise_list_serializer = api.model(
         "created_by": fields.String(),
         "modified_at": fields.DateTime(),
         "gravatar_image": fields.String(),
+        "user": fields.Nested(user_info_marshaller, allow_null=True),
         "tags": fields.Nested(tag_info_marshaller),
         "stars": fields.Integer(),
         "instrument_key": fields.String(),
@@ -162,11 +187,44 @@ transpose_fields = {
 
 transpose_fields_multi = fields.Nested(transpose_fields)
 
+exercise_transpose_fields = api.model(
+    "RiffExerciseTranspose",
+    {
+        "interval": fields.Integer(description="Number of semitones to transpose the exercise, e.g. 2 or -5"),
+        "root_key": fields.String(description="New root key of the exercise, instead of an interval"),
+    },
+)
+
+exercise_transposed_fields = {
+    "id": fields.String,
+    "root_key": fields.String,
+    "interval": fields.String(description="The pitch that c is transposed to"),
+    "updated_items": fields.Integer,
+}
+
+transpose_cache_fields = {
+    "hits": fields.Integer,
+    "misses": fields.Integer,
+    "size": fields.Integer,
+    "maxsize": fields.Integer,
+}
+
 
 parser = api.parser()
 parser.add_argument("range", location="args", help="Pagination: default=[0,19]")
 parser.add_argument("sort", location="args", help='Sort: default=["name","ASC"]')
 parser.add_argument("filter", location="args", help="Filter default=[]")
+parser.add_argument("cursor", location="args", help="Keyset pagination: the Next-Cursor header of the previous page")
+parser.add_argument("exact_count", location="args", help="Count the total exactly: default=false")
+parser.add_argument(
+    "include", location="args", help="Relations to include: tags,user,instruments default=tags,user,instruments"
+)
+parser.add_argument("fields", location="args", help="Fields to return, e.g. name,description default=all")
+
+detail_parser = api.parser()
+detail_parser.add_argument(
+    "fields", location="args", help="Fields to return, e.g. name,exercise_items,riffs.name,riffs.notes default=all"
+)
 
 
 def row2dict(row):
@@ -177,185 +235,6 @@ def row2dict(row):
     return d
 
 
-def transpose_chord_info(chord_info, pitch, number_of_bars=None):
-    """
-    Transpose a chord_info string to lilypond chord info
-
-    e.g.:
-    chord_info: d2:m7 g:7 c1:maj7, with pitch: d => e2:m7 a:7 d1:maj7
-    chord_info: C7, pitch: d, number_of_bars: 2 => d1:7 d1:7
-
-    Note: when using C7 notation (from the riff.chord property) -> number of bars is mandatory
-
-    return: new lilypond chord string
-    """
-
-    # *****************************************************************************************************************
-    # Todo: expose via REST API -> so the client can use it to calculate the correct lilypond chord info values upon
-    #  changing the pitch of an exercise item
-    # *****************************************************************************************************************
-
-    notes = {
-        "c": "P1",
-        "cis": "A1",
-        "d": "M2",
-        "ees": "m3",
-        "e": "M3",
-        "f": "P4",
-        "fis": "A4",
-        "g": "P5",
-        "gis": "A5",
-        "aes": "m6",
-        "a": "M6",
-        "bes": "m7",
-        "b": "M7",
-    }
-    to_lilypond = {
-        "c": "c",
-        "cb": "b",
-        "db": "des",
-        "d": "d",
-        "eb": "ees",
-        "e": "e",
-        "a": "a",
-        "ab": "aes",
-        "b": "b",
-        "bb": "bes",
-        "c#": "cis",
-        "c##": "d",
-        "d#": "dis",
-        "e#": "f",
-        "fb": "e",
-        "f": "f",
-        "f#": "fis",
-        "f##": "g",
-        "g": "g",
-        "gb": "fis",
-        "g#": "gis",
-        "g##": "a",
-        "a#": "ais",
-        "b#": "c",
-    }
-    lilypond_mood = {"M": "maj", "m": "m"}
-
-    if chord_info and len(chord_info) and chord_info[0].isupper():
-        if len(chord_info) > 1 and (chord_info[1] == "#" or chord_info[1] == "b"):
-            root_key = str(Note(chord_info[0:2]) + Interval(notes[pitch])).lower()
-            o = 1
-        else:
-            root_key = str(Note(chord_info[0]) + Interval(notes[pitch])).lower()
-            o = 0
-        if root_key in to_lilypond.keys():
-            root_key = to_lilypond[root_key]
-        # Done with root key : continue with rest of chord
-        digit = ""
-        separator = ":"
-        if len(chord_info) == 1:
-            chord_mood = ""
-            separator = ""
-        elif chord_info[1 + o].isdigit():  # Handle C7, C#7, Bb7
-            chord_mood = ""
-            digit = chord_info[1 + o]
-        elif len(chord_info) == 2 + o:  # Handle Cm, C#m, Bbm, CM, C#M
-            chord_mood = (
-                lilypond_mood[chord_info[1 + o]] if chord_info[1 + o] in lilypond_mood.keys() else chord_info[1 + o]
-            )
-        elif len(chord_info) == 3 + o:  # Handle Cm7, C#m7, CM7, BbM9, Cm9, CM6
-            chord_mood = (
-                lilypond_mood[chord_info[1 + o]] if chord_info[1 + o] in lilypond_mood.keys() else chord_info[1 + o]
-            )
-            digit = chord_info[2 + o]
-        elif len(chord_info) == 4 + o:  # Handle Cmaj
-            chord_mood = chord_info[1 + o : 4 + o]
-        elif len(chord_info) == 5 + o:  # Handle Cmaj7
-            chord_mood = chord_info[1 + o : 4 + o]
-            digit = chord_info[4 + o]
-        else:
-            logger.info("Couldn't parse chord info", chord_info=chord_info)
-            raise ValueError
-        logger.info("Using chord from riff", root_key=root_key, chord_mood=chord_mood, digit=digit)
-        if not number_of_bars or number_of_bars == 1:
-            return f"{root_key}1{separator}{chord_mood}{digit}"
-        result = []
-        for i in range(0, number_of_bars):
-            result.append(f"{root_key}1{separator}{chord_mood}{digit}")
-        return " ".join(result)
-    elif chord_info:
-        chords = chord_info.split(" ")
-        logger.info("Using chord-info in lilypond format", chords=chords, pitch=pitch)
-        result = []
-        for chord in chords:
-            if ":" in chord:
-                root_key, chord_mood = chord.split(":")
-                # 3 case: c1, cis2, c and cis
-                duration = ""
-                numbers = re.findall(r'\d+', root_key)
-                if len(numbers):
-                    # print(numbers)
-                    duration = numbers[0]
-                    # print(f"Duration: {duration}")
-                root_key = root_key.replace("1", "").replace("2", "").capitalize()
-                if root_key.endswith("is"):
-                    root_key = root_key[0] + "#"
-                if root_key.endswith("es"):
-                    root_key = root_key[0] + "b"
-
-                new_root_key = str(Note(root_key) + Interval(notes[pitch])).lower()
-                # print(new_root_key)
-                if new_root_key in to_lilypond.keys():
-                    new_root_key = to_lilypond[new_root_key]
-                    # simplify some chords
-                    if new_root_key == "dis":
-                        new_root_key = "ees"
-                    if new_root_key == "gis":
-                        new_root_key = "aes"
-                    if new_root_key == "ais":
-                        new_root_key = "bes"
-                    if new_root_key == "des":
-                        new_root_key = "cis"
-                    new_root_key = f"{new_root_key}{duration}"
-                else:
-                    print(f"Error with {new_root_key}")
-                    1/0
-                result.append(f"{new_root_key}:{chord_mood}")
-            else:  # handle lilypond chords without mode like "c1"
-                root_key = chord
-                duration = ""
-                numbers = re.findall(r'\d+', root_key)
-                if len(numbers):
-                    # print(numbers)
-                    duration = numbers[0]
-                    # print(f"Duration: {duration}")
-                root_key = root_key.replace("1", "").replace("2", "").capitalize()
-                if root_key.endswith("is"):
-                    root_key = root_key[0] + "#"
-                if root_key.endswith("es"):
-                    root_key = root_key[0] + "b"
-
-                new_root_key = str(Note(root_key) + Interval(notes[pitch])).lower()
-                # print(new_root_key)
-                if new_root_key in to_lilypond.keys():
-                    new_root_key = to_lilypond[new_root_key]
-                    # simplify some chords
-                    if new_root_key == "dis":
-                        new_root_key = "ees"
-                    if new_root_key == "gis":
-                        new_root_key = "aes"
-                    if new_root_key == "ais":
-                        new_root_key = "bes"
-                    if new_root_key == "des":
-                        new_root_key = "cis"
-                    new_root_key = f"{new_root_key}{duration}"
-                else:
-                    print(f"Error with {new_root_key}")
-                    1/0
-                result.append(new_root_key)
-            # else:
-            #     logger.error("Expected ':' in chord", chord=chord, complete_chord_info=chord_info)
-            #     result.append(f"Error in:{chord}")
-        return " ".join(result)
-
-
 @api.route("/validate-exercise-name/<string:name>")
 class ValidateExerciseNameResource(Resource):
     @quick_token_required
@@ -374,27 +253,44 @@ class ValidateExerciseNameResource(Resource):
 @api.route("/")
 class ExerciseResourceList(Resource):
     @roles_accepted("admin", "moderator", "member", "student", "teacher", "operator")
-    @marshal_with(exercise_list_serializer)
+    @api.response(200, "Success", [exercise_list_serializer])
     @api.expect(exercise_arguments)
     def get(self):
         args = parser.parse_args()
         range = get_range_from_args(args)
         sort = get_sort_from_args(args)
         filter = get_filter_from_args(args)
+        selected_fields = get_fields_from_args(args, exercise_list_serializer)
+        include = get_include_from_args(args, RiffExercise, default=("tags", "user", "instruments"))
+        include = fieldset_include(include, selected_fields)
 
         # Get public exercises and exercises owned by this user
         exercise_query = RiffExercise.query.filter(
             (RiffExercise.created_by == current_user.id) | (RiffExercise.is_public.is_(True))
         )
 
-        query_result, content_range = query_with_filters(
-            RiffExercise, exercise_query, range, sort, filter, quick_search_columns=["name", "id"]
+        query_result, content_range, next_cursor = query_with_cursor(
+            RiffExercise,
+            exercise_query,
+            range,
+            sort,
+            filter,
+            get_cursor_from_args(args),
+            quick_search_columns=["name", "id"],
+            exact_count=get_exact_count_from_args(args),
+            options=include_options(RiffExercise, include)
+            + fieldset_options(RiffExercise, selected_fields, required=(sort[0], *include_columns(include))),
         )
 
-        for exercise in query_result:
-            exercise.tags = [{"id": tag.id, "name": tag.tag.name} for tag in exercise.riff_exercise_to_tags]
+        if "tags" in include:
+            for exercise in query_result:
+                exercise.tags = tag_infos(exercise.riff_exercise_to_tags)
 
-        return query_result, 200, {"Content-Range": content_range}
+        return (
+            marshal(query_result, fieldset(include_fields(exercise_list_serializer, include), selected_fields)),
+            200,
+            pagination_headers(content_range, next_cursor),
+        )
 
     @roles_accepted("admin", "moderator", "student", "teacher", "operator")
     @api.expect(exercise_fields)
@@ -417,19 +313,21 @@ class ExerciseResourceList(Resource):
         exercise.modified_at = datetime.datetime.now()
         db.session.add(exercise)
 
+        riffs = load_riffs([exercise_item["riff_id"] for exercise_item in exercise_items])
+        transpositions = load_chord_transpositions(
+            [(exercise_item["riff_id"], exercise_item["pitch"]) for exercise_item in exercise_items]
+        )
         for exercise_item in exercise_items:
             # Try retrieving it from the riff itself
-            riff = Riff.query.filter(Riff.id == exercise_item["riff_id"]).first()
-            chord_info = riff.chord_info if riff.chord_info else riff.chord
+            riff = riffs.get(str(exercise_item["riff_id"]))
+            chord_info = riff_chord_info(riff, exercise_item["pitch"], transpositions)
             if chord_info:
-                exercise_item["chord_info"] = transpose_chord_info(
-                    chord_info, exercise_item["pitch"], riff.number_of_bars
-                )
+                exercise_item["chord_info"] = chord_info
                 logger.info(
                     "Using chord_info",
                     riff_id=riff.id,
                     riff_name=riff.name,
-                    chord_info=chord_info,
+                    chord_info=riff_chords(riff),
                     transposed_chord_info=exercise_item["chord_info"],
                 )
             else:
@@ -449,27 +347,36 @@ class ExerciseResourceList(Resource):
 @api.route("/<string:exercise_id>")
 class ExerciseResource(Resource):
     @roles_accepted("admin", "moderator", "member", "student", "teacher", "operator")
-    @marshal_with(exercise_detail_serializer)
+    @api.response(200, "Success", exercise_detail_serializer)
+    @api.doc(parser=detail_parser)
     def get(self, exercise_id):
+        selected_fields = get_fields_from_args(detail_parser.parse_args(), exercise_detail_serializer)
         try:
             exercise = (
                 RiffExercise.query.filter(
                     (RiffExercise.created_by == current_user.id) | (RiffExercise.is_public.is_(True))
                 )
                 .filter(RiffExercise.id == exercise_id)
+                .options(*fieldset_options(RiffExercise, selected_fields))
                 .first()
             )
         except:
             abort(404, "exercise not found")
-        exercise.tags = [str(tag.name) for tag in exercise.riff_exercise_tags]
-        exercise.tags = [{"id": tag.id, "name": tag.tag.name} for tag in exercise.riff_exercise_to_tags]
+        if selected(selected_fields, "tags"):
+            exercise.tags = tag_infos(exercise.riff_exercise_to_tags)
 
-        exercise.exercise_items = sorted(exercise.riff_exercise_items, key=lambda item: item.order_number)
+        if selected(selected_fields, "exercise_items") or selected(selected_fields, "riffs"):
+            exercise.exercise_items = sorted(exercise.riff_exercise_items, key=lambda item: item.order_number)
 
         # Include riffs used in the exercise in the response
-        riff_ids = [item.riff_id for item in exercise.exercise_items]
-        exercise.riffs = Riff.query.filter(Riff.id.in_(riff_ids)).all()
-        return exercise
+        if selected(selected_fields, "riffs"):
+            riff_ids = [item.riff_id for item in exercise.exercise_items]
+            exercise.riffs = (
+                Riff.query.filter(Riff.id.in_(riff_ids))
+                .options(*fieldset_options(Riff, nested_names(selected_fields, "riffs")))
+                .all()
+            )
+        return marshal(exercise, fieldset(exercise_detail_serializer, selected_fields))
 
     @roles_accepted("admin", "moderator", "student", "teacher", "operator")
     @api.expect(exercise_fields)
@@ -503,26 +410,28 @@ class ExerciseResource(Resource):
 
         changed = False
 
+        # the riffs and their transposed chords for all items, new items use the riff from the payload
+        item_riff_ids = [
+            payload_exercise_item["riff_id"] if order_number >= len(exercise_items)
+            else exercise_items[order_number].riff_id
+            for order_number, payload_exercise_item in enumerate(payload_exercise_items)
+        ]
+        riffs = load_riffs(item_riff_ids)
+        transpositions = load_chord_transpositions(
+            zip(item_riff_ids, [payload_exercise_item["pitch"] for payload_exercise_item in payload_exercise_items])
+        )
+
         for order_number, payload_exercise_item in enumerate(payload_exercise_items):
             if order_number >= len(exercise_items):
                 logger.info("Inserting new exercise item", order_number=order_number, payload=payload_exercise_item)
 
-                # Todo: remove double chord code in new/update
-                riff = Riff.query.filter(Riff.id == payload_exercise_item["riff_id"]).first()
-
-                if riff.chord_info:
-                    # check transpose
-                    tranposed_chord = transpose_chord_info(riff.chord_info, payload_exercise_item["pitch"], riff.number_of_bars)
-                    payload_exercise_item["chord_info"] = tranposed_chord
-                elif riff.chord:
-                    # check transpose
-                    tranposed_chord = transpose_chord_info(riff.chord, payload_exercise_item["pitch"], riff.number_of_bars)
-                    payload_exercise_item["chord_info"] = tranposed_chord
-                else:
+                riff = riffs.get(str(item_riff_ids[order_number]))
+                chord_info = riff_chord_info(riff, payload_exercise_item["pitch"], transpositions)
+                if chord_info is None:
                     logger.warning("riff doesn't contain chord info", id=riff.id, name=riff.name)
                     # correct faulty ones for now:
-                    payload_exercise_item["chord_info"] = ""
-                ################
+                    chord_info = ""
+                payload_exercise_item["chord_info"] = chord_info
 
                 new_exercise_item = {**payload_exercise_item, "riff_exercise_id": exercise_id,  "number_of_bars": riff.number_of_bars,  "created_at": datetime.datetime.now(), "modified_at": datetime.datetime.now()}
                 # Todo: remove double code in new/update
@@ -538,21 +447,13 @@ class ExerciseResource(Resource):
                 del exercise_item_dict["created_at"]
                 del exercise_item_dict["modified_at"]
 
-                # Todo: remove double chord code in new/update
-                riff = Riff.query.filter_by(id=exercise_item_dict["riff_id"]).first()
-                if riff.chord_info:
-                    # check transpose
-                    tranposed_chord = transpose_chord_info(riff.chord_info, payload_exercise_item["pitch"], riff.number_of_bars)
-                    payload_exercise_item["chord_info"] = tranposed_chord
-                elif riff.chord:
-                    # check transpose
-                    tranposed_chord = transpose_chord_info(riff.chord, payload_exercise_item["pitch"], riff.number_of_bars)
-                    payload_exercise_item["chord_info"] = tranposed_chord
-                else:
+                riff = riffs.get(str(item_riff_ids[order_number]))
+                chord_info = riff_chord_info(riff, payload_exercise_item["pitch"], transpositions)
+                if chord_info is None:
                     logger.warning("riff doesn't contain chord info", id=riff.id, name=riff.name)
                     # correct faulty ones for now:
-                    payload_exercise_item["chord_info"] = ""
-                ################
+                    chord_info = ""
+                payload_exercise_item["chord_info"] = chord_info
 
                 added, removed, modified, same = dict_compare(exercise_item_dict, payload_exercise_item)
                 logger.debug("Handling exercise item", added=added, removed=removed, modified=modified, same=same)
@@ -702,72 +603,119 @@ class CopyExerciseResource(Resource):
 
 @api.route("/scales")
 class ScaleTrainerResourceList(Resource):
-    @marshal_with(riff_fields)
     @api.expect(riff_arguments)
     def get(self):
         args = parser.parse_args()
         range = get_range_from_args(args)
         sort = get_sort_from_args(args)
         filter = get_filter_from_args(args)
+        selected_fields = get_fields_from_args(args, riff_list_fields)
+        include = fieldset_include(get_include_from_args(args, Riff, default=("tags",)), selected_fields)
 
         riffs_query = Riff.query.filter(Riff.scale_trainer_enabled).filter(Riff.render_valid).filter(Riff.is_public.is_(True))
 
         query_result, content_range = query_with_filters(
-            Riff, riffs_query, range, sort, filter, quick_search_columns=["name", "id"]
+            Riff,
+            riffs_query,
+            range,
+            sort,
+            filter,
+            quick_search_columns=["name", "id"],
+            options=include_options(Riff, include)
+            + fieldset_options(Riff, selected_fields, required=(sort[0], *include_columns(include))),
         )
 
         for riff in query_result:
-            riff.tags = [{"id": tag.id, "name": tag.tag.name} for tag in riff.riff_to_tags]
+            if "tags" in include:
+                riff.tags = tag_infos(riff.riff_to_tags)
             riff.image = f"https://www.improviser.education/static/rendered/120/riff_{riff.id}_c.png"
-        return query_result, 200, {"Content-Range": content_range}
+        return (
+            marshal(query_result, fieldset(include_fields(riff_list_fields, include), selected_fields)),
+            200,
+            {"Content-Range": content_range},
+        )
+
+
+def load_riffs(riff_ids):
+    """Load the riffs in one query, as {riff_id: riff}."""
+    riff_ids = {str(riff_id) for riff_id in riff_ids}
+    if not riff_ids:
+        return {}
+    return {str(riff.id): riff for riff in Riff.query.filter(Riff.id.in_(riff_ids)).all()}
 
 
-def transpose_api_item(payload):
+def transpose_api_items(payloads):
+    """
+    Transpose the chord info of a list of transpose payloads, results are returned in the order of the payloads.
+
+    The riffs, their transposed chords and the exercise items of all payloads are loaded up front with one IN query
+    each, so the number of queries doesn't depend on the number of payloads.
+    """
+    riff_ids = [payload["riff_id"] for payload in payloads if payload.get("riff_id")]
+    exercise_item_ids = [payload["exercise_item_id"] for payload in payloads if payload.get("exercise_item_id")]
+    for id in riff_ids + exercise_item_ids:
+        if not is_valid_uuid(id):
+            abort(400, f"Not a valid UUID4: {id}")
+
+    riffs = load_riffs(riff_ids)
+    transpositions = load_chord_transpositions(
+        [(payload["riff_id"], payload["pitch"]) for payload in payloads if payload.get("riff_id")]
+    )
+    exercise_items = {}
+    if exercise_item_ids:
+        exercise_items = {
+            str(item.id): item
+            for item in RiffExerciseItem.query.filter(RiffExerciseItem.id.in_(set(exercise_item_ids))).all()
+        }
+
+    return [transpose_api_item(payload, riffs, transpositions, exercise_items) for payload in payloads]
+
+
+def transpose_relative(chord_info, from_pitch, to_pitch):
+    """Transpose chord info of an exercise item in `from_pitch` to `to_pitch`."""
+    try:
+        return cached_transpose_chord_info(chord_info, interval_pitch(from_pitch, to_pitch))
+    except ChordError as error:
+        abort(400, f"Can't transpose {chord_info} from {from_pitch} to {to_pitch}: {error}")
+
+
+def transpose_api_item(payload, riffs, transpositions, exercise_items):
     pitch = payload["pitch"]
 
     # If a riff_id is present the chord info from the DB wil be used.
     riff_id = payload.get("riff_id")
     if riff_id:
-        riff = Riff.query.filter(Riff.id == riff_id).first()
-        if riff.chord_info:
-            chord_info = transpose_chord_info(riff.chord_info, pitch)
-        else:
-            chord_info = transpose_chord_info(riff.chord, pitch)
+        riff = riffs.get(str(riff_id))
+        if not riff:
+            abort(404, f"Riff id={riff_id} not found")
+        chord_info = riff_chord_info(riff, pitch, transpositions)
     else:
         if payload.get("chord_info"):
-            chord_info = transpose_chord_info(payload["chord_info"], pitch)
+            chord_info = cached_transpose_chord_info(payload["chord_info"], pitch)
         else:
             chord_info = ""
 
-    # If an exercise_item_id is present the alternate_chord info from the DB wil be used.
+    # If an exercise_item_id is present the alternate and backing track chord info from the DB wil be used.
     exercise_item_id = payload.get("exercise_item_id")
+    exercise_item = exercise_items.get(str(exercise_item_id)) if exercise_item_id else None
+    if exercise_item_id and not exercise_item:
+        abort(404, f"Exercise item id={exercise_item_id} not found")
+
     chord_info_alternate = payload.get("chord_info_alternate")
     if chord_info_alternate:
         logger.info("Alternate chord info found in payload", chord_info_alternate=chord_info_alternate)
-    if exercise_item_id and chord_info_alternate:
-        exercise_item = RiffExerciseItem.query.filter(RiffExerciseItem.id == exercise_item_id).first()
-
-        # only existing alternate chord info is transposed
-        if exercise_item.chord_info_alternate:
-            chord_info_alternate = "TODO"
-            # Todo: implement relative transpose based on pitch in DB and desired new pitch.
-            # chord_info_alternate = transpose_chord_info(riff.chord_info, pitch)
-
+    # only existing alternate chord info is transposed: from the pitch of the item to the new pitch
+    if exercise_item and chord_info_alternate and exercise_item.chord_info_alternate:
+        chord_info_alternate = transpose_relative(exercise_item.chord_info_alternate, exercise_item.pitch, pitch)
         logger.info("Alternate chord info transposed", chord_info_alternate=chord_info_alternate)
 
     chord_info_backing_track = payload.get("chord_info_backing_track")
     if chord_info_backing_track:
         logger.info("Backing track chord info found in payload", chord_info_backing_track=chord_info_backing_track)
-    if exercise_item_id and chord_info_alternate:
-        # Todo: refactor double DB query
-        exercise_item = RiffExerciseItem.query.filter(RiffExerciseItem.id == exercise_item_id).first()
-
-        # only existing alternate chord info is transposed
-        if exercise_item.chord_info_backing_track:
-            chord_info_backing_track = "TODO"
-            # Todo: implement relative transpose based on pitch in DB and desired new pitch.
-            # chord_info_alternate = transpose_chord_info(riff.chord_info, pitch)
-
+    if exercise_item and chord_info_backing_track and exercise_item.chord_info_backing_track:
+        chord_info_backing_track = transpose_relative(
+            exercise_item.chord_info_backing_track, exercise_item.pitch, pitch
+        )
         logger.info("Backing track chord info transposed", chord_info_backing_track=chord_info_backing_track)
 
     return {
@@ -781,11 +729,127 @@ def transpose_api_item(payload):
 class Transpose(Resource):
     @api.expect(transpose_fields)
     def post(self):
-        return transpose_api_item(api.payload)
+        return transpose_api_items([api.payload])[0]
 
 
 @api.route("/transpose-riffs")
 class Transpose(Resource):
     @api.expect(transpose_fields_multi)
     def post(self):
-        return [transpose_api_item(item) for item in api.payload]
\ No newline at end of file
+        return transpose_api_items(api.payload)
+
+
+@api.route("/transpose-cache")
+class TransposeCache(Resource):
+    @roles_accepted("admin")
+    @marshal_with(transpose_cache_fields)
+    def get(self):
+        """Hit, miss and size counters of the transposition cache of this process."""
+        return transposition_cache.stats(), 200
+
+
+def transpose_exercise(exercise, interval):
+    """
+    Transpose all items of an exercise by an interval (the pitch that c is transposed to) with set based updates: one
+    UPDATE per column for all items, and one for the search vector. The caller is responsible for the commit.
+    """
+    items = RiffExerciseItem.__table__
+    exercise_items = items.c.riff_exercise_id == exercise.id
+
+    # Riffs without stored transpositions are filled first, so the chord info can be copied from the store
+    riff_ids = db.session.query(RiffExerciseItem.riff_id).filter(RiffExerciseItem.riff_exercise_id == exercise.id)
+    for riff in Riff.query.filter(Riff.id.in_(riff_ids)).filter(
+        ~exists().where(RiffChordTransposition.riff_id == Riff.id)
+    ):
+        fill_chord_transpositions(riff)
+    db.session.flush()
+
+    pitches = [
+        pitch
+        for (pitch,) in db.session.query(RiffExerciseItem.pitch)
+        .filter(RiffExerciseItem.riff_exercise_id == exercise.id)
+        .distinct()
+    ]
+    if not pitches:
+        return 0
+    try:
+        new_pitches = {pitch: transpose_pitch(pitch, interval) for pitch in pitches}
+    except ChordError as error:
+        abort(400, f"Can't transpose exercise: {error}")
+    updated = db.session.execute(
+        items.update().where(exercise_items).values(pitch=case(new_pitches, value=items.c.pitch))
+    ).rowcount
+
+    transpositions = RiffChordTransposition.__table__
+    stored = and_(transpositions.c.riff_id == items.c.riff_id, transpositions.c.pitch == items.c.pitch)
+    db.session.execute(
+        items.update()
+        .where(exercise_items)
+        .where(exists().where(stored))
+        .values(chord_info=select([transpositions.c.chord_info]).where(stored).as_scalar())
+    )
+
+    # alternate and backing track chord info are shifted by the interval, per distinct chord string
+    for column in (items.c.chord_info_alternate, items.c.chord_info_backing_track):
+        chord_infos = [
+            chord_info
+            for (chord_info,) in db.session.query(column)
+            .filter(RiffExerciseItem.riff_exercise_id == exercise.id)
+            .filter(column != "")
+            .distinct()
+        ]
+        if not chord_infos:
+            continue
+        try:
+            new_chord_infos = {
+                chord_info: cached_transpose_chord_info(chord_info, interval) for chord_info in chord_infos
+            }
+        except ChordError as error:
+            abort(400, f"Can't transpose exercise: {error}")
+        db.session.execute(
+            items.update()
+            .where(exercise_items)
+            .where(column.in_(chord_infos))
+            .values({column: case(new_chord_infos, value=column)})
+        )
+    # the chord symbols in the search vector changed with the chord info
+    update_search_vectors(db.session, exercise_ids=[str(exercise.id)])
+    return updated
+
+
+@api.route("/<string:exercise_id>/transpose")
+class ExerciseTransposeResource(Resource):
+    @roles_accepted("admin", "moderator", "student", "teacher", "operator")
+    @api.expect(exercise_transpose_fields)
+    @marshal_with(exercise_transposed_fields)
+    def post(self, exercise_id):
+        """Transpose the whole exercise to another key, by an interval in semitones or a new root key."""
+        exercise = load(RiffExercise, exercise_id)
+        if exercise.created_by != current_user.id and "admin" not in current_user.roles:
+            abort(403, "Not enough permission to transpose exercise")
+
+        payload = api.payload or {}
+        try:
+            if payload.get("root_key"):
+                if not exercise.root_key:
+                    abort(400, "Exercise has no root key to transpose from")
+                interval = interval_pitch(exercise.root_key, payload["root_key"])
+            elif payload.get("interval") is not None:
+                interval = SEMITONE_PITCHES[int(payload["interval"]) % 12]
+            else:
+                abort(400, "Provide an interval or a root_key")
+        except (ChordError, ValueError) as error:
+            abort(400, f"Invalid transpose: {error}")
+
+        updated = transpose_exercise(exercise, interval)
+        if exercise.root_key:
+            exercise.root_key = payload.get("root_key") or transpose_pitch(exercise.root_key, interval)
+        exercise.modified_at = datetime.datetime.now()
+        try:
+            db.session.commit()
+        except Exception as error:
+            db.session.rollback()
+            logger.error("DB exercise transpose caused a rollback", error=error)
+            abort(400, "DB error: {}".format(str(error)))
+        logger.info("Exercise transposed", id=exercise_id, interval=interval, updated_items=updated)
+        return {"id": exercise.id, "root_key": exercise.root_key, "interval": interval, "updated_items": updated}, 200
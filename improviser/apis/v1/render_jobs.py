@@ -0,0 +1,111 @@
+import structlog
+from apis.helpers import get_filter_from_args, get_range_from_args, get_sort_from_args, query_with_filters
+from database import RenderJob
+from flask_restx import Namespace, Resource, abort, fields, marshal_with
+from flask_security import roles_accepted
+from render_queue import complete_render_job, heartbeat_render_job, lease_render_jobs
+
+logger = structlog.get_logger(__name__)
+
+api = Namespace("render jobs", description="Render queue related operations")
+
+render_job_riff_fields = {
+    "id": fields.String,
+    "name": fields.String,
+    "notes": fields.String,
+    "chord_info": fields.String,
+    "render_valid": fields.Boolean,
+}
+
+render_job_fields = {
+    "id": fields.String,
+    "riff_id": fields.String,
+    "status": fields.String,
+    "priority": fields.Integer,
+    "attempts": fields.Integer,
+    "leased_by": fields.String,
+    "leased_at": fields.DateTime,
+    "heartbeat_at": fields.DateTime,
+    "error": fields.String,
+    "created_at": fields.DateTime,
+    "modified_at": fields.DateTime,
+}
+
+leased_render_job_fields = {**render_job_fields, "riff": fields.Nested(render_job_riff_fields)}
+
+lease_serializer = api.model(
+    "RenderJobLease",
+    {
+        "worker": fields.String(required=True, description="Unique name of the render worker"),
+        "limit": fields.Integer(description="Max number of jobs to lease", default=1),
+    },
+)
+
+worker_serializer = api.model(
+    "RenderJobWorker", {"worker": fields.String(required=True, description="Unique name of the render worker")},
+)
+
+complete_serializer = api.model(
+    "RenderJobComplete",
+    {
+        "worker": fields.String(required=True, description="Unique name of the render worker"),
+        "success": fields.Boolean(required=True, description="Whether the riff was rendered"),
+        "error": fields.String(description="Error message when the render failed"),
+    },
+)
+
+parser = api.parser()
+parser.add_argument("range", location="args", help="Pagination: default=[0,19]")
+parser.add_argument("sort", location="args", help='Sort: default=["created_at","DESC"]')
+parser.add_argument("filter", location="args", help="Filter default=[]")
+
+
+@api.route("/")
+@api.doc("Show the render queue.")
+class RenderJobResourceList(Resource):
+    @roles_accepted("admin")
+    @marshal_with(render_job_fields)
+    @api.doc(parser=parser)
+    def get(self):
+        args = parser.parse_args()
+        range = get_range_from_args(args)
+        sort = get_sort_from_args(args, "created_at", "DESC")
+        filter = get_filter_from_args(args)
+
+        query_result, content_range = query_with_filters(
+            RenderJob, RenderJob.query, range, sort, filter, quick_search_columns=["status", "leased_by"]
+        )
+        return query_result, 200, {"Content-Range": content_range}
+
+
+@api.route("/lease")
+class RenderJobLeaseResource(Resource):
+    @roles_accepted("admin")
+    @api.expect(lease_serializer)
+    @marshal_with(leased_render_job_fields)
+    def post(self):
+        """Lease queued render jobs, including the riff to render"""
+        limit = min(max(int(api.payload.get("limit") or 1), 1), 100)
+        return lease_render_jobs(api.payload["worker"], limit=limit), 200
+
+
+@api.route("/<id>/heartbeat")
+class RenderJobHeartbeatResource(Resource):
+    @roles_accepted("admin")
+    @api.expect(worker_serializer)
+    def put(self, id):
+        if not heartbeat_render_job(id, api.payload["worker"]):
+            abort(409, "Render job is not leased by this worker")
+        return "", 204
+
+
+@api.route("/<id>/complete")
+class RenderJobCompleteResource(Resource):
+    @roles_accepted("admin")
+    @api.expect(complete_serializer)
+    def put(self, id):
+        if not complete_render_job(
+            id, api.payload["worker"], success=api.payload["success"], error=api.payload.get("error")
+        ):
+            abort(409, "Render job is not leased by this worker")
+        return "", 204
@@ -7,21 +7,33 @@ from apis.helpers import (
     delete, get_range_from_args,
     get_sort_from_args,
     get_filter_from_args,
-    query_with_filters,
+    is_valid_uuid,
+    get_cursor_from_args,
+    get_exact_count_from_args,
+    get_fields_from_args,
+    get_include_from_args,
+    pagination_headers,
+    query_with_cursor,
     save,
     load,
     update,
 )
 from database import db
 from flask_login import current_user
-from flask_restx import Namespace, Resource, fields, marshal_with, reqparse, abort
+from flask_restx import Namespace, Resource, fields, marshal, marshal_with, reqparse, abort
 from database import Riff
+from apis.fieldsets import fieldset, fieldset_include, fieldset_options
+from apis.includes import include_columns, include_fields, include_options, tag_infos, user_info_marshaller
 from flask_security import roles_accepted
+from chord_transpositions import CHORD_COLUMNS, fill_chord_transpositions
+from render_queue import enqueue_render_job
 
 logger = structlog.get_logger(__name__)
 
 KEYS = ["c", "cis", "d", "dis", "ees", "e", "f", "fis", "g", "gis", "aes", "a", "ais", "bes", "b"]
 OCTAVES = [-1, 0, 1, 2]
+# Columns that end up in the rendered images: changing one of them queues a new render
+RENDER_COLUMNS = ["notes", "chord_info"]
 
 api = Namespace("riffs", description="Riff related operations")
 
@@ -48,6 +60,15 @@ riff_render_serializer = api.model(
     },
 )
 
+riff_bulk_render_serializer = api.model(
+    "RenderedRiffs",
+    {
+        "id": fields.String(required=True, description="Riff id"),
+        "render_valid": fields.Boolean(required=True, description="Whether a render is deemed valid."),
+        "image_info": fields.Raw(description="The metainfo for all images for this riff, per key, octave"),
+    },
+)
+
 image_info_marshaller = {
     "key_octave": fields.String,
     "width": fields.Integer,
@@ -79,6 +100,14 @@ riff_fields = {
     "created_by": fields.String(),
 }
 
+riff_list_fields = {
+    **riff_fields,
+    "user": fields.Nested(user_info_marshaller, allow_null=True),
+}
+
+# The default fieldset of the riff list: without the image_info, the size of every rendered image
+RIFF_LIST_FIELDS = tuple(key for key in riff_list_fields if key != "image_info")
+
 riff_detail_fields = {
     **riff_fields,
     "notes": fields.String,
@@ -94,19 +123,24 @@ parser = api.parser()
 parser.add_argument("range", location="args", help="Pagination: default=[0,19]")
 parser.add_argument("sort", location="args", help='Sort: default=["name","ASC"]')
 parser.add_argument("filter", location="args", help="Filter default=[]")
+parser.add_argument("cursor", location="args", help="Keyset pagination: the Next-Cursor header of the previous page")
+parser.add_argument("exact_count", location="args", help="Count the total exactly: default=false")
+parser.add_argument("include", location="args", help="Relations to include: tags,user default=tags")
+parser.add_argument("fields", location="args", help="Fields to return, e.g. name,chord default=all but image_info")
 
 
 @api.route("/")
 @api.doc("Show all riffs to users with sufficient rights. Provides the ability to filter on riff status and to search.")
 class RiffResourceList(Resource):
     @roles_accepted("admin", "moderator", "member", "student", "teacher")
-    @marshal_with(riff_fields)
     @api.expect(riff_arguments)
     def get(self):
         args = parser.parse_args()
         range = get_range_from_args(args)
         sort = get_sort_from_args(args)
         filter = get_filter_from_args(args)
+        selected_fields = get_fields_from_args(args, riff_list_fields, default=RIFF_LIST_FIELDS)
+        include = fieldset_include(get_include_from_args(args, Riff, default=("tags",)), selected_fields)
 
         riffs_query = Riff.query
         if "admin" not in current_user.roles:
@@ -118,20 +152,37 @@ class RiffResourceList(Resource):
                 roles=[role.name for role in current_user.roles],
             )
 
-        query_result, content_range = query_with_filters(
-            Riff, riffs_query, range, sort, filter, quick_search_columns=["name", "id"]
+        query_result, content_range, next_cursor = query_with_cursor(
+            Riff,
+            riffs_query,
+            range,
+            sort,
+            filter,
+            get_cursor_from_args(args),
+            quick_search_columns=["name", "id"],
+            exact_count=get_exact_count_from_args(args),
+            options=include_options(Riff, include)
+            + fieldset_options(Riff, selected_fields, required=(sort[0], *include_columns(include))),
         )
 
         for riff in query_result:
-            riff.tags = [{"id": tag.id, "name": tag.tag.name} for tag in riff.riff_to_tags]
+            if "tags" in include:
+                riff.tags = tag_infos(riff.riff_to_tags)
             riff.image = f"https://www.improviser.education/static/rendered/120/riff_{riff.id}_c.png"
-        return query_result, 200, {"Content-Range": content_range}
+        return (
+            marshal(query_result, fieldset(include_fields(riff_list_fields, include), selected_fields)),
+            200,
+            pagination_headers(content_range, next_cursor),
+        )
 
     @roles_accepted("admin", "moderator", "teacher")
     @api.expect(riff_serializer)
     @api.marshal_with(riff_serializer)
     def post(self):
         riff = Riff(id=str(uuid.uuid4()), **api.payload, created_by=str(current_user.id))
+        db.session.add(riff)
+        enqueue_render_job(riff.id)
+        fill_chord_transpositions(riff)
         save(riff)
         return riff, 201
 
@@ -175,7 +226,19 @@ class RiffResource(Resource):
     def put(self, id):
         """Edit Tag"""
         item = load(Riff, id)
+        render_changed = any(
+            api.payload[column] != getattr(item, column) for column in RENDER_COLUMNS if column in api.payload
+        )
+        chords_changed = any(
+            api.payload[column] != getattr(item, column) for column in CHORD_COLUMNS if column in api.payload
+        )
         item = update(item, api.payload)
+        if render_changed:
+            enqueue_render_job(item.id)
+        if chords_changed:
+            fill_chord_transpositions(item)
+        if render_changed or chords_changed:
+            save(item)
         return item, 201
 
     @roles_accepted("admin")
@@ -195,6 +258,42 @@ class UnrenderedRiffResourceList(Resource):
         return Riff.query.filter(Riff.render_valid.is_(False)).all()
 
 
+@api.route("/rendered")
+class RiffResourceListRendered(Resource):
+    @roles_accepted("admin")
+    @api.expect([riff_bulk_render_serializer])
+    def put(self):
+        """Store the render results of a batch of riffs in one transaction"""
+        payload = api.payload
+        if not isinstance(payload, list) or not all(isinstance(item, dict) and isinstance(item.get("id"), str)
+                                                    for item in payload):
+            abort(400, "Expected a list of rendered riffs")
+        ids = [item["id"] for item in payload]
+        invalid_ids = [riff_id for riff_id in ids if not is_valid_uuid(riff_id)]
+        if invalid_ids:
+            abort(400, f"Not a valid UUID4: {', '.join(invalid_ids)}")
+        found_ids = {str(riff_id) for riff_id, in db.session.query(Riff.id).filter(Riff.id.in_(ids))}
+        missing_ids = [riff_id for riff_id in ids if riff_id not in found_ids]
+        if missing_ids:
+            abort(404, f"Riffs not found: {', '.join(missing_ids)}")
+
+        render_date = datetime.datetime.now()
+        mappings = []
+        for item in payload:
+            mapping = {"id": item["id"], "render_valid": item.get("render_valid", True), "render_date": render_date}
+            if "image_info" in item:
+                mapping["image_info"] = item["image_info"]
+            mappings.append(mapping)
+        try:
+            db.session.bulk_update_mappings(Riff, mappings)
+            db.session.commit()
+        except Exception as error:
+            db.session.rollback()
+            abort(400, "DB error: {}".format(str(error)))
+        logger.info("Stored render results", riffs=len(mappings))
+        return "", 204
+
+
 @api.route("/rendered/<string:id>")
 class RiffResourceRendered(Resource):
     @roles_accepted("admin")
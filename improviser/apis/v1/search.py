@@ -0,0 +1,73 @@
+import structlog
+from apis.helpers import get_cursor_from_args, get_exact_count_from_args, get_range_from_args, pagination_headers
+from counts import count_query
+from database import db
+from flask_login import current_user
+from flask_restx import Namespace, Resource, abort, fields, marshal_with
+from flask_security import roles_accepted
+from full_text_search import encode_search_cursor, search_page, search_results
+
+logger = structlog.get_logger(__name__)
+
+api = Namespace("search", description="Full text search over riffs and exercises")
+
+search_result_fields = {
+    "id": fields.String,
+    "type": fields.String,
+    "name": fields.String,
+    "description": fields.String,
+    "is_public": fields.Boolean,
+    "created_by": fields.String,
+    "rank": fields.Float,
+    "image": fields.String,
+}
+
+parser = api.parser()
+parser.add_argument("q", location="args", required=True, help="Search terms, e.g. bebop Dm7")
+parser.add_argument("type", location="args", choices=("riff", "exercise"), help="Only search riffs or exercises")
+parser.add_argument("range", location="args", help="Pagination: default=[0,19]")
+parser.add_argument("cursor", location="args", help="Keyset pagination: the Next-Cursor header of the previous page")
+parser.add_argument("exact_count", location="args", help="Count the total exactly: default=false")
+
+
+@api.route("/")
+@api.doc("Search riffs and exercises on name, description, tags and chords, best matches first.")
+class SearchResource(Resource):
+    @roles_accepted("admin", "moderator", "member", "student", "teacher", "operator")
+    @marshal_with(search_result_fields)
+    @api.doc(parser=parser)
+    def get(self):
+        """Search riffs and exercises"""
+        args = parser.parse_args()
+        terms = (args["q"] or "").strip()
+        if not terms:
+            abort(400, "Provide search terms")
+        range = get_range_from_args(args)
+        types = (args["type"],) if args["type"] else ("riff", "exercise")
+
+        results = search_results(terms, current_user.id, "admin" in current_user.roles, types)
+        query = db.session.query(results)
+        total = count_query(query, exact=get_exact_count_from_args(args))
+
+        range_start, range_end = int(range[0]), int(range[1])
+        # Range is inclusive so we need to add one
+        range_length = max(range_end - range_start + 1, 0)
+        cursor = get_cursor_from_args(args)
+        items = search_page(results, query, range_length, cursor=cursor, offset=range_start)
+
+        next_cursor = encode_search_cursor(items[-1]) if items and len(items) == range_length else None
+        content_range = f"items {range_start}-{range_end}/{total}"
+        logger.info("Searched riffs and exercises", terms=terms, types=types, total=total)
+        return (
+            [
+                {
+                    **item._asdict(),
+                    "image": f"https://www.improviser.education/static/rendered/120/riff_{item.id}_c.png"
+                    if item.type == "riff"
+                    else None,
+                }
+                for item in items
+            ],
+            200,
+            pagination_headers(content_range, next_cursor),
+        )
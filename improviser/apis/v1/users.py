@@ -5,13 +5,24 @@ import hashlib
 import uuid
 
 import structlog
-from apis.helpers import get_range_from_args, get_sort_from_args, get_filter_from_args, query_with_filters
+from apis.helpers import (
+    get_cursor_from_args,
+    get_exact_count_from_args,
+    get_fields_from_args,
+    get_range_from_args,
+    get_sort_from_args,
+    get_filter_from_args,
+    pagination_headers,
+    query_with_cursor,
+)
 from flask_login import current_user
 
-from flask_restx import Namespace, Resource, fields, marshal_with, abort
+from flask_restx import Namespace, Resource, fields, marshal, marshal_with, abort
+from apis.fieldsets import fieldset, fieldset_options, selected
 from database import User, Instrument, UserPreference, db
 from flask_security import auth_token_required, roles_accepted
 from security import quick_token_required
+from sqlalchemy.orm import selectinload
 
 logger = structlog.get_logger(__name__)
 
@@ -36,6 +47,9 @@ user_fields = {
     "mail_announcements": fields.Boolean,
     "preferences": fields.Nested(user_preference_fields),
 }
+# The default fieldset of the user list: without the preferences and mail settings of every user
+USER_LIST_FIELDS = ("id", "username", "email", "first_name", "last_name", "created_at", "confirmed_at", "roles")
+
 quick_auth_fields = {
     "quick_token": fields.String,
     "quick_token_created_at": fields.DateTime,
@@ -60,24 +74,45 @@ parser = api.parser()
 parser.add_argument("range", location="args", help="Pagination: default=[0,19]")
 parser.add_argument("sort", location="args", help='Sort: default=["name","ASC"]')
 parser.add_argument("filter", location="args", help="Filter default=[]")
+parser.add_argument("cursor", location="args", help="Keyset pagination: the Next-Cursor header of the previous page")
+parser.add_argument("exact_count", location="args", help="Count the total exactly: default=false")
+parser.add_argument("fields", location="args", help="Fields to return, e.g. username,email default=all but settings")
 
 
 @api.route("/")
 @api.doc("Show all users to staff users.")
 class UserResourceList(Resource):
     @roles_accepted("admin")
-    @marshal_with(user_fields)
     @api.doc(parser=parser)
     def get(self):
         args = parser.parse_args()
         range = get_range_from_args(args)
         sort = get_sort_from_args(args, "email")
         filter = get_filter_from_args(args)
-
-        query_result, content_range = query_with_filters(
-            User, User.query, range, sort, filter, quick_search_columns=["username", "email", "first_name", "last_name"]
+        selected_fields = get_fields_from_args(args, user_fields, default=USER_LIST_FIELDS)
+
+        options = fieldset_options(User, selected_fields, required=(sort[0],))
+        if selected(selected_fields, "roles"):
+            options.append(selectinload(User.roles))
+        if selected(selected_fields, "preferences"):
+            options.append(selectinload(User.preferences))
+
+        query_result, content_range, next_cursor = query_with_cursor(
+            User,
+            User.query,
+            range,
+            sort,
+            filter,
+            get_cursor_from_args(args),
+            quick_search_columns=["username", "email", "first_name", "last_name"],
+            exact_count=get_exact_count_from_args(args),
+            options=options,
+        )
+        return (
+            marshal(query_result, fieldset(user_fields, selected_fields)),
+            200,
+            pagination_headers(content_range, next_cursor),
         )
-        return query_result, 200, {"Content-Range": content_range}
 
 
 @api.route("/current-user")
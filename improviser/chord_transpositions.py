@@ -0,0 +1,74 @@
+"""
+Materialized transpositions of the riff chords: one row per riff and pitch with the transposed chord info.
+
+Exercise items store the chord info of their riff in the pitch of the item. Instead of transposing it on every
+exercise save, it's computed once when a riff is created or its chords change, and read with one query for all items.
+"""
+import structlog
+from chords import ChordError
+from database import db, RiffChordTransposition
+from transpose import PITCH_INTERVALS, cached_transpose_chord_info
+
+logger = structlog.get_logger(__name__)
+
+# Riff columns the transposed chord info depends on
+CHORD_COLUMNS = ["chord", "chord_info", "number_of_bars"]
+
+
+def riff_chords(riff):
+    """The chords of a riff: its lilypond chord_info, or the chord name (e.g. "Cm7") for older riffs."""
+    return riff.chord_info or riff.chord
+
+
+def fill_chord_transpositions(riff):
+    """
+    (Re)compute the transposed chord info of the riff for every pitch.
+
+    The rows are added to the session; the caller is responsible for the commit.
+    """
+    RiffChordTransposition.query.filter(RiffChordTransposition.riff_id == riff.id).delete(synchronize_session=False)
+    chords = riff_chords(riff)
+    if not chords:
+        return []
+    transpositions = []
+    for pitch in PITCH_INTERVALS:
+        try:
+            chord_info = cached_transpose_chord_info(chords, pitch, riff.number_of_bars)
+        except ChordError as error:
+            logger.warning("Couldn't transpose riff chords", riff_id=str(riff.id), pitch=pitch, error=str(error))
+            continue
+        transpositions.append(RiffChordTransposition(riff_id=riff.id, pitch=pitch, chord_info=chord_info))
+    db.session.add_all(transpositions)
+    return transpositions
+
+
+def load_chord_transpositions(riff_pitches):
+    """Transposed chord info for (riff_id, pitch) pairs in one query, as {(riff_id, pitch): chord_info}."""
+    riff_pitches = {(str(riff_id), pitch) for riff_id, pitch in riff_pitches}
+    if not riff_pitches:
+        return {}
+    rows = (
+        db.session.query(
+            RiffChordTransposition.riff_id, RiffChordTransposition.pitch, RiffChordTransposition.chord_info
+        )
+        .filter(RiffChordTransposition.riff_id.in_({riff_id for riff_id, _ in riff_pitches}))
+        .filter(RiffChordTransposition.pitch.in_({pitch for _, pitch in riff_pitches}))
+        .all()
+    )
+    return {
+        (str(riff_id), pitch): chord_info
+        for riff_id, pitch, chord_info in rows
+        if (str(riff_id), pitch) in riff_pitches
+    }
+
+
+def riff_chord_info(riff, pitch, transpositions):
+    """
+    The chord info of the riff in the pitch from loaded transpositions. Riffs that aren't materialized yet (or pitches
+    that aren't stored) are transposed on the fly. Returns None for riffs without chords.
+    """
+    chord_info = transpositions.get((str(riff.id), pitch))
+    if chord_info is None and riff_chords(riff):
+        logger.debug("Transposing riff chords on the fly", riff_id=str(riff.id), pitch=pitch)
+        chord_info = cached_transpose_chord_info(riff_chords(riff), pitch, riff.number_of_bars)
+    return chord_info
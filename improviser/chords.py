@@ -0,0 +1,154 @@
+"""
+Parser for chord info in lilypond chordmode, e.g. "d2:m7 g:7 c1:maj7".
+
+A chord string is parsed once into a tuple of compact Chord tuples that all chord consumers (transposition, bar
+counting, backing track matching) work on, and serialized back to lilypond when needed. Parsing and serializing a
+valid chord string round trips exactly.
+"""
+import collections
+import re
+from fractions import Fraction
+
+LETTERS = "cdefgab"
+NATURALS = [0, 2, 4, 5, 7, 9, 11]  # semitones of the natural notes above c
+DURATIONS = {1, 2, 4, 8, 16, 32, 64}
+DEFAULT_DURATION = "4"  # LilyPond starts with quarter notes, until a chord sets a duration
+
+# root: the lilypond note name, pitch_class: 0-11 (c=0), duration: e.g. "1", "2." or None when the duration of the
+# previous chord is used, quality: the chord modifiers after the ":" e.g. "m7" or None for a major triad
+Chord = collections.namedtuple("Chord", ["root", "pitch_class", "duration", "quality"])
+
+CHORD = re.compile(r"([a-g](?:isis|eses|is|es|s)?)(\d+\.*)?(?::([a-z0-9.^+\-/]*))?$")
+
+
+class ChordError(ValueError):
+    pass
+
+
+def lilypond_name(letter, alteration):
+    """Lilypond note name of a letter (index in LETTERS) with an alteration in semitones, e.g. "cis" or "eeses"."""
+    return LETTERS[letter] + ("is" * alteration if alteration > 0 else "es" * -alteration)
+
+
+# {lilypond name: (letter, alteration)} for all notes with up to two accidentals, with the short "as" and "es" forms
+ROOTS = {
+    lilypond_name(letter, alteration): (letter, alteration)
+    for letter in range(len(LETTERS))
+    for alteration in range(-2, 3)
+}
+ROOTS.update({"as": (5, -1), "ases": (5, -2), "es": (2, -1), "eses": (2, -2)})
+
+
+def pitch_class(root):
+    letter, alteration = ROOTS[root]
+    return (NATURALS[letter] + alteration) % 12
+
+
+def spelling(root):
+    """Spelling of a root with "#" and "b" accidentals, e.g. "cis" => "c#" and "bes" => "bb"."""
+    letter, alteration = ROOTS[root]
+    return LETTERS[letter] + ("#" * alteration if alteration > 0 else "b" * -alteration)
+
+
+def make_chord(root, duration=None, quality=None):
+    if root not in ROOTS:
+        raise ChordError(f"Unknown root: {root}")
+    return Chord(root, pitch_class(root), duration, quality)
+
+
+def parse_chord(token):
+    match = CHORD.match(token)
+    if not match:
+        raise ChordError(f"Could not parse chord: {token}")
+    root, duration, quality = match.groups()
+    if duration and int(duration.rstrip(".")) not in DURATIONS:
+        raise ChordError(f"Invalid duration in chord: {token}")
+    return make_chord(root, duration, quality)
+
+
+def parse_chord_info(chord_string):
+    """Parse a lilypond chord string into a tuple of Chord's. Raises a ChordError for invalid chords."""
+    return tuple(parse_chord(token) for token in chord_string.split())
+
+
+def serialize_chord(chord):
+    return "%s%s%s" % (chord.root, chord.duration or "", "" if chord.quality is None else ":" + chord.quality)
+
+
+def serialize(chords):
+    return " ".join(serialize_chord(chord) for chord in chords)
+
+
+def chord_symbol(chord):
+    """Lead sheet symbol of a chord, e.g. d2:m7 => "Dm7", bes:7 => "Bb7" and fis => "F#"."""
+    spelled = spelling(chord.root)
+    return spelled[0].upper() + spelled[1:] + (chord.quality or "")
+
+
+def duration_in_bars(duration):
+    """Length of a lilypond duration in 4/4 bars, e.g. "2" => 1/2 and "2." => 3/4."""
+    digits = duration.rstrip(".")
+    length = Fraction(1, int(digits))
+    dotted = length
+    for _ in range(len(duration) - len(digits)):
+        dotted /= 2
+        length += dotted
+    return length
+
+
+def chord_lengths(chords):
+    """Length in bars of every chord, chords without duration last as long as the previous one."""
+    duration = DEFAULT_DURATION
+    lengths = []
+    for chord in chords:
+        duration = chord.duration or duration
+        lengths.append(duration_in_bars(duration))
+    return lengths
+
+
+def number_of_bars(chords):
+    """Total length of the chords in bars, as a Fraction."""
+    return sum(chord_lengths(chords), Fraction(0))
+
+
+def chords_before_bar(chords, bar_number):
+    """The chords that end before bar `bar_number` (1 based) starts."""
+    position = Fraction(0)
+    for index, length in enumerate(chord_lengths(chords)):
+        position += length
+        if position > bar_number - 1:
+            return chords[:index]
+    return chords
+
+
+# Chord names as used in riff.chord, e.g. "C", "C#7", "Bbm7", "CM7" or "Cmaj7"
+NAME_MOOD = {"M": "maj", "m": "m"}
+
+
+def parse_chord_name(name):
+    """Parse a chord name like "Cm7" into a chord of one bar: c1:m7. Raises a ChordError when it can't be parsed."""
+    if not name or not name[0].isupper():
+        raise ChordError(f"Could not parse chord name: {name}")
+    o = 1 if len(name) > 1 and name[1] in ("#", "b") else 0
+    root = name[0].lower() + {"#": "is", "b": "es"}.get(name[1], "") if o else name[0].lower()
+    if root not in ROOTS:
+        raise ChordError(f"Could not parse chord name: {name}")
+    digit = ""
+    if len(name) == 1 + o:
+        quality = None
+    elif name[1 + o].isdigit():  # Handle C7, C#7, Bb7
+        quality = ""
+        digit = name[1 + o]
+    elif len(name) == 2 + o:  # Handle Cm, C#m, Bbm, CM, C#M
+        quality = NAME_MOOD.get(name[1 + o], name[1 + o])
+    elif len(name) == 3 + o:  # Handle Cm7, C#m7, CM7, BbM9, Cm9, CM6
+        quality = NAME_MOOD.get(name[1 + o], name[1 + o])
+        digit = name[2 + o]
+    elif len(name) == 4 + o:  # Handle Cmaj
+        quality = name[1 + o : 4 + o]
+    elif len(name) == 5 + o:  # Handle Cmaj7
+        quality = name[1 + o : 4 + o]
+        digit = name[4 + o]
+    else:
+        raise ChordError(f"Could not parse chord name: {name}")
+    return make_chord(root, "1", quality if quality is None else quality + digit)
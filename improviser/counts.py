@@ -0,0 +1,144 @@
+"""
+Counting strategies for the totals in the Content-Range header of the list endpoints.
+
+An exact `SELECT count(*)` over the filtered query is often slower than fetching the page itself. Counts are cached per
+count query (the compiled SQL and its parameters, which include the filters and the user scope of the query) and
+invalidated when one of the tables in the query is written. Unfiltered counts of large tables use the estimate of the
+Postgres planner. Exact counts stay available with `exact=True`.
+
+Writes are detected with the engine events of table_writes.py, so the cache is only coherent within one process;
+COUNT_CACHE_TTL bounds how stale a count from another process can be.
+"""
+import os
+import threading
+import time
+
+import structlog
+from database import db
+from sqlalchemy import Table, text
+from sqlalchemy.sql.util import find_tables
+from table_writes import on_table_write
+
+logger = structlog.get_logger(__name__)
+
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", 60))
+COUNT_CACHE_SIZE = int(os.getenv("COUNT_CACHE_SIZE", 1024))
+# Unfiltered tables with more (estimated) rows than this get the planner estimate instead of an exact count
+COUNT_ESTIMATE_THRESHOLD = int(os.getenv("COUNT_ESTIMATE_THRESHOLD", 100000))
+
+ESTIMATE = text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table_name)")
+
+
+class CountCache:
+    """Counts per query key, valid while none of the tables of the query is written and for at most `ttl` seconds."""
+
+    def __init__(self, ttl=COUNT_CACHE_TTL, maxsize=COUNT_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._counts = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def _snapshot(self, tables):
+        return tuple(self._generations.get(table, 0) for table in tables)
+
+    def get(self, key, tables):
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry and entry[1] == self._snapshot(tables) and entry[2] > time.time():
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def set(self, key, tables, count, generations):
+        with self._lock:
+            # a write that happened while counting makes the count stale already
+            if generations != self._snapshot(tables):
+                return
+            if len(self._counts) >= self.maxsize:
+                self._counts.clear()
+            self._counts[key] = (count, generations, time.time() + self.ttl)
+
+    def generations(self, tables):
+        with self._lock:
+            return self._snapshot(tables)
+
+    def invalidate(self, tables):
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._counts), "maxsize": self.maxsize}
+
+
+count_cache = CountCache()
+
+
+@on_table_write()
+def invalidate_written_tables(tables):
+    if tables is None:
+        count_cache.clear()
+    else:
+        count_cache.invalidate(tables)
+
+
+def query_tables(query):
+    """Names of all tables the query reads, also from joins, aliases and subqueries."""
+    return sorted({table.name for table in find_tables(query.statement)})
+
+
+def unfiltered_table(query):
+    """
+    The name of the table of a query over all rows of one mapped table, None for other queries: a query over an alias,
+    a subquery or a join selects other rows than the table has, even without a WHERE clause.
+    """
+    statement = query.statement
+    froms = statement.froms
+    if len(froms) != 1 or not isinstance(froms[0], Table):
+        return None
+    if statement._whereclause is not None or statement._distinct or statement._group_by_clause.clauses:
+        return None
+    return froms[0].name
+
+
+def estimate_count(table_name):
+    """Row estimate of the Postgres planner (updated by ANALYZE and autovacuum), None when unknown."""
+    estimate = db.session.execute(ESTIMATE, {"table_name": table_name}).scalar()
+    return estimate if estimate is not None and estimate >= 0 else None
+
+
+def count_query(query, exact=False):
+    """
+    The number of rows of the query. Cached exact count by default, or the planner estimate for an unfiltered query
+    on a table larger than COUNT_ESTIMATE_THRESHOLD. With `exact` the query is always counted.
+    """
+    # the order doesn't change the count
+    query = query.order_by(None)
+    if exact:
+        return query.count()
+
+    table = unfiltered_table(query)
+    if table:
+        estimate = estimate_count(table)
+        if estimate is not None and estimate > COUNT_ESTIMATE_THRESHOLD:
+            logger.debug("Using estimated count", table=table, estimate=estimate)
+            return estimate
+
+    tables = query_tables(query)
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    key = (str(compiled), tuple(sorted((name, repr(value)) for name, value in compiled.params.items())))
+    count = count_cache.get(key, tables)
+    if count is None:
+        generations = count_cache.generations(tables)
+        count = query.count()
+        count_cache.set(key, tables, count, generations)
+    return count
@@ -10,11 +10,24 @@ from flask_sqlalchemy import SQLAlchemy
 from libgravatar import Gravatar
 
 from sqlalchemy import Boolean, Column, DateTime, Enum, Integer, Float, JSON, ForeignKey, String
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+from sqlalchemy.orm import backref, deferred, relationship
 
 db = SQLAlchemy()
 
+# The trigram indexes of the quick search need pg_trgm, also when the tables are made with db.create_all()
+sqlalchemy.event.listen(db.Model.metadata, "before_create", sqlalchemy.DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+def trigram_index(table_name, column_name):
+    """GIN index with the pg_trgm operators, used for ILIKE '%term%' searches on the column (see quick_search.py)."""
+    return sqlalchemy.Index(
+        f"ix_{table_name}_{column_name}_trgm",
+        column_name,
+        postgresql_using="gin",
+        postgresql_ops={column_name: "gin_trgm_ops"},
+    )
+
 
 class RolesUsers(db.Model):
     __tablename__ = "roles_users"
@@ -40,6 +53,7 @@ class Role(db.Model, RoleMixin):
 
 class User(db.Model, UserMixin):
     __tablename__ = "user"
+    __table_args__ = tuple(trigram_index("user", column) for column in ("username", "email", "first_name", "last_name"))
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     email = Column(String(255), unique=True)
     first_name = Column(String(255), index=True)
@@ -104,6 +118,10 @@ class Tag(db.Model):
 
 class Riff(db.Model):
     __tablename__ = "riffs"
+    __table_args__ = (
+        *(trigram_index("riffs", column) for column in ("name", "chord", "notes")),
+        sqlalchemy.Index("ix_riffs_search_vector", "search_vector", postgresql_using="gin"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     name = Column(String(255), unique=True, index=True)
     number_of_bars = Column(Integer())
@@ -116,10 +134,13 @@ class Riff(db.Model):
     render_date = Column(DateTime)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     created_by = Column("created_by", UUID(as_uuid=True), ForeignKey("user.id"))
+    user = relationship("User")
     image_info = Column(JSON)
     riff_tags = relationship("Tag", secondary="riff_tags")
     riff_to_tags = relationship("RiffTag")
     is_public = Column(Boolean, default=False)
+    # maintained by full_text_search.py, only used in queries so it's not loaded with the rows
+    search_vector = deferred(Column(TSVECTOR))
 
     def __repr__(self):
         return "<Riff %r %s bars, id:%s>" % (self.name, self.number_of_bars, self.id)
@@ -127,6 +148,10 @@ class Riff(db.Model):
 
 class RiffExercise(db.Model):
     __tablename__ = "riff_exercises"
+    __table_args__ = (
+        trigram_index("riff_exercises", "name"),
+        sqlalchemy.Index("ix_riff_exercises_search_vector", "search_vector", postgresql_using="gin"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     name = Column(String(255))
     description = Column(String())
@@ -145,6 +170,8 @@ class RiffExercise(db.Model):
     riff_exercise_to_tags = relationship("RiffExerciseTag")
     riff_exercise_items = relationship("RiffExerciseItem", cascade="all, delete-orphan", backref="parent")
     instruments = relationship("Instrument", secondary="riff_exercise_instruments")
+    # maintained by full_text_search.py, only used in queries so it's not loaded with the rows
+    search_vector = deferred(Column(TSVECTOR))
 
     def __repr__(self):
         return "<RiffExercise %r %s>>" % (self.name, self.id)
@@ -167,6 +194,7 @@ class RiffExercise(db.Model):
 
 class RiffExerciseItem(db.Model):
     __tablename__ = "riff_exercise_items"
+    __table_args__ = (trigram_index("riff_exercise_items", "chord_info"),)
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     riff_exercise_id = Column("riff_exercise_id", UUID(as_uuid=True), ForeignKey("riff_exercises.id"))
     riff_id = Column("riff_id", UUID(as_uuid=True), ForeignKey("riffs.id"))
@@ -188,6 +216,38 @@ class RiffExerciseItem(db.Model):
         return f"<RiffItem {self.riff.name} in {self.pitch}/{self.octave} chords: {self.chord_info}"
 
 
+class RenderJob(db.Model):
+    __tablename__ = "render_jobs"
+    __table_args__ = (sqlalchemy.Index("ix_render_jobs_status_priority", "status", "priority", "created_at"),)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    riff_id = Column("riff_id", UUID(as_uuid=True), ForeignKey("riffs.id"), index=True)
+    status = Column(String(20), default="queued")  # queued, leased, done or failed
+    priority = Column(Integer, default=0)
+    attempts = Column(Integer, default=0)
+    leased_by = Column(String(255))
+    leased_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    error = Column(String())
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    modified_at = Column(DateTime, default=datetime.datetime.utcnow)
+    riff = relationship("Riff", backref=backref("render_jobs", cascade="all, delete-orphan"))
+
+    def __repr__(self):
+        return f"<RenderJob {self.id} for riff {self.riff_id}: {self.status}>"
+
+
+class RiffChordTransposition(db.Model):
+    __tablename__ = "riff_chord_transpositions"
+    riff_id = Column("riff_id", UUID(as_uuid=True), ForeignKey("riffs.id"), primary_key=True)
+    pitch = Column(String(10), primary_key=True)
+    chord_info = Column(String(255))
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    riff = relationship("Riff", backref=backref("chord_transpositions", cascade="all, delete-orphan"))
+
+    def __repr__(self):
+        return f"<RiffChordTransposition {self.riff_id} in {self.pitch}: {self.chord_info}>"
+
+
 class RecentRiffExercise(db.Model):
     __tablename__ = "recent_riff_exercises"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
@@ -236,6 +296,7 @@ class RiffExerciseInstrument(db.Model):
 
 class BackingTrack(db.Model):
     __tablename__ = "backing_tracks"
+    __table_args__ = tuple(trigram_index("backing_tracks", column) for column in ("name", "file", "chord_info"))
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     name = Column(String(255), nullable=False)
     count_in = Column(Float(), default=0) # amount of seconds before the music starts in the audio. E.g. 1.4 for 1.4s
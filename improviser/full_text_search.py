@@ -0,0 +1,245 @@
+"""
+Ranked full text search over riffs and exercises.
+
+Every riff and exercise has a search_vector column with a tsvector of its name (weight A), its tag names and chord
+symbols (weight B) and its description (weight C), with a GIN index. The vectors are maintained by
+update_search_vectors(): after every flush that changes a riff, an exercise, their tags or exercise items (see the
+session events below) and by the set based updates that bypass the ORM. `flask update-search-vectors --all` fills them
+for existing rows.
+
+The "simple" text search configuration is used: names, tags and chords aren't words of one language, so they're not
+stemmed.
+"""
+import base64
+import itertools
+import json
+
+import structlog
+from chords import ChordError, chord_symbol, parse_chord
+from database import Riff, RiffExercise, RiffExerciseItem, RiffExerciseTag, RiffTag, Tag
+from flask_restx import abort
+from sqlalchemy import bindparam, cast, event, func, literal, null, or_, select, tuple_, union_all
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION, TSVECTOR
+from sqlalchemy.orm import Session
+
+logger = structlog.get_logger(__name__)
+
+SEARCH_CONFIG = "simple"
+
+# Attributes that end up in the search vector, per model
+DOCUMENT_ATTRIBUTES = {
+    Riff: ("name", "chord", "chord_info", "riff_tags"),
+    RiffExercise: ("name", "description", "riff_exercise_tags"),
+    RiffExerciseItem: ("chord_info", "riff_exercise_id"),
+    Tag: ("name",),
+}
+
+
+def weighted(name, weight):
+    return func.setweight(func.to_tsvector(SEARCH_CONFIG, bindparam(name)), weight, type_=TSVECTOR)
+
+
+# The search vector of one row: the bind parameters can't have the name of a column in an UPDATE
+SEARCH_VECTOR = (
+    weighted("search_name", "A").op("||")(weighted("search_keywords", "B")).op("||")(weighted("search_text", "C"))
+)
+
+
+def chord_symbols(chord_infos):
+    """The distinct lead sheet symbols of lilypond chord strings, chords that can't be parsed are skipped."""
+    symbols = []
+    for token in itertools.chain.from_iterable((chord_info or "").split() for chord_info in chord_infos):
+        try:
+            symbol = chord_symbol(parse_chord(token))
+        except ChordError:
+            continue
+        if symbol not in symbols:
+            symbols.append(symbol)
+    return symbols
+
+
+def grouped(session, query):
+    """{id: [values]} of a query with (id, value) rows."""
+    result = {}
+    for id, value in session.execute(query):
+        result.setdefault(id, []).append(value)
+    return result
+
+
+def update_search_vectors(session, riff_ids=(), exercise_ids=()):
+    """Recompute the search vectors of riffs and exercises with one UPDATE per table."""
+    riffs = Riff.__table__
+    if riff_ids:
+        tags = grouped(
+            session,
+            select([RiffTag.riff_id, Tag.name]).select_from(RiffTag.__table__.join(Tag.__table__))
+            .where(RiffTag.riff_id.in_(riff_ids)),
+        )
+        rows = [
+            {
+                "search_id": id,
+                "search_name": name or "",
+                "search_keywords": " ".join([chord or ""] + tags.get(id, []) + chord_symbols([chord_info])),
+                "search_text": "",
+            }
+            for id, name, chord, chord_info in session.execute(
+                select([riffs.c.id, riffs.c.name, riffs.c.chord, riffs.c.chord_info]).where(riffs.c.id.in_(riff_ids))
+            )
+        ]
+        if rows:
+            session.execute(
+                riffs.update().where(riffs.c.id == bindparam("search_id")).values(search_vector=SEARCH_VECTOR), rows
+            )
+
+    exercises = RiffExercise.__table__
+    if exercise_ids:
+        tags = grouped(
+            session,
+            select([RiffExerciseTag.riff_exercise_id, Tag.name])
+            .select_from(RiffExerciseTag.__table__.join(Tag.__table__))
+            .where(RiffExerciseTag.riff_exercise_id.in_(exercise_ids)),
+        )
+        chord_infos = grouped(
+            session,
+            select([RiffExerciseItem.riff_exercise_id, RiffExerciseItem.chord_info])
+            .where(RiffExerciseItem.riff_exercise_id.in_(exercise_ids))
+            .order_by(RiffExerciseItem.riff_exercise_id, RiffExerciseItem.order_number),
+        )
+        rows = [
+            {
+                "search_id": id,
+                "search_name": name or "",
+                "search_keywords": " ".join(tags.get(id, []) + chord_symbols(chord_infos.get(id, []))),
+                "search_text": description or "",
+            }
+            for id, name, description in session.execute(
+                select([exercises.c.id, exercises.c.name, exercises.c.description]).where(
+                    exercises.c.id.in_(exercise_ids)
+                )
+            )
+        ]
+        if rows:
+            session.execute(
+                exercises.update().where(exercises.c.id == bindparam("search_id")).values(search_vector=SEARCH_VECTOR),
+                rows,
+            )
+    logger.debug("Updated search vectors", riffs=len(riff_ids), exercises=len(exercise_ids))
+
+
+def search_target(instance):
+    """The search vector that a flushed instance changes, as (kind, id) with kind "riff", "exercise" or "tag"."""
+    if isinstance(instance, RiffTag):
+        return "riff", instance.riff_id
+    if isinstance(instance, RiffExerciseTag):
+        return "exercise", instance.riff_exercise_id
+    if isinstance(instance, Riff):
+        return "riff", instance.id
+    if isinstance(instance, RiffExercise):
+        return "exercise", instance.id
+    if isinstance(instance, RiffExerciseItem):
+        return "exercise", instance.riff_exercise_id
+    if isinstance(instance, Tag):
+        return "tag", instance.id
+    return None
+
+
+def changes_document(instance):
+    """Whether an updated instance changed one of the attributes that end up in a search vector."""
+    attributes = DOCUMENT_ATTRIBUTES.get(type(instance))
+    if not attributes:
+        return True
+    state = instance._sa_instance_state
+    return any(state.attrs[name].history.has_changes() for name in attributes)
+
+
+@event.listens_for(Session, "after_flush")
+def collect_search_changes(session, flush_context):
+    targets = session.info.setdefault("search_targets", set())
+    for instance in itertools.chain(session.new, session.deleted, filter(changes_document, session.dirty)):
+        target = search_target(instance)
+        if target and target[1]:
+            targets.add((target[0], str(target[1])))
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def update_changed_search_vectors(session, flush_context):
+    targets = session.info.pop("search_targets", set())
+    riff_ids = {id for kind, id in targets if kind == "riff"}
+    exercise_ids = {id for kind, id in targets if kind == "exercise"}
+    tag_ids = [id for kind, id in targets if kind == "tag"]
+    if tag_ids:
+        # a renamed tag changes all riffs and exercises with the tag
+        riff_tags = select([RiffTag.riff_id]).where(RiffTag.tag_id.in_(tag_ids))
+        exercise_tags = select([RiffExerciseTag.riff_exercise_id]).where(RiffExerciseTag.tag_id.in_(tag_ids))
+        riff_ids.update(str(id) for id, in session.execute(riff_tags))
+        exercise_ids.update(str(id) for id, in session.execute(exercise_tags))
+    if riff_ids or exercise_ids:
+        update_search_vectors(session, sorted(riff_ids), sorted(exercise_ids))
+
+
+def encode_search_cursor(result):
+    """Opaque cursor that points after a search result: its rank, type and id."""
+    cursor = json.dumps([result.rank, result.type, str(result.id)])
+    return base64.urlsafe_b64encode(cursor.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_search_cursor(cursor):
+    try:
+        rank, type, id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(rank), str(type), str(id)
+    except (ValueError, TypeError):
+        abort(400, "Invalid cursor")
+
+
+def ranked(type, model, description, query):
+    """The matches of one model for search_results()."""
+    return select(
+        [
+            literal(type).label("type"),
+            model.id,
+            model.name,
+            description.label("description"),
+            model.is_public,
+            model.created_by,
+            # cast to double precision, so the rank round trips exactly through the cursor
+            cast(func.ts_rank(model.search_vector, query), DOUBLE_PRECISION).label("rank"),
+        ]
+    ).where(model.search_vector.op("@@")(query))
+
+
+def search_results(terms, user_id, is_admin=False, types=("riff", "exercise")):
+    """
+    A selectable with the riffs and exercises that match the search terms and that the user may see (own or public,
+    and for riffs: rendered, unless the user is an admin), with their rank.
+    """
+    query = func.plainto_tsquery(SEARCH_CONFIG, terms)
+    selects = []
+    if "riff" in types:
+        riffs = ranked("riff", Riff, null(), query)
+        if not is_admin:
+            riffs = riffs.where(Riff.render_valid).where(or_(Riff.created_by == user_id, Riff.is_public.is_(True)))
+        selects.append(riffs)
+    if "exercise" in types:
+        exercises = ranked("exercise", RiffExercise, RiffExercise.description, query)
+        selects.append(
+            exercises.where(or_(RiffExercise.created_by == user_id, RiffExercise.is_public.is_(True)))
+        )
+    if not selects:
+        abort(400, "Nothing to search: use type riff or exercise")
+    return union_all(*selects).alias("search_results")
+
+
+def search_page(results, query, range_length, cursor=None, offset=0):
+    """
+    One page of a query on search_results(), best ranked first. Results with the same rank are ordered by type and id,
+    so the keyset cursor (rank, type, id) points to one position.
+    """
+    if cursor:
+        rank, type, id = decode_search_cursor(cursor)
+        query = query.filter(
+            tuple_(results.c.rank, results.c.type, results.c.id)
+            < tuple_(literal(rank, DOUBLE_PRECISION), literal(type), literal(id, results.c.id.type))
+        )
+    elif offset:
+        query = query.offset(offset)
+    return query.order_by(results.c.rank.desc(), results.c.type.desc(), results.c.id.desc()).limit(range_length).all()
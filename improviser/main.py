@@ -1,5 +1,7 @@
 import hashlib
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 import click
 import structlog
@@ -42,8 +44,11 @@ from flask_security.confirmable import send_confirmation_instructions, generate_
 from security import ExtendedRegisterForm, ExtendedJSONRegisterForm, _security
 
 from apis import api
+from chord_transpositions import fill_chord_transpositions
+from full_text_search import update_search_vectors
 from sqlalchemy import or_
-from utils import fix_exercise_chords
+from transpose import transposition_cache
+from utils import fix_exercise_chords_in_batches
 from version import VERSION
 
 logger = structlog.get_logger(__name__)
@@ -59,7 +64,7 @@ CORS(
     resources="/*",
     allow_headers="*",
     origins="*",
-    expose_headers="Authorization,Content-Type,Authentication-Token,Quick-Authentication-Token,Content-Range",
+    expose_headers="Authorization,Content-Type,Authentication-Token,Quick-Authentication-Token,Content-Range,Next-Cursor",
 )
 DATABASE_URI = os.getenv("DATABASE_URI", "postgresql://postgres:@localhost/improviser-test")  # Setup FOR TRAVIS
 app.config["DEBUG"] = False if not os.getenv("DEBUG") else True
@@ -182,18 +187,26 @@ migrate = Migrate(app, db)
 logger.info("Ready loading admin views and api")
 
 
-# Todo: move to better place
+def fix_exercise_chords_partition(index, count, batch_size, dry_run):
+    """Run one id range partition of fix-exercise-chords in a worker process."""
+    with app.app_context():
+        # connections of the parent process can't be shared with a forked worker
+        db.engine.dispose()
+        return fix_exercise_chords_in_batches(
+            RiffExercise.query, batch_size=batch_size, dry_run=dry_run, partition=(index, count)
+        )
+
+
 @app.cli.command("fix-exercise-chords")
 @click.argument("exercises", nargs=-1)
 @click.option("--all/--not-all", "-A", default=False)
-def fix_all_exercise_chords(exercises, all):
+@click.option("--dry-run", is_flag=True, help="Only log the changes")
+@click.option("--batch-size", default=500, help="Exercises per batch (and per bulk update)")
+@click.option("--partition", help="Only fix one id range, e.g. 2/8 for the third of 8 partitions")
+@click.option("--workers", default=1, help="Split all exercises over this number of worker processes")
+def fix_all_exercise_chords(exercises, all, dry_run, batch_size, partition, workers):
     if exercises:
-        exercise_query = RiffExercise.query
-
-        conditions = []
-        for item in exercises:
-            conditions.append(RiffExercise.id == item)
-        exercise_query = exercise_query.filter(or_(*conditions))
+        exercise_query = RiffExercise.query.filter(RiffExercise.id.in_(exercises))
     elif all:
         logger.info("Querying ALL exercises")
         exercise_query = RiffExercise.query
@@ -201,9 +214,62 @@ def fix_all_exercise_chords(exercises, all):
         logger.warning("Cowardly refusing to run on all without `--all` mode set.")
         return
 
-    for index, exercise in enumerate(exercise_query.all()):
-        logger.info("Working for exercise", name=exercise.name, counter=index)
-        fix_exercise_chords(exercise)
+    start = time.time()
+    if workers > 1 and not exercises:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(fix_exercise_chords_partition, index, workers, batch_size, dry_run)
+                for index in range(workers)
+            ]
+            results = [future.result() for future in futures]
+        stats = {key: sum(result[key] for result in results) for key in results[0]}
+    else:
+        if partition:
+            index, count = (int(number) for number in partition.split("/"))
+            partition = (index, count)
+        stats = fix_exercise_chords_in_batches(
+            exercise_query, batch_size=batch_size, dry_run=dry_run, partition=partition
+        )
+    elapsed = time.time() - start
+    logger.info("Fixed exercise chords", dry_run=dry_run, seconds=round(elapsed, 1),
+                exercises_per_second=round(stats["exercises"] / elapsed, 1) if elapsed else None, **stats)
+    logger.info("Transposition cache", **transposition_cache.stats())
+
+
+@app.cli.command("fill-chord-transpositions")
+@click.argument("riffs", nargs=-1)
+@click.option("--all/--not-all", "-A", default=False)
+def fill_all_chord_transpositions(riffs, all):
+    if riffs:
+        riff_query = Riff.query.filter(Riff.id.in_(riffs))
+    elif all:
+        logger.info("Querying ALL riffs")
+        riff_query = Riff.query
+    else:
+        logger.warning("Cowardly refusing to run on all without `--all` mode set.")
+        return
+
+    for index, riff in enumerate(riff_query.all()):
+        logger.info("Filling chord transpositions", name=riff.name, counter=index)
+        fill_chord_transpositions(riff)
+    db.session.commit()
+    logger.info("Transposition cache", **transposition_cache.stats())
+
+
+@app.cli.command("update-search-vectors")
+@click.option("--all/--not-all", "-A", default=False)
+@click.option("--batch-size", default=500, help="Riffs or exercises per UPDATE")
+def update_all_search_vectors(all, batch_size):
+    if not all:
+        logger.warning("Cowardly refusing to run on all without `--all` mode set.")
+        return
+
+    for model, argument in ((Riff, "riff_ids"), (RiffExercise, "exercise_ids")):
+        ids = [str(id) for id, in db.session.query(model.id).order_by(model.id)]
+        for start in range(0, len(ids), batch_size):
+            update_search_vectors(db.session, **{argument: ids[start : start + batch_size]})
+            db.session.commit()
+        logger.info("Updated search vectors", table=model.__tablename__, count=len(ids))
 
 
 @app.cli.command("resend-email-verification")
@@ -0,0 +1,62 @@
+"""Add render jobs
+
+Revision ID: 3f8a6c2d9b17
+Revises: 95b23230231e
+Create Date: 2026-10-18 11:20:12.314159
+
+"""
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "3f8a6c2d9b17"
+down_revision = "95b23230231e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "render_jobs",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("riff_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("status", sa.String(length=20), nullable=True),
+        sa.Column("priority", sa.Integer(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=True),
+        sa.Column("leased_by", sa.String(length=255), nullable=True),
+        sa.Column("leased_at", sa.DateTime(), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("modified_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["riff_id"], ["riffs.id"],),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_render_jobs_id"), "render_jobs", ["id"], unique=False)
+    op.create_index(op.f("ix_render_jobs_riff_id"), "render_jobs", ["riff_id"], unique=False)
+    op.create_index(
+        "ix_render_jobs_status_priority", "render_jobs", ["status", "priority", "created_at"], unique=False
+    )
+
+    # Queue all riffs that are waiting for a render
+    conn = op.get_bind()
+    result = conn.execute(sa.text("SELECT id FROM riffs WHERE render_valid IS NOT TRUE"))
+    for (riff_id,) in result.fetchall():
+        conn.execute(
+            sa.text(
+                """INSERT INTO render_jobs (id, riff_id, status, priority, attempts, created_at, modified_at)
+                VALUES (:id, :riff_id, 'queued', 0, 0, now(), now())"""
+            ),
+            id=str(uuid.uuid4()),
+            riff_id=riff_id,
+        )
+
+
+def downgrade():
+    op.drop_index("ix_render_jobs_status_priority", table_name="render_jobs")
+    op.drop_index(op.f("ix_render_jobs_riff_id"), table_name="render_jobs")
+    op.drop_index(op.f("ix_render_jobs_id"), table_name="render_jobs")
+    op.drop_table("render_jobs")
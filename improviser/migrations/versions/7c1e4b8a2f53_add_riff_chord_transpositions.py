@@ -0,0 +1,33 @@
+"""Add riff chord transpositions
+
+Revision ID: 7c1e4b8a2f53
+Revises: 3f8a6c2d9b17
+Create Date: 2026-10-18 15:42:37.271828
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "7c1e4b8a2f53"
+down_revision = "3f8a6c2d9b17"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled by the API, run `flask fill-chord-transpositions --all` once to fill it for the existing riffs
+    op.create_table(
+        "riff_chord_transpositions",
+        sa.Column("riff_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("pitch", sa.String(length=10), nullable=False),
+        sa.Column("chord_info", sa.String(length=255), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["riff_id"], ["riffs.id"],),
+        sa.PrimaryKeyConstraint("riff_id", "pitch"),
+    )
+
+
+def downgrade():
+    op.drop_table("riff_chord_transpositions")
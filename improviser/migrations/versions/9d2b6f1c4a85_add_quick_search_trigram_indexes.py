@@ -0,0 +1,41 @@
+"""Add trigram indexes for the quick search
+
+Revision ID: 9d2b6f1c4a85
+Revises: 7c1e4b8a2f53
+Create Date: 2026-10-18 17:05:12.418203
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9d2b6f1c4a85"
+down_revision = "7c1e4b8a2f53"
+branch_labels = None
+depends_on = None
+
+TRIGRAM_INDEXES = {
+    "user": ["username", "email", "first_name", "last_name"],
+    "riffs": ["name", "chord", "notes"],
+    "riff_exercises": ["name"],
+    "riff_exercise_items": ["chord_info"],
+    "backing_tracks": ["name", "file", "chord_info"],
+}
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table_name, column_names in TRIGRAM_INDEXES.items():
+        for column_name in column_names:
+            op.create_index(
+                f"ix_{table_name}_{column_name}_trgm",
+                table_name,
+                [column_name],
+                postgresql_using="gin",
+                postgresql_ops={column_name: "gin_trgm_ops"},
+            )
+
+
+def downgrade():
+    for table_name, column_names in TRIGRAM_INDEXES.items():
+        for column_name in column_names:
+            op.drop_index(f"ix_{table_name}_{column_name}_trgm", table_name=table_name)
@@ -0,0 +1,29 @@
+"""Add full text search vectors to riffs and exercises
+
+Revision ID: b4e81d7a2c69
+Revises: 9d2b6f1c4a85
+Create Date: 2026-10-18 19:21:44.903615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "b4e81d7a2c69"
+down_revision = "9d2b6f1c4a85"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Maintained by the API, run `flask update-search-vectors --all` once to fill them for the existing rows
+    for table_name in ("riffs", "riff_exercises"):
+        op.add_column(table_name, sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True))
+        op.create_index(f"ix_{table_name}_search_vector", table_name, ["search_vector"], postgresql_using="gin")
+
+
+def downgrade():
+    for table_name in ("riffs", "riff_exercises"):
+        op.drop_index(f"ix_{table_name}_search_vector", table_name=table_name)
+        op.drop_column(table_name, "search_vector")
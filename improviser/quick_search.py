@@ -0,0 +1,58 @@
+"""
+Quick search: the "q" filter of the list endpoints and the search box of the admin views.
+
+Text columns are matched with ILIKE '%term%' on the column itself, without a cast, so Postgres can use the trigram
+GIN indexes on them (see trigram_index() in database.py). Terms that look like a UUID, or the start of one, are looked
+up on the UUID columns instead: with an exact match for a full UUID and a range scan of the index for a prefix. Integer
+columns only match a number exactly.
+"""
+import re
+import uuid
+
+from sqlalchemy import Enum, Integer, String, cast, false, or_
+from sqlalchemy.dialects.postgresql import UUID
+
+# At least 8 hex digits, with or without the dashes: shorter terms are more likely a word than an id
+UUID_TERM = re.compile(r"[0-9a-f]{8}(-?[0-9a-f]{1,4})*-?", re.IGNORECASE)
+
+
+def uuid_bounds(term):
+    """The range of UUIDs that start with the term, None when the term doesn't look like (the start of) a UUID."""
+    digits = term.replace("-", "").lower()
+    if not UUID_TERM.fullmatch(term) or len(digits) > 32:
+        return None
+    return uuid.UUID(digits.ljust(32, "0")), uuid.UUID(digits.ljust(32, "f"))
+
+
+# Not a backslash, which would need escaping itself depending on standard_conforming_strings
+LIKE_ESCAPE = "/"
+
+
+def escape_like(term):
+    return term.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2).replace("%", LIKE_ESCAPE + "%").replace("_", LIKE_ESCAPE + "_")
+
+
+def search_condition(columns, term, pattern=None):
+    """
+    Condition for rows where one of the columns matches the search term. `pattern` is the LIKE pattern for the text
+    columns, by default rows that contain the term.
+    """
+    bounds = uuid_bounds(term)
+    uuid_columns = [column for column in columns if isinstance(column.type, UUID)]
+    if bounds and uuid_columns:
+        lower, upper = bounds
+        return or_(*[column == lower if lower == upper else column.between(lower, upper) for column in uuid_columns])
+
+    pattern = pattern or f"%{escape_like(term)}%"
+    conditions = []
+    for column in columns:
+        if isinstance(column.type, UUID):
+            continue
+        elif isinstance(column.type, Integer):
+            if term.isdigit():
+                conditions.append(column == int(term))
+        elif isinstance(column.type, String) and not isinstance(column.type, Enum):
+            conditions.append(column.ilike(pattern, escape=LIKE_ESCAPE))
+        else:
+            conditions.append(cast(column, String).ilike(pattern, escape=LIKE_ESCAPE))
+    return or_(*conditions) if conditions else false()
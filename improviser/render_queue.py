@@ -0,0 +1,119 @@
+import datetime
+import uuid
+
+import structlog
+from database import db, RenderJob
+from sqlalchemy import and_, or_
+
+logger = structlog.get_logger(__name__)
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+# A leased job without a heartbeat for this long is considered abandoned and will be leased again
+LEASE_TIMEOUT = datetime.timedelta(minutes=10)
+MAX_ATTEMPTS = 3
+
+# Admins re-rendering a riff by hand go before riffs that are queued by create/update
+PRIORITY_DEFAULT = 0
+PRIORITY_ADMIN = 10
+
+
+def enqueue_render_job(riff_id, priority=PRIORITY_DEFAULT):
+    """
+    Queue a render of the riff. A riff that is already queued isn't queued twice: only the priority is raised.
+
+    The job is added to the session; the caller is responsible for the commit.
+    """
+    job = RenderJob.query.filter(RenderJob.riff_id == riff_id).filter(RenderJob.status == QUEUED).first()
+    if job:
+        job.priority = max(job.priority or 0, priority)
+        job.modified_at = datetime.datetime.utcnow()
+    else:
+        job = RenderJob(id=str(uuid.uuid4()), riff_id=riff_id, status=QUEUED, priority=priority, attempts=0)
+        db.session.add(job)
+    logger.info("Queued render job", riff_id=str(riff_id), priority=job.priority)
+    return job
+
+
+def lease_render_jobs(worker, limit=1, timeout=LEASE_TIMEOUT):
+    """
+    Lease up to `limit` jobs for the worker, highest priority first.
+
+    Rows are locked with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers never lease the same job and don't
+    wait on each other. Leased jobs whose heartbeat timed out are leased again until MAX_ATTEMPTS is reached, after
+    that they're marked as failed.
+    """
+    now = datetime.datetime.utcnow()
+    timed_out = and_(RenderJob.status == LEASED, RenderJob.heartbeat_at < now - timeout)
+    exhausted = (
+        RenderJob.query.filter(timed_out)
+        .filter(RenderJob.attempts >= MAX_ATTEMPTS)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for job in exhausted:
+        logger.warning("Failing abandoned render job", id=str(job.id), leased_by=job.leased_by, attempts=job.attempts)
+        job.status = FAILED
+        job.error = f"Lease of {job.leased_by} timed out after {job.attempts} attempts"
+        job.modified_at = now
+
+    jobs = (
+        RenderJob.query.filter(or_(RenderJob.status == QUEUED, timed_out))
+        .filter(RenderJob.attempts < MAX_ATTEMPTS)
+        .order_by(RenderJob.priority.desc(), RenderJob.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for job in jobs:
+        if job.status == LEASED:
+            logger.warning("Recovering abandoned render job", id=str(job.id), leased_by=job.leased_by)
+        job.status = LEASED
+        job.leased_by = worker
+        job.leased_at = now
+        job.heartbeat_at = now
+        job.attempts = (job.attempts or 0) + 1
+        job.modified_at = now
+    db.session.commit()
+    logger.info("Leased render jobs", worker=worker, jobs=len(jobs))
+    return jobs
+
+
+def _leased_job(job_id, worker):
+    return (
+        RenderJob.query.filter(RenderJob.id == job_id)
+        .filter(RenderJob.status == LEASED)
+        .filter(RenderJob.leased_by == worker)
+        .first()
+    )
+
+
+def heartbeat_render_job(job_id, worker):
+    """Extend the lease of a job. Returns False when the worker lost its lease."""
+    job = _leased_job(job_id, worker)
+    if not job:
+        return False
+    job.heartbeat_at = datetime.datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def complete_render_job(job_id, worker, success=True, error=None):
+    """Mark a leased job as done or failed. A failed job is queued again while it has attempts left."""
+    job = _leased_job(job_id, worker)
+    if not job:
+        return False
+    if success:
+        job.status = DONE
+    elif job.attempts < MAX_ATTEMPTS:
+        job.status = QUEUED
+    else:
+        job.status = FAILED
+    job.error = error
+    job.modified_at = datetime.datetime.utcnow()
+    db.session.commit()
+    logger.info("Render job completed", id=str(job.id), worker=worker, status=job.status, error=error)
+    return True
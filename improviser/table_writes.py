@@ -0,0 +1,54 @@
+"""
+Notifications of writes to tables, for the in-process caches of query results (see counts.py and tag_filter.py).
+
+Writes are detected with engine events for INSERT, UPDATE and DELETE statements (ORM flushes, bulk and core updates),
+so the notifications only cover the writes of this process. Subscribers are notified right after the statement and
+again when its transaction ends: a read of another session in between still sees the old rows. DDL notifies all
+subscribers with None, any table may have changed.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import DDLElement
+from sqlalchemy.sql.dml import UpdateBase
+
+# [(callback, table names or None for all tables)]
+_subscribers = []
+
+
+def on_table_write(*table_names):
+    """
+    Decorator that subscribes callback(tables) to writes of the tables (of all tables when none are given). `tables` is
+    the set of written table names, or None after DDL.
+    """
+
+    def subscribe(callback):
+        _subscribers.append((callback, frozenset(table_names) or None))
+        return callback
+
+    return subscribe
+
+
+def notify(tables):
+    for callback, table_names in _subscribers:
+        if tables is None or table_names is None:
+            callback(tables)
+        elif tables & table_names:
+            callback(tables & table_names)
+
+
+@event.listens_for(Engine, "after_execute")
+def notify_written_table(conn, clauseelement, multiparams, params, result):
+    if isinstance(clauseelement, UpdateBase):
+        table_name = clauseelement.table.name
+        notify({table_name})
+        conn.info.setdefault("written_tables", set()).add(table_name)
+    elif isinstance(clauseelement, DDLElement):
+        notify(None)
+
+
+@event.listens_for(Engine, "commit")
+@event.listens_for(Engine, "rollback")
+def notify_on_transaction_end(conn):
+    tables = conn.info.pop("written_tables", None)
+    if tables:
+        notify(tables)
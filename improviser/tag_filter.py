@@ -0,0 +1,109 @@
+"""
+Tag filters for the list endpoints: rows with any of, or all of, a set of tags.
+
+Tag names are resolved to tag ids with an in-process cache of the (small) tags table: a name matches all tags that start
+with it, case insensitive. Like the count cache (counts.py), the cache is invalidated when this process writes the tags
+table (see table_writes.py), TAG_CACHE_TTL bounds how long writes of other processes go unnoticed.
+
+The filter is a semi-join on the association table of the model, e.g.
+EXISTS (SELECT 1 FROM riff_tags WHERE riff_tags.riff_id = riffs.id AND riff_tags.tag_id IN (...)), so rows aren't
+duplicated by a join and counts stay correct. Models are registered once with register_tag_association().
+"""
+import os
+import threading
+import time
+
+import structlog
+from database import db, Riff, RiffExercise, RiffExerciseTag, RiffTag, Tag
+from flask_restx import abort
+from sqlalchemy import and_, exists, false, true
+from table_writes import on_table_write
+
+logger = structlog.get_logger(__name__)
+
+TAG_CACHE_TTL = float(os.getenv("TAG_CACHE_TTL", 300))
+
+# {model: (association model, column of the association that refers to the model)}
+TAG_ASSOCIATIONS = {}
+
+
+def register_tag_association(model, association, foreign_key):
+    """Make the tags of a model filterable: `association` has a tag_id and `foreign_key` refers to the model."""
+    TAG_ASSOCIATIONS[model] = (association, foreign_key)
+
+
+register_tag_association(Riff, RiffTag, RiffTag.riff_id)
+register_tag_association(RiffExercise, RiffExerciseTag, RiffExerciseTag.riff_exercise_id)
+
+
+class TagCache:
+    """All (lower case name, id) of the tags table, valid until a write to it and for at most `ttl` seconds."""
+
+    def __init__(self, ttl=TAG_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._tags = None
+        self._expires = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def tags(self):
+        with self._lock:
+            if self._tags is not None and self._expires > time.time():
+                self.hits += 1
+                return self._tags
+            self.misses += 1
+            generation = self._generation
+        tags = [(name.lower(), id) for id, name in db.session.query(Tag.id, Tag.name)]
+        with self._lock:
+            # a write that happened while loading makes the loaded tags stale already
+            if generation == self._generation:
+                self._tags, self._expires = tags, time.time() + self.ttl
+        return tags
+
+    def ids(self, name):
+        """Ids of the tags that start with `name`."""
+        name = name.lower()
+        return [id for tag_name, id in self.tags() if tag_name.startswith(name)]
+
+    def invalidate(self):
+        with self._lock:
+            self._tags = None
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._tags or ())}
+
+
+tag_cache = TagCache()
+
+
+@on_table_write(Tag.__tablename__)
+def invalidate_written_tags(tables):
+    tag_cache.invalidate()
+
+
+def tag_condition(model, names, match_all=False):
+    """
+    Condition for rows of the model with any of the tags (or with all of them, with `match_all`). `names` is one tag
+    name or a list of them, a name matches all tags that start with it.
+    """
+    if model not in TAG_ASSOCIATIONS:
+        abort(400, f"Can't filter {model.__tablename__} on tags")
+    association, foreign_key = TAG_ASSOCIATIONS[model]
+    names = [str(name) for name in (names if isinstance(names, list) else [names]) if str(name).strip()]
+    if not names:
+        return true()
+    id_sets = [tag_cache.ids(name) for name in names]
+    logger.debug("Resolved tag filter", names=names, match_all=match_all, ids=id_sets)
+
+    def tagged(ids):
+        if not ids:
+            return false()
+        return exists().where(foreign_key == model.id).where(association.tag_id.in_(ids))
+
+    if match_all:
+        return and_(*[tagged(ids) for ids in id_sets])
+    return tagged(list(dict.fromkeys(id for ids in id_sets for id in ids)))
@@ -0,0 +1,219 @@
+import collections
+import os
+import threading
+
+import structlog
+from chords import (
+    Chord,
+    ChordError,
+    LETTERS,
+    NATURALS,
+    ROOTS,
+    lilypond_name,
+    make_chord,
+    parse_chord_info,
+    parse_chord_name,
+    pitch_class,
+    serialize,
+    spelling,
+)
+
+logger = structlog.get_logger(__name__)
+
+# Interval from c to the pitch of an exercise item, as (letter steps, semitones): P1, A1, M2, m3, M3, P4, A4, P5, A5,
+# m6, M6, m7, M7
+PITCH_INTERVALS = {
+    "c": (0, 0),
+    "cis": (0, 1),
+    "d": (1, 2),
+    "ees": (2, 3),
+    "e": (2, 4),
+    "f": (3, 5),
+    "fis": (3, 6),
+    "g": (4, 7),
+    "gis": (4, 8),
+    "aes": (5, 8),
+    "a": (5, 9),
+    "bes": (6, 10),
+    "b": (6, 11),
+}
+
+TO_LILYPOND = {
+    "c": "c",
+    "cb": "b",
+    "db": "des",
+    "d": "d",
+    "eb": "ees",
+    "e": "e",
+    "a": "a",
+    "ab": "aes",
+    "b": "b",
+    "bb": "bes",
+    "c#": "cis",
+    "c##": "d",
+    "d#": "dis",
+    "e#": "f",
+    "fb": "e",
+    "f": "f",
+    "f#": "fis",
+    "f##": "g",
+    "g": "g",
+    "gb": "fis",
+    "g#": "gis",
+    "g##": "a",
+    "a#": "ais",
+    "b#": "c",
+}
+
+# The pitch that c is transposed to for an interval of a number of semitones (8 is a minor sixth)
+SEMITONE_PITCHES = {semitones: pitch for pitch, (_, semitones) in PITCH_INTERVALS.items() if pitch != "gis"}
+
+# simplify some chords when transposing lilypond chord info
+SIMPLIFY = {"dis": "ees", "gis": "aes", "ais": "bes", "des": "cis"}
+
+
+def spell(letter, alteration):
+    """Spell a note as e.g. "c", "c#", "bb" or "ebb"; letter is the index in LETTERS."""
+    return LETTERS[letter] + ("#" * alteration if alteration > 0 else "b" * -alteration)
+
+
+def transpose_spelling(letter, alteration, steps, semitones):
+    target = (letter + steps) % 7
+    return spell(target, alteration + semitones - (NATURALS[target] - NATURALS[letter]) % 12)
+
+
+# Every root spelling transposed to every pitch: {(root, pitch): spelling of the new root}. Built once, so transposing a
+# chord is a dict lookup.
+TRANSPOSITIONS = {
+    (spell(letter, alteration), pitch): transpose_spelling(letter, alteration, steps, semitones)
+    for letter in range(len(LETTERS))
+    for alteration in (-1, 0, 1)
+    for pitch, (steps, semitones) in PITCH_INTERVALS.items()
+}
+
+
+def transpose_root(root, pitch):
+    """Transpose a lilypond root like "cis" from c to the pitch. Returns the spelling, e.g. "d#" or "ebb"."""
+    if pitch not in PITCH_INTERVALS:
+        raise ChordError(f"Unknown pitch: {pitch}")
+    try:
+        return TRANSPOSITIONS[(spelling(root), pitch)]
+    except KeyError:
+        raise ChordError(f"Can't transpose root: {root}")
+
+
+def respell(spelled):
+    """Lilypond name of a spelling, e.g. "ebb" => "eeses"."""
+    return lilypond_name(LETTERS.index(spelled[0]), spelled.count("#") - spelled.count("b", 1))
+
+
+def transpose_chords(chords, pitch):
+    """Transpose parsed lilypond chords from c to the pitch, roots are respelled to the simplest lilypond name."""
+    result = []
+    for chord in chords:
+        spelled = transpose_root(chord.root, pitch)
+        if spelled not in TO_LILYPOND:
+            logger.error("Transposed root has no lilypond spelling", chord=chord.root, root_key=spelled)
+            raise ChordError(f"Error with {spelled}")
+        root = SIMPLIFY.get(TO_LILYPOND[spelled], TO_LILYPOND[spelled])
+        result.append(make_chord(root, chord.duration, chord.quality))
+    return tuple(result)
+
+
+def transpose_chord_name(chord, pitch):
+    """Transpose a chord that was parsed from a chord name like "Cm7", roots are not simplified."""
+    spelled = transpose_root(chord.root, pitch)
+    root = TO_LILYPOND.get(spelled) or respell(spelled)
+    return Chord(root, (chord.pitch_class + PITCH_INTERVALS[pitch][1]) % 12, chord.duration, chord.quality)
+
+
+def transpose_chord_info(chord_info, pitch, number_of_bars=None):
+    """
+    Transpose a chord_info string to lilypond chord info
+
+    e.g.:
+    chord_info: d2:m7 g:7 c1:maj7, with pitch: d => e2:m7 a:7 d1:maj7
+    chord_info: C7, pitch: d, number_of_bars: 2 => d1:7 d1:7
+
+    Note: when using C7 notation (from the riff.chord property) -> number of bars is mandatory
+
+    return: new lilypond chord string
+    """
+    if chord_info and chord_info[0].isupper():
+        chord = transpose_chord_name(parse_chord_name(chord_info), pitch)
+        logger.info("Using chord from riff", root_key=chord.root, chord_mood=chord.quality)
+        return serialize([chord] * (number_of_bars or 1))
+    elif chord_info:
+        logger.info("Using chord-info in lilypond format", chords=chord_info, pitch=pitch)
+        return serialize(transpose_chords(parse_chord_info(chord_info), pitch))
+
+
+def interval_pitch(from_pitch, to_pitch):
+    """
+    The pitch to transpose c to for the interval between two pitches, e.g. from d to e => d.
+
+    Chord info that is already transposed to `from_pitch` is moved to `to_pitch` with:
+    transpose_chord_info(chord_info, interval_pitch(from_pitch, to_pitch))
+    """
+    for pitch in (from_pitch, to_pitch):
+        if pitch not in ROOTS:
+            raise ChordError(f"Unknown pitch: {pitch}")
+    return SEMITONE_PITCHES[(pitch_class(to_pitch) - pitch_class(from_pitch)) % 12]
+
+
+def transpose_pitch(pitch, interval):
+    """Transpose a pitch like "cis" by an interval (the pitch c is transposed to), e.g. "e" by "d" => "fis"."""
+    return transpose_chords([make_chord(pitch)], interval)[0].root
+
+
+class TranspositionCache:
+    """
+    Bounded, thread safe LRU cache in front of transpose_chord_info().
+
+    The same riff chords are transposed to the same pitches over and over, so results are kept per (chord_info, pitch,
+    number_of_bars). Chords that can't be transposed raise every time and are not cached.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._results)
+
+    def transpose(self, chord_info, pitch, number_of_bars=None):
+        key = (chord_info, pitch, number_of_bars)
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                self._results.move_to_end(key)
+                return self._results[key]
+            self.misses += 1
+        result = transpose_chord_info(chord_info, pitch, number_of_bars)
+        with self._lock:
+            self._results[key] = result
+            if len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._results), "maxsize": self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# One cache per process, shared by the API and the CLI commands
+transposition_cache = TranspositionCache(maxsize=int(os.getenv("TRANSPOSE_CACHE_SIZE", 4096)))
+
+
+def cached_transpose_chord_info(chord_info, pitch, number_of_bars=None):
+    """transpose_chord_info() with the results kept in the process wide transposition_cache."""
+    return transposition_cache.transpose(chord_info, pitch, number_of_bars)
@@ -1,63 +1,101 @@
+import time
+import uuid
+
 import structlog
-from apis.v1.exercises import transpose_chord_info
+from chord_transpositions import load_chord_transpositions, riff_chord_info
+from chords import ChordError
+from database import db, RiffExercise, RiffExerciseItem
+from full_text_search import update_search_vectors
+from sqlalchemy.orm import selectinload
 
 logger = structlog.get_logger(__name__)
 
+UUID_SPACE = 2 ** 128
+
+
+def exercise_item_changes(item, transpositions):
+    """
+    The columns of an exercise item that differ from what its riff dictates: number_of_bars and the chord_info of the
+    riff transposed to the pitch of the item. Returns a dict with the new values, empty when the item is correct.
+    """
+    changes = {}
+    if item.riff.number_of_bars != item.number_of_bars:
+        changes["number_of_bars"] = item.riff.number_of_bars
+    try:
+        chord_info = riff_chord_info(item.riff, item.pitch, transpositions)
+    except ChordError as error:
+        logger.warning("Couldn't transpose riff chords", item_id=str(item.id), riff_id=str(item.riff_id),
+                       pitch=item.pitch, error=str(error))
+        return changes
+    if chord_info is None:
+        logger.error("No chord info found in riff: this shouldn't happen", riff_id=str(item.riff_id))
+    elif chord_info != item.chord_info:
+        changes["chord_info"] = chord_info
+    return changes
+
+
+def partition_bounds(index, count):
+    """The id range [lower, upper) of partition `index` of `count` equal partitions of the uuid space."""
+    lower = uuid.UUID(int=index * UUID_SPACE // count)
+    upper = uuid.UUID(int=(index + 1) * UUID_SPACE // count) if index + 1 < count else None
+    return lower, upper
+
+
+def fix_exercise_chords_in_batches(exercise_query, batch_size=500, dry_run=False, partition=None):
+    """
+    Correct the items of all exercises of the query, `batch_size` exercises at a time.
+
+    Exercises are read in id order with a keyset seek (id > last id of the previous batch) and their items and riffs
+    are loaded with two selectin queries per batch, the stored chord transpositions with one more. Changes are written
+    with one bulk update and a commit per batch. With `dry_run` the changes are only logged. `partition` is an (index,
+    count) tuple that limits the run to one id range, so the exercises can be split over worker processes.
+
+    Returns a dict with the number of exercises, items and changed items.
+    """
+    if partition:
+        lower, upper = partition_bounds(*partition)
+        exercise_query = exercise_query.filter(RiffExercise.id >= lower)
+        if upper:
+            exercise_query = exercise_query.filter(RiffExercise.id < upper)
+    exercise_query = exercise_query.options(
+        selectinload(RiffExercise.riff_exercise_items).selectinload(RiffExerciseItem.riff)
+    ).order_by(RiffExercise.id)
+
+    stats = {"exercises": 0, "items": 0, "changed_items": 0}
+    start = time.time()
+    last_id = None
+    while True:
+        batch_query = exercise_query if last_id is None else exercise_query.filter(RiffExercise.id > last_id)
+        exercises = batch_query.limit(batch_size).all()
+        if not exercises:
+            break
+        last_id = exercises[-1].id
+
+        items = [item for exercise in exercises for item in exercise.riff_exercise_items]
+        transpositions = load_chord_transpositions([(item.riff_id, item.pitch) for item in items])
+        mappings = []
+        changed_exercise_ids = set()
+        for item in items:
+            changes = exercise_item_changes(item, transpositions)
+            if changes:
+                if dry_run:
+                    logger.info("Dry run: exercise item would change", exercise_id=str(item.riff_exercise_id),
+                                item=item.order_number, current_chord_info=item.chord_info,
+                                current_number_of_bars=item.number_of_bars, **changes)
+                mappings.append({"id": item.id, **changes})
+                changed_exercise_ids.add(str(item.riff_exercise_id))
+        if mappings and not dry_run:
+            db.session.bulk_update_mappings(RiffExerciseItem, mappings)
+            # bulk updates skip the flush events that maintain the search vectors
+            update_search_vectors(db.session, exercise_ids=sorted(changed_exercise_ids))
+            db.session.commit()
+        # the next batch doesn't need the loaded exercises anymore
+        db.session.expunge_all()
 
-def fix_exercise_chords(exercise):
-    for item in exercise.riff_exercise_items:
-        if item.riff.number_of_bars != item.number_of_bars:
-            logger.info(
-                "Correcting number_of_bars for exercise_item", item=item.order_number,
-                number_of_bars=item.riff.number_of_bars
-            )
-            item.number_of_bars = item.riff.number_of_bars
-
-        # Disable check, and just re-generate them all
-        new_chord_info = None
-        # Check chord syntax
-        # *Cm7 and Cm7 will be converted to c1:m7
-        # new_chord_info = None
-        # if item_chord_info:
-        #     if item_chord_info.startswith("*"):
-        #         item_chord_info = item_chord_info[1:]
-        #     if item_chord_info[0].isupper():
-        #         try:
-        #             new_chord_info = transpose_chord_info(
-        #                 item_chord_info, "c", number_of_bars=item.riff.number_of_bars,
-        #             )
-        #             logger.info(
-        #                 "Correcting chord for exercise_item from item",
-        #                 current_chord_info=item_chord_info,
-        #                 new_chord_info=new_chord_info,
-        #             )
-        #         except ValueError:
-        #             logger.warning("No repair possible based on current item chord_info",
-        #                            current_chord_info=item_chord_info)
-        #             pass
-
-        # item_chord_info = item.chord_info
-        # Do them all
-        item_chord_info = None
-
-        if new_chord_info is None and item_chord_info is None:
-            if item.riff.chord_info:
-                new_chord_info = transpose_chord_info(item.riff.chord_info, item.pitch, number_of_bars=item.riff.number_of_bars)
-                logger.info(
-                    "Correcting chord for exercise_item from riff CHORD_INFO",
-                    current_chord_info=item.riff.chord_info,
-                    new_chord_info=new_chord_info,
-                )
-                # Correct it
-                item.chord_info = new_chord_info
-            elif item.riff.chord:
-                new_chord_info = transpose_chord_info(item.riff.chord, item.pitch, number_of_bars=item.riff.number_of_bars)
-                logger.info(
-                    "Correcting chord for exercise_item from riff CHORD",
-                    current_chord_info=item.riff.chord,
-                    new_chord_info=new_chord_info,
-                )
-                # Correct it
-                item.chord_info = new_chord_info
-            else:
-                logger.error("No chord info found in riff: this shouldn't happen", riff_id=item.riff_id)
+        stats["exercises"] += len(exercises)
+        stats["items"] += len(items)
+        stats["changed_items"] += len(mappings)
+        elapsed = time.time() - start
+        logger.info("Fixed exercise chords batch", partition=partition, dry_run=dry_run,
+                    exercises_per_second=round(stats["exercises"] / elapsed, 1) if elapsed else None, **stats)
+    return stats
@@ -0,0 +1,182 @@
+"""
+Benchmark of the render pipeline, by default with the fake LilyPond stand-in (render/fake_lilypond.py).
+
+Runs the stages of render_new_riffs.py for a number of generated riffs: generate (lilypond sources and render jobs),
+compile (LilyPond), metadata (svg extraction), sync (to a folder) and update (simulated API round trips). Every
+combination of the concurrency settings runs on a fresh temporary folder without render cache, and the wall time per
+stage and the throughput in riffs per second is reported.
+
+Usage:
+    python -m render.benchmark --riffs 10 --workers 1,4,8 --batches 1,2 --latency 0.3 --file-latency 0.01
+    python -m render.benchmark --in-memory --clefs treble,bass --lilypond /usr/local/bin/lilypond
+"""
+import argparse
+import collections
+import contextlib
+import glob
+import os
+import shutil
+import tempfile
+import time
+
+import structlog
+
+from .executor import RenderExecutor
+from .render import Render
+from .svg_metadata import extract_batch
+from .sync import FilesystemBackend, SyncFile, SyncManifest, Syncer
+
+FAKE_LILYPOND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_lilypond.py")
+KEYS = ["c", "cis", "d", "dis", "ees", "e", "f", "fis", "g", "gis", "aes", "a", "ais", "bes", "b"]
+STAGES = ["generate", "compile", "metadata", "sync", "update"]
+NOTES = "c'8 d' e' f' g' a' b' c''"
+CHORDS = "c1:maj7"
+
+BenchmarkResult = collections.namedtuple(
+    "BenchmarkResult", ["workers", "batches", "in_memory", "riffs", "failed", "timings"]
+)
+
+
+class StageTimer:
+    def __init__(self):
+        self.timings = collections.OrderedDict((stage, 0.0) for stage in STAGES)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+
+def run_pipeline(riffs, workers, batches, in_memory, clefs, lilypond, update_latency, update_batch_size,
+                 sync_workers):
+    """Render, inspect and sync `riffs` generated riffs with one concurrency setting and return a BenchmarkResult."""
+    timer = StageTimer()
+    workdir = tempfile.mkdtemp(prefix="render_benchmark_")
+    try:
+        executor = RenderExecutor(max_workers=workers)
+        syncer = Syncer(FilesystemBackend(os.path.join(workdir, "bucket")),
+                        SyncManifest(os.path.join(workdir, "sync_manifest.json")), max_workers=sync_workers)
+        renderers = []
+        for clef in clefs:
+            folder = "" if clef == "treble" else clef
+            renderer = Render(renderPath=os.path.join(workdir, "rendered", folder).rstrip(os.sep))
+            renderer.set_clef(clef)
+            renderer.lilypond = lilypond
+            renderer.artifactPrefix = os.path.join(folder, "")
+            renderer.workspace = workdir
+            renderers.append(renderer)
+
+        failed = 0
+        for number in range(riffs):
+            riff_id = "benchmark-%s" % number
+            with timer.stage("generate"):
+                jobs = []
+                for renderer in renderers:
+                    renderer.name = "riff_%s" % riff_id
+                    renderer.addNotes(NOTES)
+                    renderer.addChords(CHORDS)
+                    if in_memory:
+                        jobs += renderer.memory_jobs(KEYS, riff_id=riff_id)
+                    else:
+                        jobs += renderer.batch_jobs(KEYS, riff_id=riff_id, batches=batches)
+
+            with timer.stage("compile"):
+                results = executor.run(jobs)
+            if any(result.returncode for result in results):
+                failed += 1
+                continue
+            artifacts = {}
+            for result in results:
+                artifacts.update(result.artifacts or {})
+
+            with timer.stage("metadata"):
+                if in_memory:
+                    svg_names = [name for name in artifacts if name.endswith(".svg")]
+                    extract_batch(svg_names, max_workers=workers, contents=[artifacts[name] for name in svg_names])
+                else:
+                    svg_files = [file_name for renderer in renderers
+                                 for file_name in glob.glob(os.path.join(renderer.renderPath, "svg",
+                                                                         "riff_%s_*.svg" % riff_id))]
+                    extract_batch(svg_files, max_workers=workers)
+
+            with timer.stage("sync"):
+                sync_files = [SyncFile(None, "static/rendered/%s" % name,
+                                       "image/svg+xml" if name.endswith(".svg") else None, content)
+                              for name, content in artifacts.items()]
+                rendered_path = os.path.join(workdir, "rendered")
+                for file_name in glob.glob(os.path.join(rendered_path, "**", "riff_%s_*.*" % riff_id), recursive=True):
+                    if not file_name.endswith(".ly"):
+                        key = "static/rendered/%s" % os.path.relpath(file_name, rendered_path)
+                        sync_files.append(SyncFile(file_name, key, None, None))
+                syncer.sync(sync_files)
+
+        with timer.stage("update"):
+            # one round trip per batch of riffs, see update_riffs() in render_new_riffs.py
+            for _ in range(0, riffs, update_batch_size):
+                time.sleep(update_latency)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return BenchmarkResult(workers, batches, in_memory, riffs, failed, timer.timings)
+
+
+def report(results):
+    header = ["workers", "batches", "mode"] + STAGES + ["total", "riffs/s", "failed"]
+    print(" ".join("%9s" % column for column in header))
+    for result in results:
+        total = sum(result.timings.values())
+        row = [result.workers, result.batches if not result.in_memory else "-",
+               "memory" if result.in_memory else "disk"]
+        row += ["%.3f" % result.timings[stage] for stage in STAGES]
+        row += ["%.3f" % total, "%.2f" % (result.riffs / total if total else 0), result.failed]
+        print(" ".join("%9s" % column for column in row))
+
+
+def drop_info(logger, method_name, event_dict):
+    """structlog processor that only lets warnings and errors through, so the report isn't buried in log lines."""
+    if method_name in ("debug", "info"):
+        raise structlog.DropEvent
+    return event_dict
+
+
+def int_list(value):
+    return [int(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the render pipeline")
+    parser.add_argument("--riffs", type=int, default=5, help="Number of riffs to render per setting")
+    parser.add_argument("--workers", type=int_list, default=[1, os.cpu_count() or 1],
+                        help="Comma separated numbers of LilyPond processes")
+    parser.add_argument("--batches", type=int_list, default=[1], help="Comma separated numbers of batches")
+    parser.add_argument("--in-memory", action="store_true", help="Render with stdin sources in memory")
+    parser.add_argument("--clefs", default="treble", help="Comma separated clefs to render")
+    parser.add_argument("--lilypond", default=FAKE_LILYPOND, help="LilyPond binary, defaults to the fake LilyPond")
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake LilyPond startup latency in seconds")
+    parser.add_argument("--file-latency", type=float, default=0.01, help="Fake LilyPond latency per file in seconds")
+    parser.add_argument("--update-latency", type=float, default=0.05, help="Latency of an API call in seconds")
+    parser.add_argument("--update-batch-size", type=int, default=500, help="Riffs per API call")
+    parser.add_argument("--sync-workers", type=int, default=8, help="Number of upload threads")
+    parser.add_argument("--verbose", action="store_true", help="Show the info logging of the pipeline")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        structlog.configure(processors=[drop_info] + structlog.get_config()["processors"])
+
+    # read by the fake LilyPond processes
+    os.environ["FAKE_LILYPOND_LATENCY"] = str(args.latency)
+    os.environ["FAKE_LILYPOND_FILE_LATENCY"] = str(args.file_latency)
+
+    results = []
+    for workers in args.workers:
+        for batches in args.batches if not args.in_memory else [1]:
+            results.append(run_pipeline(args.riffs, workers, batches, args.in_memory, args.clefs.split(","),
+                                        args.lilypond, args.update_latency, args.update_batch_size,
+                                        args.sync_workers))
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Content addressed cache for rendered artifacts.
+
+Every artifact (one PNG size or the SVG of a key/octave of a riff) is addressed by a hash of everything that ends up in
+it: the lilypond template, notes, chords, clef, transpose, octave and size/backend. The index maps the artifact name
+(the path relative to the render folder, which is also the object store key suffix) to the hash it was last rendered
+and uploaded with. It is persisted as JSON between runs of the render scripts.
+"""
+import hashlib
+import json
+import os
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+
+def artifact_hash(template, notes, chords, clef, transpose, octave, variant):
+    digest = hashlib.sha256()
+    for part in (template, notes, chords, clef, transpose, octave, variant):
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class RenderCache:
+    def __init__(self, path):
+        self.path = path
+        self.index = {}  # artifact name => {"hash": ..., "metadata": ...}
+        self.pending = {}  # artifacts that are being rendered, but are not uploaded yet
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as cache_file:
+                    self.index = json.load(cache_file)
+            except ValueError:
+                logger.warning("Render cache index not readable, starting with an empty cache", path=path)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def is_fresh(self, name, digest):
+        entry = self.index.get(name)
+        return entry is not None and entry["hash"] == digest
+
+    def add(self, name, digest):
+        self.pending[name] = {"hash": digest}
+
+    def metadata(self, name):
+        entry = self.index.get(name) or self.pending.get(name)
+        return entry.get("metadata") if entry else None
+
+    def set_metadata(self, name, metadata):
+        entry = self.pending.get(name) or self.index.get(name)
+        if entry:
+            entry["metadata"] = metadata
+
+    def commit(self):
+        """Mark all pending artifacts as rendered and uploaded."""
+        self.index.update(self.pending)
+        self.pending = {}
+
+    def discard(self):
+        self.pending = {}
+
+    def save(self):
+        tmp_path = "%s.tmp" % self.path
+        with open(tmp_path, "w") as cache_file:
+            json.dump(self.index, cache_file)
+        os.replace(tmp_path, self.path)
+        logger.info("Saved render cache index", path=self.path, artifacts=len(self.index))
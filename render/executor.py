@@ -0,0 +1,105 @@
+"""
+Runs LilyPond render jobs on a bounded process pool.
+
+Every job is one LilyPond invocation for one or more (batch mode) files: the riff, key, octave and output format it
+belongs to are kept on the job so failures can be reported per job. Exit codes and stderr are collected instead of
+being thrown away like `os.system` did.
+
+In memory jobs get their LilyPond source via stdin and render in a private temporary folder, their artifact is returned
+as bytes in the result.
+"""
+import collections
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+RenderJob = collections.namedtuple(
+    "RenderJob", ["riff_id", "key", "octave", "output_format", "resolution", "command", "outputs"]
+)
+MemoryRenderJob = collections.namedtuple(
+    "MemoryRenderJob",
+    ["riff_id", "key", "octave", "output_format", "resolution", "command", "artifact_name", "source", "workspace"],
+)
+RenderResult = collections.namedtuple("RenderResult", ["job", "returncode", "stderr", "artifacts"])
+
+MEMORY_OUTPUT = "output"  # LilyPond output name of in memory jobs, relative to their temporary folder
+
+
+def run_job(job):
+    """Run one render job and return its result. Top level function so it can be pickled for the process pool."""
+    if isinstance(job, MemoryRenderJob):
+        return run_memory_job(job)
+    try:
+        process = subprocess.run(job.command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except OSError as error:
+        return RenderResult(job=job, returncode=-1, stderr=str(error), artifacts=None)
+
+    stderr = process.stderr.decode("utf-8", "replace")
+    returncode = process.returncode
+    if job.output_format == "svg":
+        # mv cropped file over paper sized file; in batch mode a failing file doesn't stop the others from rendering
+        for output in job.outputs:
+            try:
+                os.replace("%s.cropped.svg" % output, "%s.svg" % output)
+            except OSError as error:
+                stderr = "%s%s\n" % (stderr, error)
+                returncode = returncode or -1
+    return RenderResult(job=job, returncode=returncode, stderr=stderr, artifacts=None)
+
+
+def run_memory_job(job):
+    """Run an in memory render job, the result holds the artifact as {artifact_name: bytes}."""
+    try:
+        with tempfile.TemporaryDirectory(prefix="render_", dir=job.workspace) as folder:
+            process = subprocess.run(job.command, input=job.source.encode("utf-8"), stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.PIPE, cwd=folder)
+            stderr = process.stderr.decode("utf-8", "replace")
+            # with -dcrop LilyPond writes the cropped svg next to the paper sized one
+            extension = "cropped.svg" if job.output_format == "svg" else "png"
+            try:
+                with open(os.path.join(folder, "%s.%s" % (MEMORY_OUTPUT, extension)), "rb") as output_file:
+                    content = output_file.read()
+            except OSError as error:
+                return RenderResult(job=job, returncode=process.returncode or -1, stderr="%s%s\n" % (stderr, error),
+                                    artifacts=None)
+    except OSError as error:
+        return RenderResult(job=job, returncode=-1, stderr=str(error), artifacts=None)
+    return RenderResult(job=job, returncode=process.returncode, stderr=stderr, artifacts={job.artifact_name: content})
+
+
+class RenderExecutor:
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def run(self, jobs):
+        """Run all jobs and return their results in the same order as the jobs."""
+        if self.max_workers == 1 or len(jobs) <= 1:
+            results = [run_job(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                results = list(pool.map(run_job, jobs))
+
+        for result in results:
+            if result.returncode:
+                logger.error(
+                    "Render job failed",
+                    riff_id=result.job.riff_id,
+                    key=result.job.key,
+                    octave=result.job.octave,
+                    output_format=result.job.output_format,
+                    resolution=result.job.resolution,
+                    returncode=result.returncode,
+                    stderr=result.stderr,
+                )
+        logger.info(
+            "Render jobs done",
+            jobs=len(jobs),
+            failed=len([result for result in results if result.returncode]),
+            max_workers=self.max_workers,
+        )
+        return results
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Stand-in for the lilypond binary, to benchmark or test the render pipeline without a LilyPond install.
+
+Understands the command lines the renderer builds: batch mode (many .ly files with a folder as output), sources via
+stdin ("-") and the png and svg backends. Instead of engraving it writes a canned PNG or SVG for every input after
+sleeping FAKE_LILYPOND_LATENCY seconds per invocation (LilyPond/Guile startup) and FAKE_LILYPOND_FILE_LATENCY seconds
+per input file (engraving).
+
+Usage: point Render.lilypond to this file, e.g. `python -m render.benchmark --lilypond render/fake_lilypond.py`.
+"""
+import base64
+import os
+import sys
+import time
+
+PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+SVG = """<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" version="1.2" width="54.57mm" \
+height="16.37mm" viewBox="0.0000 -2.5000 31.0535 9.3150">
+<style text="style/css"></style>
+<line transform="translate(5.6906, 3.9450)" stroke-width="0.1000" x1="0.0500" y1="-0.0000" x2="25.3129" y2="-0.0000"/>
+<line transform="translate(5.6906, 2.9450)" stroke-width="0.1000" x1="0.0500" y1="-0.0000" x2="25.3129" y2="-0.0000"/>
+<line transform="translate(5.6906, 1.9450)" stroke-width="0.1000" x1="0.0500" y1="-0.0000" x2="25.3129" y2="-0.0000"/>
+<line transform="translate(5.6906, 0.9450)" stroke-width="0.1000" x1="0.0500" y1="-0.0000" x2="25.3129" y2="-0.0000"/>
+<line transform="translate(5.6906, -0.0550)" stroke-width="0.1000" x1="0.0500" y1="-0.0000" x2="25.3129" y2="-0.0000"/>
+</svg>
+"""
+
+
+def parse_arguments(arguments):
+    output = None
+    svg = False
+    inputs = []
+    arguments = iter(arguments)
+    for argument in arguments:
+        if argument == "-o":
+            output = next(arguments, None)
+        elif argument == "-dbackend=svg":
+            svg = True
+        elif argument == "-" or argument.endswith(".ly"):
+            inputs.append(argument)
+    return output, svg, inputs
+
+
+def output_names(output, inputs):
+    """LilyPond names the output after the input file when -o is a folder, otherwise -o is the output name."""
+    if output and os.path.isdir(output):
+        return [os.path.join(output, os.path.splitext(os.path.basename(source))[0]) for source in inputs]
+    if output:
+        return [output] * len(inputs)
+    return [os.path.splitext(source)[0] if source != "-" else "-" for source in inputs]
+
+
+def main(arguments):
+    output, svg, inputs = parse_arguments(arguments)
+    if not inputs:
+        sys.stderr.write("fake lilypond: no input files\n")
+        return 1
+    time.sleep(float(os.getenv("FAKE_LILYPOND_LATENCY", 0)))
+    for source, name in zip(inputs, output_names(output, inputs)):
+        if source == "-":
+            sys.stdin.read()
+        elif not os.path.exists(source):
+            sys.stderr.write("fake lilypond: can't find file: `%s'\n" % source)
+            return 1
+        time.sleep(float(os.getenv("FAKE_LILYPOND_FILE_LATENCY", 0)))
+        if svg:
+            for extension in ["svg", "cropped.svg"]:
+                with open("%s.%s" % (name, extension), "w") as svg_file:
+                    svg_file.write(SVG)
+        else:
+            with open("%s.png" % name, "wb") as png_file:
+                png_file.write(PNG)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
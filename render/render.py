@@ -21,6 +21,9 @@
 import os
 import structlog
 
+from .cache import artifact_hash
+from .executor import MEMORY_OUTPUT, MemoryRenderJob, RenderJob, run_job
+
 #SIZES = [60, 80, 100, 120, 140, 160, 180, 200, 220]
 SIZES = [80, 120]
 
@@ -84,6 +87,9 @@ class Render:
 
         self.lilypond = "/usr/local/bin/lilypond"
         self.octaves = {"-1": ",", "0": None, "1": "'", "2": "''"}
+        self.cache = None  # optional RenderCache: artifacts that didn't change won't be rendered again
+        self.artifactPrefix = ""  # prefix of the cache names, when multiple renderers share one cache
+        self.workspace = None  # folder for the temporary folders of in memory renders, e.g. a tmpfs like /dev/shm
 
     def set_rootKeys(self, rootKeys):
         # allow to set new rootkey
@@ -106,8 +112,7 @@ class Render:
     def doTranspose(self, key):
         self.currentKey = key
 
-    def render(self):
-        # create folders when needed
+    def create_folders(self):
         for size in self.sizes:
             if not os.path.exists("%s/%s" % (self.renderPath, size)):
                 print("Creating folder: %s/%s" % (self.renderPath, size))
@@ -116,40 +121,168 @@ class Render:
             print("Creating folder: svg")
             os.makedirs("%s/svg" % self.renderPath)
 
+    def lilypond_sources(self):
+        """
+        Generate the lilypond sources for the current key.
+
+        Returns a (output_file_name, octave, variants, lilypond_string) tuple per octave, where variants holds the PNG
+        sizes and/or "svg" that need to be rendered. Octaves of which all artifacts are still fresh in the cache are
+        skipped.
+        """
+        sources = []
         for file_postfix, octave in self.octaves.items():
-            file_name = "%s/%s" % (self.renderPath, self.name)
             if octave:
-                file_name = "%s_%s" % (file_name, file_postfix)
                 output_file_name = "%s_%s" % (self.name, file_postfix)
             else:
-                file_name = "%s" % (file_name)
                 output_file_name = self.name
 
             tranpose = "%s%s" % (self.currentKey, octave if octave else "")
+            variants = self.sizes + ["svg"]
+            if self.cache is not None:
+                variants = [variant for variant in variants
+                            if not self.check_cache(output_file_name, tranpose, file_postfix, variant)]
+                if not variants:
+                    logger.info("Skipping unchanged lilypond source", name=output_file_name)
+                    continue
+
             octave_correction = "" if self.clef == "treble" else "''"
             lilypond_string = TEMPLATE.format(transpose=tranpose, notes=self.notes, chords=self.chords, clef=self.clef, octave_correction=octave_correction)
+            sources.append((output_file_name, file_postfix, variants, lilypond_string))
+        return sources
+
+    def write_sources(self):
+        """
+        Write the lilypond files for the current key.
 
-            #print("%s.ly" % file_name)
+        Returns a (file_name, output_file_name, octave, variants) tuple per octave that needs to be rendered.
+        """
+        sources = []
+        for output_file_name, file_postfix, variants, lilypond_string in self.lilypond_sources():
+            file_name = "%s/%s" % (self.renderPath, output_file_name)
             logger.info("Writing lilypond file", file_name="{}.ly".format(file_name))
-            fHandle = open("%s.ly" % file_name, 'w')
-            fHandle.write(lilypond_string)
-            fHandle.close()
+            with open("%s.ly" % file_name, 'w') as fHandle:
+                fHandle.write(lilypond_string)
+            sources.append((file_name, output_file_name, file_postfix, variants))
+        return sources
+
+    def artifact_name(self, output_file_name, variant):
+        """Name of a rendered artifact relative to the render root, e.g. "svg/riff_1_c.svg" or "80/riff_1_c.png"."""
+        name = "svg/%s.svg" % output_file_name if variant == "svg" else "%s/%s.png" % (variant, output_file_name)
+        return self.artifactPrefix + name
+
+    def check_cache(self, output_file_name, transpose, octave, variant):
+        """Return True when the artifact is unchanged since it was last rendered, otherwise schedule it in the cache."""
+        name = self.artifact_name(output_file_name, variant)
+        digest = artifact_hash(TEMPLATE, self.notes, self.chords, self.clef, transpose, octave, variant)
+        if self.cache.is_fresh(name, digest):
+            return True
+        self.cache.add(name, digest)
+        return False
+
+    def png_command(self, size, output, inputs):
+        return [self.lilypond, "-s", "-dbackend=eps", "-dresolution=%s" % size, "--png", "-o", output] + inputs
+
+    def svg_command(self, output, inputs):
+        return [self.lilypond, "-s", "-dbackend=svg", "-dcrop", "-o", output] + inputs
+
+    def jobs(self, riff_id=None):
+        """Write the lilypond files for the current key and return one render job per octave and output format."""
+        self.create_folders()
+
+        jobs = []
+        for file_name, output_file_name, file_postfix, variants in self.write_sources():
+            for size in self.sizes:
+                if size not in variants:
+                    continue
+                # PNG
+                output = "%s/%s/%s" % (self.renderPath, size, output_file_name)
+                jobs.append(RenderJob(riff_id=riff_id, key=self.currentKey, octave=file_postfix, output_format="png",
+                                      resolution=size, command=self.png_command(size, output, ["%s.ly" % file_name]),
+                                      outputs=[output]))
+
+            # SVG
+            if "svg" in variants:
+                output = "%s/svg/%s" % (self.renderPath, output_file_name)
+                jobs.append(RenderJob(riff_id=riff_id, key=self.currentKey, octave=file_postfix, output_format="svg",
+                                      resolution=None, command=self.svg_command(output, ["%s.ly" % file_name]),
+                                      outputs=[output]))
+        return jobs
+
+    def batch_jobs(self, keys, riff_id=None, batches=1):
+        """
+        Write the lilypond files for all keys and octaves and return the jobs that compile them in batch mode.
+
+        LilyPond accepts many input files per invocation, so the Guile startup is paid once per output format and
+        resolution instead of once per file. Every format/resolution is split in `batches` chunks of files, so the
+        executor can still spread the work over multiple CPU's.
+        """
+        self.create_folders()
+
+        name = self.name
+        sources = []
+        for key in keys:
+            self.name = "%s_%s" % (name, key)
+            self.doTranspose(key)
+            sources += self.write_sources()
+        self.name = name
+
+        if not sources:
+            return []
+        batches = max(1, min(batches, len(sources)))
+        chunks = [sources[index::batches] for index in range(batches)]
+
+        jobs = []
+        for chunk in chunks:
             for size in self.sizes:
-                # #PNG
-                cmd = "%s -s -dbackend=eps -dresolution=%s --png -o %s/%s/%s %s.ly" % (self.lilypond, size,
-                                                                                       self.renderPath, size,
-                                                                                       output_file_name, file_name)
-                #logger.info("Creating lilypond PNG file", size=size, file_name="{}.png".format(output_file_name))
-                #logger.debug("CMD lilypond PNG", cmd=cmd)
-                os.system(cmd)
-                
-            #SVG
-            cmd = "%s -s -dbackend=svg -dcrop -o %s/svg/%s %s.ly" % (self.lilypond, self.renderPath, output_file_name,
-                                                                     file_name)
-            # logger.debug("CMD lilypond SVG", cmd=cmd)
-            os.system(cmd)
-            # mv cropped file over paper sized file:
-            os.system('mv %s/svg/%s.cropped.svg %s/svg/%s.svg' % (self.renderPath, output_file_name,
-                                                                  self.renderPath, output_file_name))
-            logger.info("Creating lilypond SVG file", file_name="{}.svg".format(output_file_name), size="svg")
-        return True
+                # PNG: files are named after the .ly file when the output is a folder
+                sized_chunk = [source for source in chunk if size in source[3]]
+                if not sized_chunk:
+                    continue
+                output = "%s/%s" % (self.renderPath, size)
+                inputs = ["%s.ly" % source[0] for source in sized_chunk]
+                jobs.append(RenderJob(riff_id=riff_id, key=None, octave=None, output_format="png", resolution=size,
+                                      command=self.png_command(size, output, inputs),
+                                      outputs=["%s/%s" % (output, source[1]) for source in sized_chunk]))
+            # SVG
+            svg_chunk = [source for source in chunk if "svg" in source[3]]
+            if not svg_chunk:
+                continue
+            output = "%s/svg" % self.renderPath
+            jobs.append(RenderJob(riff_id=riff_id, key=None, octave=None, output_format="svg", resolution=None,
+                                  command=self.svg_command(output, ["%s.ly" % source[0] for source in svg_chunk]),
+                                  outputs=["%s/%s" % (output, source[1]) for source in svg_chunk]))
+        return jobs
+
+    def memory_jobs(self, keys, riff_id=None):
+        """
+        Return the jobs that render all keys and octaves without writing anything to the render path.
+
+        The lilypond source is fed to LilyPond via stdin and every job runs in its own temporary folder in the
+        workspace, so concurrent renders can't touch each others files. The rendered artifact is returned as bytes in
+        the result. LilyPond reads only one source from stdin, so there is no batch mode: one job per file and format.
+        """
+        name = self.name
+        jobs = []
+        for key in keys:
+            self.name = "%s_%s" % (name, key)
+            self.doTranspose(key)
+            for output_file_name, file_postfix, variants, lilypond_string in self.lilypond_sources():
+                for variant in variants:
+                    if variant == "svg":
+                        command = self.svg_command(MEMORY_OUTPUT, ["-"])
+                    else:
+                        command = self.png_command(variant, MEMORY_OUTPUT, ["-"])
+                    jobs.append(MemoryRenderJob(riff_id=riff_id, key=key, octave=file_postfix,
+                                                output_format="svg" if variant == "svg" else "png",
+                                                resolution=None if variant == "svg" else variant, command=command,
+                                                artifact_name=self.artifact_name(output_file_name, variant),
+                                                source=lilypond_string, workspace=self.workspace))
+        self.name = name
+        return jobs
+
+    def render(self):
+        results = [run_job(job) for job in self.jobs()]
+        for result in results:
+            if result.job.output_format == "svg" and not result.returncode:
+                logger.info("Creating lilypond SVG file", file_name="{}.svg".format(result.job.outputs[0]), size="svg")
+        return all(not result.returncode for result in results)
@@ -0,0 +1,91 @@
+"""
+Extracts the image metadata from rendered LilyPond SVG files.
+
+Only the attributes of the root <svg> element (width, height, viewBox) and the transform of the third staff line are
+needed, so the file is parsed incrementally and parsing stops as soon as those are found. Errors are reported per file
+in the result instead of being raised, so one broken file doesn't stop a whole batch.
+"""
+import collections
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree.ElementTree import ParseError, iterparse
+
+SvgMetadata = collections.namedtuple(
+    "SvgMetadata", ["file_name", "width", "height", "view_box", "staff_center", "error"]
+)
+
+STAFF_LINE = 2  # The transform of the third <line> in the svg holds the vertical staff center
+MM_TO_PIXELS = 3.779527559
+STAFF_CENTER_SCALE = 6.64
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def extract_svg_metadata(file_name, content=None):
+    """
+    Return the SvgMetadata of one file, parsing only up to the staff line that is needed. The svg is read from
+    `content` instead of the file when it was rendered in memory.
+    """
+    root_attributes = None
+    transform = None
+    try:
+        with open(file_name, "rb") if content is None else io.BytesIO(content) as svg_file:
+            depth = 0
+            lines = 0
+            for event, element in iterparse(svg_file, events=("start", "end")):
+                if event == "end":
+                    depth -= 1
+                    continue
+                depth += 1
+                if depth == 1:
+                    root_attributes = dict(element.attrib)
+                elif depth == 2 and _local_name(element.tag) == "line":
+                    if lines == STAFF_LINE:
+                        transform = element.get("transform")
+                        break
+                    lines += 1
+    except (OSError, ParseError) as error:
+        return SvgMetadata(file_name, None, None, None, None, str(error))
+
+    if root_attributes is None:
+        return SvgMetadata(file_name, None, None, None, None, "svg element not found")
+    if transform is None:
+        return SvgMetadata(file_name, None, None, None, None, "staff_center not found")
+
+    try:
+        # width="42.1234mm" and transform="translate(0.0000, 5.0450)"
+        width = float(root_attributes["width"][:-2])
+        height = float(root_attributes["height"][:-2])
+        view_box = root_attributes["viewBox"].split(" ")
+        staff_center = float(transform[:-1].split(",")[1][1:])
+    except (KeyError, IndexError, ValueError) as error:
+        return SvgMetadata(file_name, None, None, None, None, "unexpected svg attributes: {}".format(error))
+    return SvgMetadata(file_name, width, height, view_box, staff_center, None)
+
+
+def to_image_info(metadata, key_octave):
+    """Convert the SvgMetadata to an `image_info` item as stored in the riff."""
+    corrected_staff_center = metadata.staff_center + abs(float(metadata.view_box[1]))
+    return {
+        "key_octave": key_octave,
+        "width": round(metadata.width * MM_TO_PIXELS),
+        "height": round(metadata.height * MM_TO_PIXELS),
+        "staff_center": round(corrected_staff_center * STAFF_CENTER_SCALE),
+    }
+
+
+def extract_batch(file_names, max_workers=None, contents=None):
+    """
+    Extract the metadata of all files in parallel, results are returned in the same order as file_names. `contents`
+    optionally holds the content of every file, or None for files that have to be read from disk.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    contents = contents or [None] * len(file_names)
+    if max_workers == 1 or len(file_names) <= 1:
+        return [extract_svg_metadata(file_name, content) for file_name, content in zip(file_names, contents)]
+    chunksize = max(1, len(file_names) // (max_workers * 4))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(extract_svg_metadata, file_names, contents, chunksize=chunksize))
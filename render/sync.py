@@ -0,0 +1,140 @@
+"""
+Incremental, concurrent upload of rendered artifacts to the object store.
+
+A local manifest keeps the md5 of every uploaded object key, so files whose content didn't change since the last upload
+are skipped. Uploads run on a thread pool. The backend is either an S3 bucket (optionally on a custom endpoint, for a
+local S3 stand-in) or a folder on the filesystem, so the sync stage can also be run and benchmarked offline. Artifacts
+that were rendered in memory are uploaded from their content instead of a file.
+"""
+import collections
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+SyncFile = collections.namedtuple("SyncFile", ["file_name", "key", "content_type", "content"])
+SyncResult = collections.namedtuple("SyncResult", ["uploaded", "skipped", "failed"])
+
+
+def file_hash(file_name):
+    digest = hashlib.md5()
+    with open(file_name, "rb") as handle:
+        for block in iter(lambda: handle.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash(content):
+    return hashlib.md5(content).hexdigest()
+
+
+class S3Backend:
+    def __init__(self, bucket, aws_access_key_id=None, aws_secret_access_key=None, endpoint_url=None):
+        self.bucket = bucket
+        # boto3 clients are thread safe, so one client is shared by all upload threads
+        self.client = boto3.client(
+            "s3",
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            endpoint_url=endpoint_url,
+        )
+
+    def upload(self, file_name, key, content_type=None):
+        extra_args = {"ContentType": content_type} if content_type else None
+        self.client.upload_file(file_name, self.bucket, key, ExtraArgs=extra_args)
+
+    def upload_content(self, content, key, content_type=None):
+        extra_args = {"ContentType": content_type} if content_type else {}
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=content, **extra_args)
+
+
+class FilesystemBackend:
+    def __init__(self, root):
+        self.root = root
+
+    def upload(self, file_name, key, content_type=None):
+        target = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(file_name, target)
+
+    def upload_content(self, content, key, content_type=None):
+        target = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as target_file:
+            target_file.write(content)
+
+
+class SyncManifest:
+    def __init__(self, path):
+        self.path = path
+        self.uploaded = {}  # object key => md5 of the uploaded content
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as manifest_file:
+                    self.uploaded = json.load(manifest_file)
+            except ValueError:
+                logger.warning("Sync manifest not readable, starting with an empty manifest", path=path)
+
+    def is_uploaded(self, key, digest):
+        return self.uploaded.get(key) == digest
+
+    def save(self):
+        tmp_path = "%s.tmp" % self.path
+        with open(tmp_path, "w") as manifest_file:
+            json.dump(self.uploaded, manifest_file)
+        os.replace(tmp_path, self.path)
+
+
+class Syncer:
+    def __init__(self, backend, manifest, max_workers=8):
+        self.backend = backend
+        self.manifest = manifest
+        self.max_workers = max_workers
+
+    def _upload(self, sync_file, digest):
+        try:
+            if sync_file.content is not None:
+                self.backend.upload_content(sync_file.content, sync_file.key, sync_file.content_type)
+            else:
+                self.backend.upload(sync_file.file_name, sync_file.key, sync_file.content_type)
+        except Exception as error:
+            logger.error("Upload failed", file=sync_file.file_name, key=sync_file.key, error=str(error))
+            return False
+        logger.debug("Uploaded file", file=sync_file.file_name, key=sync_file.key)
+        return True
+
+    def sync(self, sync_files):
+        """Upload all changed files and record them in the manifest. Returns a SyncResult with lists of keys."""
+        pending = []
+        skipped = []
+        for sync_file in sync_files:
+            if sync_file.content is not None:
+                digest = content_hash(sync_file.content)
+            else:
+                digest = file_hash(sync_file.file_name)
+            if self.manifest.is_uploaded(sync_file.key, digest):
+                skipped.append(sync_file.key)
+            else:
+                pending.append((sync_file, digest))
+
+        uploaded = []
+        failed = []
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                results = pool.map(lambda item: self._upload(*item), pending)
+                for (sync_file, digest), success in zip(pending, results):
+                    if success:
+                        self.manifest.uploaded[sync_file.key] = digest
+                        uploaded.append(sync_file.key)
+                    else:
+                        failed.append(sync_file.key)
+            self.manifest.save()
+
+        logger.info("Synced files", uploaded=len(uploaded), skipped=len(skipped), failed=len(failed))
+        return SyncResult(uploaded=uploaded, skipped=skipped, failed=failed)
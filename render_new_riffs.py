@@ -1,36 +1,89 @@
 """
-This script will query https://api.improviser.education for unrendered riffs. It will then render them and
-upload the rendered/changed riffs to an Amazon S3 bucket and flag the riff as rendered via a second API call.
+This script will query https://api.improviser.education for queued render jobs. It will then render them in all
+configured clefs and upload the rendered/changed riffs to an Amazon S3 bucket and flag the riffs as rendered via a second
+API call per batch of riffs, with the image_info of all clefs.
 
-It has a check that ensures that only one instance can be running at the same time. Note: for now python 3.4 compatible.
+Riffs are leased from the render job queue of the API, so multiple instances can run at the same time.
 """
 import glob
 import json
 import os
+import socket
 import sys
+import threading
+import time
 
 import requests
 import structlog
-import xmltodict
-from boto3.s3.transfer import S3Transfer
-import boto3
 
+from render.cache import RenderCache
+from render.executor import RenderExecutor
 from render.render import Render, SIZES
+from render.svg_metadata import extract_batch, to_image_info
+from render.sync import FilesystemBackend, S3Backend, SyncFile, SyncManifest, Syncer
 
 LOCAL_RUN = os.getenv('LOCAL_RUN', False)
 IMPROVISER_HOST = "https://api.improviser.education"
 ENDPOINT_RIFFS = IMPROVISER_HOST + "/v1/riffs"
-RENDER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rendered')
+ENDPOINT_RENDER_JOBS = IMPROVISER_HOST + "/v1/render-jobs"
+RENDER_PATH = os.getenv('RENDER_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rendered'))
+# Index of the hashes of all rendered and uploaded artifacts: unchanged artifacts are not rendered/uploaded again
+RENDER_CACHE = os.getenv('RENDER_CACHE', os.path.join(RENDER_PATH, 'render_cache.json'))
 
 API_USER = os.getenv('API_USER')
 API_PASS = os.getenv('API_PASS')
 AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID') 
 AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY') 
 AWS_BUCKET_NAME = "improviser.education"
+# Optional: S3 compatible endpoint (e.g. a local S3 stand-in) or a folder to sync to instead of the S3 bucket
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+SYNC_FOLDER = os.getenv('SYNC_FOLDER')
+SYNC_MANIFEST = os.getenv('SYNC_MANIFEST', os.path.join(RENDER_PATH, 'sync_manifest.json'))
+SYNC_WORKERS = int(os.getenv('SYNC_WORKERS', 8))
+WORKER_ID = os.getenv('RENDER_WORKER_ID', "{}:{}".format(socket.gethostname(), os.getpid()))
+LEASE_SIZE = int(os.getenv('RENDER_LEASE_SIZE', 1))
+# Max number of riffs of which the render result is stored with one API call
+UPDATE_BATCH_SIZE = int(os.getenv('UPDATE_BATCH_SIZE', 500))
+# Max number of seconds that a render result waits for a full batch before it is stored
+UPDATE_INTERVAL = int(os.getenv('UPDATE_INTERVAL', 60))
+HEARTBEAT_INTERVAL = 60  # seconds, the API recovers leases without a heartbeat for 10 minutes
 KEYS = ['c', 'cis', 'd', 'dis', 'ees', 'e', 'f', 'fis', 'g', 'gis', 'aes', 'a', 'ais', 'bes', 'b']
-
-
-renderer = Render(renderPath=RENDER_PATH)
+# Number of LilyPond processes that may run at the same time, defaults to the number of CPU's
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', os.cpu_count() or 1))
+# All .ly files of a riff are compiled in batch mode: one LilyPond process per output format and resolution per batch
+RENDER_BATCHES = int(os.getenv('RENDER_BATCHES', max(1, RENDER_WORKERS // (len(SIZES) + 1))))
+# Clefs that are rendered in one pass over a riff. Other clefs than treble are rendered to (and synced to) a sub folder
+# named after the clef and get a "_<clef>" suffix in the key_octave of the image_info.
+CLEFS = os.getenv('RENDER_CLEFS', 'treble,bass').split(',')
+# In memory mode LilyPond gets its source via stdin and renders in a temporary folder per job (on tmpfs when available):
+# the artifacts are synced and inspected from memory, nothing is written to RENDER_PATH besides the cache and manifest.
+RENDER_IN_MEMORY = os.getenv('RENDER_IN_MEMORY', False)
+RENDER_WORKSPACE = os.getenv('RENDER_WORKSPACE', '/dev/shm' if os.path.isdir('/dev/shm') else None)
+
+
+def clef_folder(clef):
+    return "" if clef == "treble" else clef
+
+
+def clef_suffix(clef):
+    return "" if clef == "treble" else "_{}".format(clef)
+
+
+render_cache = RenderCache(RENDER_CACHE)
+renderers = {}
+for clef in CLEFS:
+    renderers[clef] = Render(renderPath=os.path.join(RENDER_PATH, clef_folder(clef)).rstrip(os.sep))
+    renderers[clef].set_clef(clef)
+    renderers[clef].cache = render_cache
+    renderers[clef].artifactPrefix = os.path.join(clef_folder(clef), "")
+    renderers[clef].workspace = RENDER_WORKSPACE
+executor = RenderExecutor(max_workers=RENDER_WORKERS)
+if SYNC_FOLDER:
+    sync_backend = FilesystemBackend(SYNC_FOLDER)
+else:
+    sync_backend = S3Backend(AWS_BUCKET_NAME, aws_access_key_id=AWS_ACCESS_KEY_ID,
+                             aws_secret_access_key=AWS_SECRET_ACCESS_KEY, endpoint_url=S3_ENDPOINT_URL)
+syncer = Syncer(sync_backend, SyncManifest(SYNC_MANIFEST), max_workers=SYNC_WORKERS)
 logger = structlog.get_logger(__name__)
 
 
@@ -40,26 +93,157 @@ if not LOCAL_RUN:
 
 
 def render(riff):
-    rendered_riff_ids =[]
-    for key in KEYS:
-        renderer.name = "riff_%s_%s" % (riff["id"], key)
-        notes = riff["notes"]
-        chords = riff["chord_info"] if riff["chord_info"] else ""
-        renderer.addNotes(notes)
-        renderer.addChords(chords)
-        renderer.set_clef('treble')
-        renderer.doTranspose(key)
-        if not renderer.render():
-            print("Error: couldn't render riff.id: {}".format(riff['id']))
-        # try to find the svg and retrieve metadata
-    riff_name = "riff_{}_c.svg".format(riff["id"])
-    if os.path.exists("rendered/svg/{riff_name}".format(riff_name=riff_name)):
-        rendered_riff_ids.append(riff['id'])
-    else:
-        print("Error: couldn't find rendered svg {}! Quitting...".format(riff_name))
-        sys.exit()
+    """
+    Render all keys and octaves of the riff in all clefs. Returns the artifacts that were rendered in memory as
+    {artifact_name: bytes} (empty when rendering to disk) or None when the render failed.
+    """
+    jobs = []
+    for renderer in renderers.values():
+        renderer.name = "riff_%s" % riff["id"]
+        renderer.addNotes(riff["notes"])
+        renderer.addChords(riff["chord_info"] if riff["chord_info"] else "")
+        if RENDER_IN_MEMORY:
+            jobs += renderer.memory_jobs(KEYS, riff_id=riff["id"])
+        else:
+            jobs += renderer.batch_jobs(KEYS, riff_id=riff["id"], batches=RENDER_BATCHES)
+
+    # the LilyPond processes of all clefs share the same pool
+    results = executor.run(jobs)
+    failed = [result for result in results if result.returncode]
+    if failed:
+        print("Error: {} of {} render jobs failed for riff.id: {}".format(len(failed), len(results), riff['id']))
+        render_cache.discard()
+        return None
+    artifacts = {}
+    for result in results:
+        artifacts.update(result.artifacts or {})
+    # try to find the svg and retrieve metadata
+    for clef in CLEFS:
+        artifact_name = os.path.join(clef_folder(clef), "svg", "riff_{}_c.svg".format(riff["id"]))
+        if artifact_name not in artifacts and artifact_name not in render_cache and \
+                not os.path.exists(os.path.join(RENDER_PATH, artifact_name)):
+            print("Error: couldn't find rendered svg {}!".format(artifact_name))
+            render_cache.discard()
+            return None
+
+    print("Rendered riff: {}".format(riff['id']))
+    return artifacts
+
+
+def process_riff(riff):
+    """
+    Render and sync a riff and extract its image_info, which is stored later on with the results of other riffs, see
+    RenderResults. Returns None when one of the stages failed.
+    """
+    print("Rendering {}".format(riff["name"]))
+    artifacts = render(riff)
+    if artifacts is None:
+        return None
+    if LOCAL_RUN:
+        return []
+    if not RENDER_IN_MEMORY:
+        clean_garbage()
+    synced = sync(artifacts)
+    riffs_image_info = extract_image_info([riff["id"]], artifacts=artifacts)[0] if synced else {}
+    if not RENDER_IN_MEMORY:
+        clean_png()
+    if riff["id"] not in riffs_image_info:
+        render_cache.discard()
+        return None
+    render_cache.commit()
+    render_cache.save()
+    return riffs_image_info[riff["id"]]
+
+
+class RenderResults:
+    """
+    The image_info of rendered riffs of which the job isn't completed yet. The riffs are flagged as rendered with one
+    API call per UPDATE_BATCH_SIZE riffs, or after UPDATE_INTERVAL seconds, and the jobs are completed after that.
+    """
+
+    def __init__(self, session, heartbeat):
+        self.session = session
+        self.heartbeat = heartbeat
+        self.jobs = []
+        self.image_info = {}
+        self.since = None
+
+    def add(self, job, image_info):
+        if image_info is None:
+            self.complete([job], failed_riff_ids=[job["riff"]["id"]])
+            return
+        self.jobs.append(job)
+        self.image_info[job["riff"]["id"]] = image_info
+        self.since = self.since or time.monotonic()
+        if len(self.jobs) >= UPDATE_BATCH_SIZE or time.monotonic() - self.since >= UPDATE_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if not self.jobs:
+            return
+        failed_riff_ids = [] if LOCAL_RUN else update_riffs(list(self.image_info), self.session, self.image_info)
+        self.complete(self.jobs, failed_riff_ids)
+        self.jobs, self.image_info, self.since = [], {}, None
+
+    def complete(self, jobs, failed_riff_ids):
+        for job in jobs:
+            complete_job(self.session, job["id"], job["riff"]["id"] not in failed_riff_ids)
+        self.heartbeat.release([job["id"] for job in jobs])
+
+
+class Heartbeat(threading.Thread):
+    """Keeps the leases of all render jobs that the worker holds alive, not only of the riff that is being rendered."""
+
+    def __init__(self, session):
+        super().__init__(daemon=True)
+        # requests sessions aren't thread safe: use a separate session with the same login cookies
+        self.session = requests.Session()
+        self.session.cookies.update(session.cookies)
+        self.job_ids = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def hold(self, job_ids):
+        with self.lock:
+            self.job_ids.update(job_ids)
+
+    def release(self, job_ids):
+        with self.lock:
+            self.job_ids.difference_update(job_ids)
+
+    def run(self):
+        while not self.stopped.wait(HEARTBEAT_INTERVAL):
+            with self.lock:
+                job_ids = sorted(self.job_ids)
+            for job_id in job_ids:
+                try:
+                    response = self.session.put("{}/{}/heartbeat".format(ENDPOINT_RENDER_JOBS, job_id),
+                                                json={"worker": WORKER_ID})
+                except requests.RequestException as error:
+                    logger.warning("Heartbeat failed", id=job_id, error=str(error))
+                    continue
+                if response.status_code != 204:
+                    logger.warning("Heartbeat failed", id=job_id, status=response.status_code)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
 
-    print("Rendered {} images: {}".format(len(rendered_riff_ids), rendered_riff_ids))
+
+def lease_jobs(session):
+    response = session.post(ENDPOINT_RENDER_JOBS + "/lease", json={"worker": WORKER_ID, "limit": LEASE_SIZE})
+    if response.status_code != 200:
+        logger.error("Unable to lease render jobs", status=response.status_code)
+        return []
+    return response.json()
+
+
+def complete_job(session, job_id, success):
+    response = session.put("{}/{}/complete".format(ENDPOINT_RENDER_JOBS, job_id),
+                           json={"worker": WORKER_ID, "success": success,
+                                 "error": None if success else "Render failed on {}".format(WORKER_ID)})
+    if response.status_code != 204:
+        logger.error("Unable to complete render job", id=job_id, status=response.status_code)
 
 
 def merge_two_dicts(x, y):
@@ -69,152 +253,169 @@ def merge_two_dicts(x, y):
     return z
 
 
-def sync():
-    """Sync all .png and .svg files to S3 bucket."""
-    current_dir = os.getcwd()
-    client = boto3.client('s3', aws_access_key_id=AWS_ACCESS_KEY_ID, aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
-    transfer = S3Transfer(client)
-    for size in SIZES:
-        os.chdir(os.path.join(RENDER_PATH, str(size)))
-        for file in glob.glob('*.png'):
-            print("uploading file => {}".format(file)) 
-            result = transfer.upload_file(file, AWS_BUCKET_NAME, "static/rendered/{}/{}".format(str(size), file))
-    os.chdir(os.path.join(RENDER_PATH, "svg"))
-    for file in glob.glob('*.svg'):
-        print("uploading file => {}".format(file)) 
-        result = transfer.upload_file(file, AWS_BUCKET_NAME, "static/rendered/svg/{}".format(file),
-                                      extra_args={"ContentType": "image/svg+xml"})
-    os.chdir(current_dir)
+def sync(artifacts=None):
+    """
+    Sync all changed .png and .svg files, rendered to disk or in memory, to S3 bucket. Returns False when an upload
+    failed.
+    """
+    sync_files = []
+    for artifact_name, content in (artifacts or {}).items():
+        content_type = "image/svg+xml" if artifact_name.endswith(".svg") else None
+        sync_files.append(SyncFile(None, "static/rendered/{}".format(artifact_name), content_type, content))
+    for clef in CLEFS:
+        folder = os.path.join(RENDER_PATH, clef_folder(clef))
+        prefix = "/".join(["static/rendered", clef_folder(clef)]).rstrip("/")
+        for size in SIZES:
+            for file_name in glob.glob(os.path.join(folder, str(size), '*.png')):
+                sync_files.append(SyncFile(file_name, "{}/{}/{}".format(prefix, size, os.path.basename(file_name)),
+                                           None, None))
+        for file_name in glob.glob(os.path.join(folder, 'svg', '*.svg')):
+            sync_files.append(SyncFile(file_name, "{}/svg/{}".format(prefix, os.path.basename(file_name)),
+                                       "image/svg+xml", None))
+    result = syncer.sync(sync_files)
+    return not result.failed
 
 
 def update_riffs(riff_ids, session, image_info=None):
-    for riff_id in riff_ids:
-        payload = {'render_valid': True}
-        if image_info:
-            payload["image_info"] = image_info[riff_id]
-            logger.debug("Update riff payload, with image metadata info", payload=payload)
-        riff_endpoint = "{}/rendered/{}".format(ENDPOINT_RIFFS, riff_id)
+    """
+    Flag the riffs as rendered, with their image_info, in batches of UPDATE_BATCH_SIZE riffs per request. Returns the
+    riff ids of the batches that failed.
+    """
+    riff_endpoint = "{}/rendered".format(ENDPOINT_RIFFS)
+    failed_riff_ids = []
+    for start in range(0, len(riff_ids), UPDATE_BATCH_SIZE):
+        payload = []
+        for riff_id in riff_ids[start:start + UPDATE_BATCH_SIZE]:
+            item = {'id': riff_id, 'render_valid': True}
+            if image_info:
+                item["image_info"] = image_info[riff_id]
+            payload.append(item)
+        logger.debug("Update riffs payload, with image metadata info", riffs=len(payload))
         response = session.put(riff_endpoint, json=payload)
         if response.status_code in [200, 201, 204]:
-            logger.info("Updated render status and metadata of riff", id=riff_id, end_point=riff_endpoint,
-                        status=response.status_code)
+            logger.info("Updated render status and metadata of riffs", ids=[item["id"] for item in payload],
+                        end_point=riff_endpoint, status=response.status_code)
         else:
-            logger.error("Update failed", id=riff_id, end_point=riff_endpoint, status=response.status_code)
+            logger.error("Update failed", ids=[item["id"] for item in payload], end_point=riff_endpoint,
+                         status=response.status_code)
+            failed_riff_ids += [item["id"] for item in payload]
+    return failed_riff_ids
+
+
+def remove_files(pattern):
+    print("Cleaning rm -f {}".format(pattern))
+    for file_name in glob.glob(pattern):
+        os.remove(file_name)
 
 
 def clean_garbage():
-    current_dir = os.getcwd()
     extensions = ['eps', 'count', 'tex', 'texi']
-    os.chdir(RENDER_PATH)
-    print("Cleaning root *.ly")
-    os.system('rm -f *.ly')
-    for size in SIZES:
-        for extension in extensions:
-            print("Cleaning rm -f {folder}/*.{ext}".format(folder=size, ext=extension))
-            os.system('rm -f {folder}/*.{ext}'.format(folder=size, ext=extension))
-    os.chdir(current_dir)
+    for clef in CLEFS:
+        folder = os.path.join(RENDER_PATH, clef_folder(clef))
+        remove_files(os.path.join(folder, '*.ly'))
+        for size in SIZES:
+            for extension in extensions:
+                remove_files(os.path.join(folder, str(size), '*.{}'.format(extension)))
 
 
 def clean_png():
-    current_dir = os.getcwd()
-    extensions = ['png']
-    os.chdir(RENDER_PATH)
-    for size in SIZES:
-        for extension in extensions:
-            print("Cleaning rm -f {folder}/*.{ext}".format(folder=size, ext=extension))
-            os.system('rm -f {folder}/*.{ext}'.format(folder=size, ext=extension))
-    print("Cleaning rm -f svg/*.svg")
-    os.system('rm -f svg/*.svg')
-    os.chdir(current_dir)
-
-
-def retrieve_metadata(riff_ids, session, skip_update=False):
+    for clef in CLEFS:
+        folder = os.path.join(RENDER_PATH, clef_folder(clef))
+        for size in SIZES:
+            remove_files(os.path.join(folder, str(size), '*.png'))
+        remove_files(os.path.join(folder, 'svg', '*.svg'))
+
+
+def extract_image_info(riff_ids, artifacts=None):
+    """
+    Extract the image_info of all svg's of the riffs, in all clefs, in one parallel batch. The image_info of all clefs
+    is merged per riff. Svg's that were rendered in memory are taken from `artifacts`. Returns the image_info per riff
+    id and the riff ids that failed.
+    """
+    filelists = {}
     for riff_id in riff_ids:
         filelist = []
-        for key in KEYS:
-            for octave in ['-1', '1', '2']:
-                filelist.append(("{}_{}".format(key, octave),
-                                 "rendered/svg/riff_{}_{}_{}.svg".format(riff_id, key, octave)))
-            filelist.append((key, "rendered/svg/riff_{}_{}.svg".format(riff_id, key)))
-
+        for clef in CLEFS:
+            svg_folder = os.path.join(clef_folder(clef), "svg")
+            for key in KEYS:
+                for octave in ['-1', '1', '2']:
+                    filelist.append(("{}_{}{}".format(key, octave, clef_suffix(clef)),
+                                     os.path.join(svg_folder, "riff_{}_{}_{}.svg".format(riff_id, key, octave))))
+                filelist.append(("{}{}".format(key, clef_suffix(clef)),
+                                 os.path.join(svg_folder, "riff_{}_{}.svg".format(riff_id, key))))
+        filelists[riff_id] = filelist
+
+    # Unchanged svg's were not rendered again: their metadata is taken from the render cache
+    artifacts = artifacts or {}
+    artifact_names = [artifact_name for filelist in filelists.values() for _, artifact_name in filelist
+                      if artifact_name in artifacts or os.path.exists(os.path.join(RENDER_PATH, artifact_name))]
+    file_names = [os.path.join(RENDER_PATH, artifact_name) for artifact_name in artifact_names]
+    contents = [artifacts.get(artifact_name) for artifact_name in artifact_names]
+    extracted = {metadata.file_name: metadata
+                 for metadata in extract_batch(file_names, max_workers=RENDER_WORKERS, contents=contents)}
+
+    failed_riff_ids = []
+    riffs_image_info = {}
+    for riff_id, filelist in filelists.items():
         riff_metadata = []
-        for file_suffix, file_name in filelist:
-            if os.path.exists(file_name):
-                # print("File {} => {}".format(file_suffix, file_name))
-                with open(file_name, 'r') as svg_file:
-                    svg_data = xmltodict.parse(svg_file.read())
-
-                width = round(float(svg_data["svg"]["@width"][:-2])*3.779527559)
-                height = round(float(svg_data["svg"]["@height"][:-2])*3.779527559)
-                # translate(0.0000r, 5.0450)
-                try:
-                    staff_center_x = float(svg_data["svg"]["line"][2]["@transform"][:-1].split(",")[1][1:])
-                except:
-                    logger.error("staff_center not found", file=file_name)
-                    sys.exit()
-
-                view_box = svg_data["svg"]["@viewBox"].split(" ")
-                corrected_staff_center_x = staff_center_x + abs(float(view_box[1]))
-                metadata_staff_center = round(corrected_staff_center_x*6.64)
-
-                logger.info("dimensions in .svg", corrected_staff_center=corrected_staff_center_x, width=width,
-                            height=height, metadata_staff_center=metadata_staff_center, id=riff_id,
-                            staff_center=staff_center_x, suffix=file_suffix,
-                            view_box=view_box)
-
-                riff_metadata.append({"key_octave": file_suffix, "width": width, "height": height,
-                                      "staff_center": metadata_staff_center})
+        errors = 0
+        for file_suffix, artifact_name in filelist:
+            file_name = os.path.join(RENDER_PATH, artifact_name)
+            if file_name in extracted:
+                metadata = extracted[file_name]
+                if metadata.error:
+                    logger.error("Couldn't extract metadata", file=file_name, error=metadata.error, id=riff_id)
+                    errors += 1
+                    continue
+                image_info = to_image_info(metadata, file_suffix)
+                logger.info("dimensions in .svg", id=riff_id, suffix=file_suffix, view_box=metadata.view_box,
+                            svg_staff_center=metadata.staff_center, **image_info)
+                render_cache.set_metadata(artifact_name, image_info)
+                riff_metadata.append(image_info)
+            elif render_cache.metadata(artifact_name):
+                riff_metadata.append(render_cache.metadata(artifact_name))
             else:
-                logger.error("file not found", file=file_name)
-                sys.exit()
+                logger.error("file not found", file=file_name, id=riff_id)
+                errors += 1
 
-        if not skip_update:
-            update_riffs([riff_id], session, {riff_id: riff_metadata})
+        if errors:
+            logger.error("Skipping update of riff with incomplete metadata", id=riff_id, errors=errors)
+            failed_riff_ids.append(riff_id)
         else:
-            print("Skipping update")
+            riffs_image_info[riff_id] = riff_metadata
+    return riffs_image_info, failed_riff_ids
 
 
-if __name__ == '__main__':
+def retrieve_metadata(riff_ids, session, skip_update=False, artifacts=None):
+    """Extract and store the image_info of the riffs, see extract_image_info(). Returns the riff ids that failed."""
+    riffs_image_info, failed_riff_ids = extract_image_info(riff_ids, artifacts=artifacts)
+    if not skip_update:
+        failed_riff_ids += update_riffs(list(riffs_image_info), session, riffs_image_info)
+    else:
+        print("Skipping update")
+    return failed_riff_ids
+
 
-    pid = str(os.getpid())
-    pidfile = "/tmp/render_new_riffs.pid"
+if __name__ == '__main__':
 
     session = requests.Session()
     data = {"email": API_USER, "password": API_PASS}
     url = "https://api.improviser.education/login"
     response = session.post(url, data=data)
 
-    if os.path.isfile(pidfile):
-        print("%s already exists, exiting" % pidfile)
-        answer = input("Delete and continue? y/n :")
-        if answer.lower() == 'y':
-            os.system("rm -f {pidfile}".format(pidfile=pidfile))
-        else:
-            sys.exit()
-
-    open(pidfile, 'w').write(pid)
-
-    response = session.get(ENDPOINT_RIFFS + '/unrendered')
-    if response.status_code != 200:
-        print("Unable to query riffs")
-        os.unlink(pidfile)
-        sys.exit()
-
-    riffs = response.json()
-    print(riffs)
-
-    rendered_riffs = []
-    for riff in riffs:
-        if not riff["render_valid"]:
-            print("Rendering {}".format(riff["name"]))
-            render(riff)
-            rendered_riffs = []
-            rendered_riffs.append(riff["id"])
-            if not LOCAL_RUN:
-                clean_garbage()
-                sync()
-                retrieve_metadata(rendered_riffs, session)
-                clean_png()
-
-    os.unlink(pidfile)
-
+    # Workers lease jobs from the render queue, so any number of them can run at the same time (on separate nodes or
+    # with their own RENDER_PATH). The worker stops when the queue is empty.
+    heartbeat = Heartbeat(session)
+    heartbeat.start()
+    results = RenderResults(session, heartbeat)
+    try:
+        jobs = lease_jobs(session)
+        while jobs:
+            # the leases of the jobs that wait for their turn, or for their results to be stored, are kept alive too
+            heartbeat.hold(job["id"] for job in jobs)
+            for job in jobs:
+                results.add(job, process_riff(job["riff"]))
+            jobs = lease_jobs(session)
+        results.flush()
+    finally:
+        heartbeat.stop()
@@ -9,7 +9,7 @@ from contextlib import closing
 from sqlalchemy import create_engine
 from sqlalchemy.engine.url import make_url
 
-from improviser.database import (
+from database import (
     db, user_datastore, Riff, Instrument, UserPreference, Role, User, RiffExercise,
     RiffExerciseItem
 )
@@ -171,6 +171,7 @@ def riff():
         id=str(uuid.uuid4()),
         name="Major 9 chord up down",
         number_of_bars=1,
+        is_public=True,
         notes="c'8 e' g' b' d'' b' g' e'",
         chord='CM9',
         chord_info='c1:maj9',
@@ -188,6 +189,7 @@ def riff_unrendered():
         id=str(uuid.uuid4()),
         name="Major 9 chord up down unrendered",
         number_of_bars=1,
+        is_public=True,
         notes="c'8 e' g' b' d'' b' g' e'",
         chord='CM9',
         chord_info='c1:maj9',
@@ -204,6 +206,7 @@ def riff_multi_chord():
         id=str(uuid.uuid4()),
         name="Bebop riff on 2-5-1 in 2 bars",
         number_of_bars=1,
+        is_public=True,
         notes="""g''8 fis'' e'' a'' e''4 d''8 g'' \bar "|" g''2 r2""",
         chord_info='d2:m7 g:7 c1:maj7',
         multi_chord=True,
@@ -221,6 +224,7 @@ def riff_without_chord_info():
         id=str(uuid.uuid4()),
         name="Major sixth up with chord",
         number_of_bars=1,
+        is_public=True,
         notes="""c'2 a'""",
         chord="CM",
         multi_chord=False,
@@ -238,6 +242,7 @@ def riff_without_chord():
         id=str(uuid.uuid4()),
         name="Major sixth up with chord_info",
         number_of_bars=1,
+        is_public=True,
         notes="""c'2 a'""",
         chord_info="c1:maj",
         multi_chord=False,
@@ -255,6 +260,7 @@ def riff_major():
         id=str(uuid.uuid4()),
         name="Major chord up",
         number_of_bars=1,
+        is_public=True,
         notes="c'8 e' g'",
         chord='C',
         chord_info="",
@@ -0,0 +1,21 @@
+from chord_transpositions import fill_chord_transpositions, load_chord_transpositions, riff_chord_info
+from database import db, RiffChordTransposition
+from transpose import PITCH_INTERVALS
+
+
+def test_fill_chord_transpositions(client, riff):
+    fill_chord_transpositions(riff)
+    db.session.commit()
+    # filling again replaces the rows
+    fill_chord_transpositions(riff)
+    db.session.commit()
+
+    assert RiffChordTransposition.query.count() == len(PITCH_INTERVALS)
+    transpositions = load_chord_transpositions([(riff.id, "d"), (riff.id, "bes")])
+    assert transpositions == {(str(riff.id), "d"): "d1:maj9", (str(riff.id), "bes"): "bes1:maj9"}
+
+
+def test_riff_chord_info_without_transpositions(client, riff_major):
+    # riffs that aren't filled yet are transposed on the fly
+    assert load_chord_transpositions([(riff_major.id, "d")]) == {}
+    assert riff_chord_info(riff_major, "d", {}) == "d1"
@@ -0,0 +1,62 @@
+from fractions import Fraction
+
+import pytest
+from chords import (
+    Chord,
+    ChordError,
+    chord_symbol,
+    chords_before_bar,
+    number_of_bars,
+    parse_chord_info,
+    parse_chord_name,
+    serialize,
+)
+
+
+def test_parse_chord_info():
+    chords = parse_chord_info("d2:m7 g:7 c1:maj7")
+    assert chords == (Chord("d", 2, "2", "m7"), Chord("g", 7, None, "7"), Chord("c", 0, "1", "maj7"))
+    assert serialize(chords) == "d2:m7 g:7 c1:maj7"
+
+
+@pytest.mark.parametrize(
+    "chord_info", ["c1", "cis1:m7", "ees2:maj7 bes2:7.9-", "as1:dim7", "fisis4:sus4", "g2.:m e4", "b1:m7.5- e1:7/gis"]
+)
+def test_serialize_round_trips(chord_info):
+    assert serialize(parse_chord_info(chord_info)) == chord_info
+
+
+def test_number_of_bars():
+    # durations are inherited from the previous chord, lilypond starts with quarter notes
+    assert number_of_bars(parse_chord_info("d2:m7 g:7 c1:maj7")) == 2
+    assert number_of_bars(parse_chord_info("c d e f")) == 1
+    assert number_of_bars(parse_chord_info("c2. g4 c2")) == Fraction(3, 2)
+
+
+def test_chords_before_bar():
+    chords = parse_chord_info("c1 d2:m g2:7 c1:maj7")
+    assert serialize(chords_before_bar(chords, 1)) == ""
+    assert serialize(chords_before_bar(chords, 2)) == "c1"
+    assert serialize(chords_before_bar(chords, 3)) == "c1 d2:m g2:7"
+    assert serialize(chords_before_bar(chords, 10)) == "c1 d2:m g2:7 c1:maj7"
+
+
+@pytest.mark.parametrize("chord_info", ["h1", "c3", "C1:m7", "c1 :m7", "cis1:M7"])
+def test_parse_chord_info_invalid(chord_info):
+    with pytest.raises(ChordError):
+        parse_chord_info(chord_info)
+
+
+def test_parse_chord_name():
+    assert parse_chord_name("C") == Chord("c", 0, "1", None)
+    assert parse_chord_name("C#7") == Chord("cis", 1, "1", "7")
+    assert parse_chord_name("Bbm7") == Chord("bes", 10, "1", "m7")
+    assert parse_chord_name("CM7") == Chord("c", 0, "1", "maj7")
+    assert parse_chord_name("Ebmaj7") == Chord("ees", 3, "1", "maj7")
+    with pytest.raises(ChordError):
+        parse_chord_name("c7")
+
+
+def test_chord_symbol():
+    assert [chord_symbol(chord) for chord in parse_chord_info("d2:m7 g:7 c1:maj7")] == ["Dm7", "G7", "Cmaj7"]
+    assert [chord_symbol(chord) for chord in parse_chord_info("bes1:7 fis ees:m")] == ["Bb7", "F#", "Ebm"]
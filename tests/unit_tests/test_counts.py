@@ -0,0 +1,51 @@
+import uuid
+
+from counts import CountCache, count_cache, count_query, unfiltered_table
+from database import db, Riff, RiffTag
+from full_text_search import search_results
+
+
+def test_count_cache_invalidation():
+    cache = CountCache(ttl=60)
+    generations = cache.generations(["riffs"])
+    cache.set("key", ["riffs"], 10, generations)
+    assert cache.get("key", ["riffs"]) == 10
+
+    cache.invalidate(["riff_tags"])
+    assert cache.get("key", ["riffs"]) == 10
+    cache.invalidate(["riffs"])
+    assert cache.get("key", ["riffs"]) is None
+
+    # a count that raced with a write isn't stored
+    cache.set("key", ["riffs"], 10, generations)
+    assert cache.get("key", ["riffs"]) is None
+    assert cache.stats()["hits"] == 2
+
+
+def test_count_cache_ttl():
+    cache = CountCache(ttl=0)
+    cache.set("key", ["riffs"], 10, cache.generations(["riffs"]))
+    assert cache.get("key", ["riffs"]) is None
+
+
+def test_count_query_is_invalidated_on_write(client, riff):
+    query = Riff.query.filter(Riff.render_valid.is_(True))
+    assert count_query(query) == 1
+    hits = count_cache.stats()["hits"]
+    assert count_query(query) == 1
+    assert count_cache.stats()["hits"] == hits + 1
+
+    db.session.add(Riff(id=str(uuid.uuid4()), name="Minor chord up", number_of_bars=1, notes="c'8 ees' g'",
+                        render_valid=True))
+    db.session.commit()
+    assert count_query(query) == 2
+    assert count_query(query, exact=True) == 2
+
+
+def test_only_unfiltered_table_queries_are_estimated(client):
+    assert unfiltered_table(Riff.query) == "riffs"
+    assert unfiltered_table(Riff.query.filter(Riff.render_valid.is_(True))) is None
+    assert unfiltered_table(Riff.query.join(RiffTag)) is None
+    # a search over one type of rows has no WHERE clause of its own, but isn't a count of the riffs table
+    results = search_results("bebop", str(uuid.uuid4()), is_admin=True, types=("riff",))
+    assert unfiltered_table(db.session.query(results)) is None
@@ -1,5 +1,6 @@
 from unittest import mock
 
+from database import db, RiffExerciseItem
 from tests.unit_tests.conftest import QUICK_TOKEN
 
 
@@ -26,9 +27,16 @@ def test_exercises_endpoint_with_auth(client, teacher_logged_in, exercise_1, exe
                 response = client.get('/v1/exercises', headers=headers, follow_redirects=True)
                 assert response.status_code == 200
                 assert len(response.json) == 2
+                owner = {"id": str(teacher_logged_in.id), "username": teacher_logged_in.username}
+                assert [item["user"] for item in response.json] == [owner, owner]
+
+                response = client.get('/v1/exercises?include=tags', headers=headers, follow_redirects=True)
+                assert response.status_code == 200
+                assert "tags" in response.json[0]
+                assert not {"user", "gravatar_image", "instruments"} & set(response.json[0])
 
 
-def test_exercise_detail_endpoint_with_auth(client, teacher_logged_in, exercise_1):
+def test_exercise_detail_endpoint_with_auth(client, teacher_logged_in, riff, exercise_1):
     headers = {"Quick-Authentication-Token": f"{teacher_logged_in.id}:{QUICK_TOKEN}"}
     headers["Content-Type"] = "application/json"
 
@@ -37,6 +45,56 @@ def test_exercise_detail_endpoint_with_auth(client, teacher_logged_in, exercise_
         with mock.patch('flask_principal.Permission.can', return_value=True):
             response = client.get(f'/v1/exercises/{exercise_1.id}', headers=headers, follow_redirects=True)
             assert response.status_code == 200
+            assert "image_info" in response.json["riffs"][0]
+
+            url = f'/v1/exercises/{exercise_1.id}?fields=name,riffs.name,riffs.chord'
+            response = client.get(url, headers=headers, follow_redirects=True)
+            assert response.status_code == 200
+            assert set(response.json) == {"id", "name", "riffs"}
+            assert response.json["riffs"] == [{"id": str(riff.id), "name": riff.name, "chord": riff.chord}]
+
+            url = f'/v1/exercises/{exercise_1.id}?fields=name,riffs.image'
+            response = client.get(url, headers=headers, follow_redirects=True)
+            assert response.status_code == 200
+            assert set(response.json["riffs"][0]) == {"id", "image"}
+
+            url = f'/v1/exercises/{exercise_1.id}?fields=name,riffs.unknown'
+            response = client.get(url, headers=headers, follow_redirects=True)
+            assert response.status_code == 400
+            assert "riffs.unknown" in response.json["message"]
+
             response = client.get('/v1/exercises/1', headers=headers, follow_redirects=True)
             assert response.status_code == 404
             assert "exercise not found" in response.json["message"]
+
+
+def test_exercise_transpose_endpoint(client, teacher_logged_in, exercise_1):
+    headers = {"Quick-Authentication-Token": f"{teacher_logged_in.id}:{QUICK_TOKEN}"}
+    headers["Content-Type"] = "application/json"
+    exercise_item = RiffExerciseItem.query.filter(RiffExerciseItem.riff_exercise_id == exercise_1.id).first()
+    exercise_item.chord_info_alternate = "c1:m7 f1:7"
+    db.session.commit()
+
+    # somehow check_quick_token() loses the request in test setup
+    with mock.patch('security.check_quick_token', return_value=True):
+        with mock.patch('flask_principal.Permission.can', return_value=True):
+            user = mock.MagicMock()
+            user.id = teacher_logged_in.id
+            with mock.patch('flask_login.utils._get_user', return_value=user):
+                response = client.post(f'/v1/exercises/{exercise_1.id}/transpose', json={"root_key": "d"},
+                                       headers=headers, follow_redirects=True)
+                assert response.status_code == 200
+                assert response.json["root_key"] == "d"
+                assert response.json["updated_items"] == 1
+
+                response = client.post(f'/v1/exercises/{exercise_1.id}/transpose', json={"interval": -2},
+                                       headers=headers, follow_redirects=True)
+                assert response.json["root_key"] == "c"
+                response = client.post(f'/v1/exercises/{exercise_1.id}/transpose', json={},
+                                       headers=headers, follow_redirects=True)
+                assert response.status_code == 400
+
+    exercise_item = RiffExerciseItem.query.filter(RiffExerciseItem.riff_exercise_id == exercise_1.id).first()
+    assert exercise_item.pitch == "c"
+    assert exercise_item.chord_info == "c1:maj9"
+    assert exercise_item.chord_info_alternate == "c1:m7 f1:7"
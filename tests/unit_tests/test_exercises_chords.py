@@ -1,5 +1,5 @@
 import pytest
-from apis.v1.exercises import transpose_chord_info
+from transpose import transpose_chord_info
 
 
 def test_transpose_chord_info_lilypond_progression():
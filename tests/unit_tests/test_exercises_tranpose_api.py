@@ -1,40 +1,43 @@
-from database import RiffExerciseItem, RiffExercise
+from database import db, RiffExerciseItem, RiffExercise
 
 
 def test_transpose_without_riff(client):
-    payload = {"pitch": "d",
-               "chord_info": "c1:m7 c1:9 c1:maj7"}
-    response = client.post('/v1/exercises/transpose-riff', json=payload, follow_redirects=True)
+    payload = {"pitch": "d", "chord_info": "c1:m7 c1:9 c1:maj7"}
+    response = client.post("/v1/exercises/transpose-riff", json=payload, follow_redirects=True)
 
     assert response.json["chord_info"] == "d1:m7 d1:9 d1:maj7"
 
 
 def test_transpose_with_riff(client, riff):
-    payload = {"riff_id": riff.id,
-               "pitch": "d",
-               "chord_info": "c1:m7 c1:9 c1:maj7",  # Will be overruled with: `c1:maj9`
-               }
-    response = client.post('/v1/exercises/transpose-riff', json=payload, follow_redirects=True)
+    payload = {
+        "riff_id": riff.id,
+        "pitch": "d",
+        "chord_info": "c1:m7 c1:9 c1:maj7",  # Will be overruled with: `c1:maj9`
+    }
+    response = client.post("/v1/exercises/transpose-riff", json=payload, follow_redirects=True)
 
     assert response.json["chord_info"] == "d1:maj9"
 
 
 def test_transpose_with_riff_major(client, riff_major):
-    payload = {"riff_id": riff_major.id,
-               "pitch": "d",
-               "chord_info": "C",  # Will be overruled with: `c1:maj9`
-               }
-    response = client.post('/v1/exercises/transpose-riff', json=payload, follow_redirects=True)
+    payload = {
+        "riff_id": riff_major.id,
+        "pitch": "d",
+        "chord_info": "C",  # Will be overruled with: `c1:maj9`
+    }
+    response = client.post("/v1/exercises/transpose-riff", json=payload, follow_redirects=True)
 
     assert response.json["chord_info"] == "d1"
 
 
 def test_transpose_without_chord_info(client, riff):
-    payload = {"riff_id": riff.id,
-               "pitch": "d",
-               "chord_info_alternate": "d1:m7 d1:9 fis1:maj7",
-               "chord_info_backing_track": "d1:m7 d1:9 fis1:maj7"}
-    response = client.post('/v1/exercises/transpose-riff', json=payload, follow_redirects=True)
+    payload = {
+        "riff_id": riff.id,
+        "pitch": "d",
+        "chord_info_alternate": "d1:m7 d1:9 fis1:maj7",
+        "chord_info_backing_track": "d1:m7 d1:9 fis1:maj7",
+    }
+    response = client.post("/v1/exercises/transpose-riff", json=payload, follow_redirects=True)
 
     assert response.json["chord_info"] == "d1:maj9"
     # Should be passed trough as is:
@@ -43,11 +46,13 @@ def test_transpose_without_chord_info(client, riff):
 
 
 def test_transpose_without_riff_chord_info(client, riff_without_chord_info):
-    payload = {"riff_id": riff_without_chord_info.id,
-               "pitch": "d",
-               "chord_info_alternate": "d1:m7 d1:9 fis1:maj7",
-               "chord_info_backing_track": "d1:m7 d1:9 fis1:maj7"}
-    response = client.post('/v1/exercises/transpose-riff', json=payload, follow_redirects=True)
+    payload = {
+        "riff_id": riff_without_chord_info.id,
+        "pitch": "d",
+        "chord_info_alternate": "d1:m7 d1:9 fis1:maj7",
+        "chord_info_backing_track": "d1:m7 d1:9 fis1:maj7",
+    }
+    response = client.post("/v1/exercises/transpose-riff", json=payload, follow_redirects=True)
 
     assert response.json["chord_info"] == "d1:maj"
     # Should be passed trough as is:
@@ -59,10 +64,8 @@ def test_transpose_with_alternate_chord_info(client, exercise_1):
     # find an exercise_item_id in the exercise
     exercise_item = RiffExerciseItem.query.filter(RiffExerciseItem.order_number == 0).first()
 
-    payload = {"exercise_item_id": exercise_item.id,
-               "pitch": "d",
-               "chord_info_alternate": "d1:m7 d1:9 fis1:maj7"}
-    response = client.post('/v1/exercises/transpose-riff', json=payload, follow_redirects=True)
+    payload = {"exercise_item_id": exercise_item.id, "pitch": "d", "chord_info_alternate": "d1:m7 d1:9 fis1:maj7"}
+    response = client.post("/v1/exercises/transpose-riff", json=payload, follow_redirects=True)
 
     # Should be passed trough as is:
     assert response.json["chord_info_alternate"] == "d1:m7 d1:9 fis1:maj7"
@@ -72,11 +75,13 @@ def test_transpose_with_backing_track_chord_info(client, exercise_1):
     # find an exercise_item_id in the exercise
     exercise_item = RiffExerciseItem.query.filter(RiffExerciseItem.order_number == 0).first()
 
-    payload = {"exercise_item_id": exercise_item.id,
-               "pitch": "d",
-               "chord_info_alternate": "d1:m7 d1:9 fis1:maj7",
-               "chord_info_backing_track": "d1:m7 d1:9 fis1:maj7"}
-    response = client.post('/v1/exercises/transpose-riff', json=payload, follow_redirects=True)
+    payload = {
+        "exercise_item_id": exercise_item.id,
+        "pitch": "d",
+        "chord_info_alternate": "d1:m7 d1:9 fis1:maj7",
+        "chord_info_backing_track": "d1:m7 d1:9 fis1:maj7",
+    }
+    response = client.post("/v1/exercises/transpose-riff", json=payload, follow_redirects=True)
 
     # Should be passed trough as is:
     assert response.json["chord_info_alternate"] == "d1:m7 d1:9 fis1:maj7"
@@ -84,15 +89,21 @@ def test_transpose_with_backing_track_chord_info(client, exercise_1):
 
 
 def test_transpose_with_multiple_riffs(client, riff_without_chord_info):
-    payload = [{"riff_id": riff_without_chord_info.id,
-               "pitch": "d",
-               "chord_info_alternate": "d1:m7 d1:9 fis1:maj7",
-               "chord_info_backing_track": "d1:m7 d1:9 fis1:maj7"},
-               {"riff_id": riff_without_chord_info.id,
-                "pitch": "e",
-                "chord_info_alternate": "e1:m7 e1:9 gis1:maj7",
-                "chord_info_backing_track": "e1:e7 e1:9 gis1:maj7"}]
-    response = client.post('/v1/exercises/transpose-riffs', json=payload, follow_redirects=True)
+    payload = [
+        {
+            "riff_id": riff_without_chord_info.id,
+            "pitch": "d",
+            "chord_info_alternate": "d1:m7 d1:9 fis1:maj7",
+            "chord_info_backing_track": "d1:m7 d1:9 fis1:maj7",
+        },
+        {
+            "riff_id": riff_without_chord_info.id,
+            "pitch": "e",
+            "chord_info_alternate": "e1:m7 e1:9 gis1:maj7",
+            "chord_info_backing_track": "e1:e7 e1:9 gis1:maj7",
+        },
+    ]
+    response = client.post("/v1/exercises/transpose-riffs", json=payload, follow_redirects=True)
 
     assert response.json[0]["chord_info"] == "d1:maj"
     assert response.json[1]["chord_info"] == "e1:maj"
@@ -111,20 +122,57 @@ def test_transpose_with_multiple_riffs_and_exercise_info(client, exercise_1):
     exercise_item1 = RiffExerciseItem.query.filter(RiffExerciseItem.order_number == 0).first()
     exercise_item2 = RiffExerciseItem.query.filter(RiffExerciseItem.order_number == 2).first()
 
-    payload = [{"exercise_item_id": exercise_item1.id,
-               "pitch": "d",
-               "chord_info_alternate": "d1:m7 d1:9 fis1:maj7",
-               "chord_info_backing_track": "d1:m7 d1:9 fis1:maj7"},
-               {"exercise_item_id": exercise_item1.id,
-                "pitch": "g",
-                "chord_info_alternate": "d1:m7 d1:9 fis1:maj7",
-                "chord_info_backing_track": "d1:m7 d1:9 fis1:maj7"}
-               ]
-    response = client.post('/v1/exercises/transpose-riffs', json=payload, follow_redirects=True)
+    payload = [
+        {
+            "exercise_item_id": exercise_item1.id,
+            "pitch": "d",
+            "chord_info_alternate": "d1:m7 d1:9 fis1:maj7",
+            "chord_info_backing_track": "d1:m7 d1:9 fis1:maj7",
+        },
+        {
+            "exercise_item_id": exercise_item1.id,
+            "pitch": "g",
+            "chord_info_alternate": "d1:m7 d1:9 fis1:maj7",
+            "chord_info_backing_track": "d1:m7 d1:9 fis1:maj7",
+        },
+    ]
+    response = client.post("/v1/exercises/transpose-riffs", json=payload, follow_redirects=True)
 
     # Todo: Investigate if this is what we want in multi mode (we might need relative pitch change here)
     # Should be passed trough as is:
     assert response.json[0]["chord_info_alternate"] == "d1:m7 d1:9 fis1:maj7"
     assert response.json[0]["chord_info_backing_track"] == "d1:m7 d1:9 fis1:maj7"
     assert response.json[1]["chord_info_alternate"] == "d1:m7 d1:9 fis1:maj7"
-    assert response.json[1]["chord_info_backing_track"] == "d1:m7 d1:9 fis1:maj7"
\ No newline at end of file
+    assert response.json[1]["chord_info_backing_track"] == "d1:m7 d1:9 fis1:maj7"
+
+
+def test_transpose_relative_to_exercise_item(client, exercise_1, riff):
+    exercise_item = RiffExerciseItem.query.filter(RiffExerciseItem.order_number == 0).first()
+    exercise_item.chord_info_alternate = "c1:m7 f1:7"
+    exercise_item.chord_info_backing_track = "c1:m7 f1:7 bes1:maj7"
+    db.session.commit()
+
+    payload = [
+        {
+            "riff_id": riff.id,
+            "exercise_item_id": exercise_item.id,
+            "pitch": pitch,
+            "chord_info_alternate": "c1:m7 f1:7",
+            "chord_info_backing_track": "c1:m7 f1:7 bes1:maj7",
+        }
+        for pitch in ["d", "bes"]
+    ]
+    response = client.post("/v1/exercises/transpose-riffs", json=payload, follow_redirects=True)
+
+    # existing chord info of the item (in c) is transposed to the new pitch, in the order of the payload
+    assert [item["chord_info"] for item in response.json] == ["d1:maj9", "bes1:maj9"]
+    assert response.json[0]["chord_info_alternate"] == "d1:m7 g1:7"
+    assert response.json[0]["chord_info_backing_track"] == "d1:m7 g1:7 c1:maj7"
+    assert response.json[1]["chord_info_alternate"] == "bes1:m7 ees1:7"
+    assert response.json[1]["chord_info_backing_track"] == "bes1:m7 ees1:7 aes1:maj7"
+
+
+def test_transpose_unknown_riff(client):
+    payload = [{"riff_id": "c9bf9e57-1685-4c89-bafb-ff5af830be8a", "pitch": "d"}]
+    response = client.post("/v1/exercises/transpose-riffs", json=payload, follow_redirects=True)
+    assert response.status_code == 404
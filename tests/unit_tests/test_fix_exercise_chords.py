@@ -0,0 +1,34 @@
+import uuid
+
+from database import db, RiffExercise, RiffExerciseItem
+from utils import fix_exercise_chords_in_batches, partition_bounds
+
+
+def test_partition_bounds():
+    assert partition_bounds(0, 1) == (uuid.UUID(int=0), None)
+    lower, upper = partition_bounds(1, 4)
+    assert lower == uuid.UUID("40000000-0000-0000-0000-000000000000")
+    assert upper == uuid.UUID("80000000-0000-0000-0000-000000000000")
+    assert partition_bounds(3, 4)[1] is None
+
+
+def test_fix_exercise_chords_in_batches(client, exercise_1, exercise_2):
+    # the batches expunge the session: keep the id, not the instance
+    exercise_id = exercise_1.id
+    item = RiffExerciseItem.query.filter(RiffExerciseItem.riff_exercise_id == exercise_id).first()
+    item.pitch = "d"
+    item.number_of_bars = 2
+    db.session.commit()
+
+    stats = fix_exercise_chords_in_batches(RiffExercise.query, batch_size=1, dry_run=True)
+    assert stats == {"exercises": 2, "items": 1, "changed_items": 1}
+    item = RiffExerciseItem.query.filter(RiffExerciseItem.riff_exercise_id == exercise_id).first()
+    assert item.chord_info == "c1:maj9"
+
+    stats = fix_exercise_chords_in_batches(RiffExercise.query, batch_size=1)
+    assert stats["changed_items"] == 1
+    item = RiffExerciseItem.query.filter(RiffExerciseItem.riff_exercise_id == exercise_id).first()
+    assert item.chord_info == "d1:maj9"
+    assert item.number_of_bars == 1
+
+    assert fix_exercise_chords_in_batches(RiffExercise.query)["changed_items"] == 0
@@ -0,0 +1,57 @@
+import uuid
+from unittest import mock
+
+from database import Riff
+from quick_search import escape_like, search_condition, uuid_bounds
+from sqlalchemy.dialects import postgresql
+
+from tests.unit_tests.conftest import QUICK_TOKEN
+
+
+def test_uuid_bounds():
+    id = "c9bf9e57-1685-4c89-bafb-ff5af830be8a"
+    assert uuid_bounds(id) == (uuid.UUID(id), uuid.UUID(id))
+    assert uuid_bounds("c9bf9e57") == (
+        uuid.UUID("c9bf9e57-0000-0000-0000-000000000000"), uuid.UUID("c9bf9e57-ffff-ffff-ffff-ffffffffffff")
+    )
+    assert uuid_bounds("c9bf9e57-16") is not None
+    assert uuid_bounds("c9bf9e5") is None
+    assert uuid_bounds("bebop") is None
+    assert uuid_bounds(id + "00") is None
+
+
+def sql(condition):
+    return str(condition.compile(dialect=postgresql.dialect()))
+
+
+def test_search_condition():
+    assert escape_like("50%_off") == "50/%/_off"
+    condition = sql(search_condition([Riff.name, Riff.id, Riff.number_of_bars], "bebop"))
+    assert "riffs.name ILIKE" in condition
+    assert "CAST" not in condition
+    assert "riffs.id" not in condition
+    assert "number_of_bars" not in condition
+    assert "riffs.number_of_bars =" in sql(search_condition([Riff.name, Riff.number_of_bars], "2"))
+    assert sql(search_condition([Riff.name, Riff.id], "c9bf9e57")).startswith("riffs.id BETWEEN")
+    assert sql(search_condition([Riff.id], "bebop")) == "false"
+
+
+def test_riffs_endpoint_with_quick_search(client, student_logged_in, riff, riff_unrendered, riff_multi_chord):
+    headers = {"Quick-Authentication-Token": f"{student_logged_in.id}:{QUICK_TOKEN}"}
+    headers["Content-Type"] = "application/json"
+
+    # somehow check_quick_token() loses the request in test setup
+    with mock.patch('security.check_quick_token', return_value=True):
+        with mock.patch('flask_principal.Permission.can', return_value=True):
+            response = client.get('/v1/riffs/?filter={"q":"BEBOP"}', headers=headers, follow_redirects=True)
+            assert response.status_code == 200
+            assert len(response.json) == 1
+
+            response = client.get(f'/v1/riffs/?filter={{"q":"{str(riff.id)[:8]}"}}', headers=headers,
+                                  follow_redirects=True)
+            assert response.status_code == 200
+            assert [item["id"] for item in response.json] == [str(riff.id)]
+
+            response = client.get(f'/v1/riffs/?filter={{"q":"{riff_multi_chord.id}"}}', headers=headers,
+                                  follow_redirects=True)
+            assert [item["id"] for item in response.json] == [str(riff_multi_chord.id)]
@@ -0,0 +1,86 @@
+import datetime
+
+from database import db, RenderJob
+from render_queue import (
+    complete_render_job,
+    enqueue_render_job,
+    heartbeat_render_job,
+    lease_render_jobs,
+    LEASE_TIMEOUT,
+    MAX_ATTEMPTS,
+)
+
+
+def test_enqueue_render_job_only_once(client, riff_unrendered):
+    job = enqueue_render_job(riff_unrendered.id)
+    db.session.commit()
+    same_job = enqueue_render_job(riff_unrendered.id, priority=10)
+    db.session.commit()
+
+    assert same_job.id == job.id
+    assert same_job.priority == 10
+    assert RenderJob.query.count() == 1
+
+
+def test_lease_render_jobs_by_priority(client, riff, riff_unrendered):
+    low = enqueue_render_job(riff.id)
+    high = enqueue_render_job(riff_unrendered.id, priority=10)
+    db.session.commit()
+
+    jobs = lease_render_jobs("worker-1")
+    assert [job.id for job in jobs] == [high.id]
+    jobs = lease_render_jobs("worker-2", limit=10)
+    assert [job.id for job in jobs] == [low.id]
+    assert lease_render_jobs("worker-3") == []
+
+
+def test_heartbeat_and_complete_render_job(client, riff_unrendered):
+    enqueue_render_job(riff_unrendered.id)
+    db.session.commit()
+    job = lease_render_jobs("worker-1")[0]
+
+    assert heartbeat_render_job(job.id, "worker-1")
+    assert not heartbeat_render_job(job.id, "worker-2")
+    assert not complete_render_job(job.id, "worker-2")
+    assert complete_render_job(job.id, "worker-1")
+    assert job.status == "done"
+
+
+def test_recover_abandoned_render_job(client, riff_unrendered):
+    enqueue_render_job(riff_unrendered.id)
+    db.session.commit()
+    job = lease_render_jobs("worker-1")[0]
+    assert lease_render_jobs("worker-2") == []
+
+    job.heartbeat_at = datetime.datetime.utcnow() - LEASE_TIMEOUT - datetime.timedelta(seconds=1)
+    db.session.commit()
+    recovered = lease_render_jobs("worker-2")
+    assert [item.id for item in recovered] == [job.id]
+    assert recovered[0].attempts == 2
+    assert not heartbeat_render_job(job.id, "worker-1")
+
+
+def test_failed_render_job_is_retried(client, riff_unrendered):
+    enqueue_render_job(riff_unrendered.id)
+    db.session.commit()
+    for attempt in range(MAX_ATTEMPTS):
+        job = lease_render_jobs("worker-1")[0]
+        complete_render_job(job.id, "worker-1", success=False, error="LilyPond crashed")
+
+    assert job.status == "failed"
+    assert lease_render_jobs("worker-1") == []
+
+
+def test_fail_abandoned_render_job_without_attempts_left(client, riff_unrendered):
+    enqueue_render_job(riff_unrendered.id)
+    db.session.commit()
+    job = lease_render_jobs("worker-1")[0]
+    job.attempts = MAX_ATTEMPTS
+    job.heartbeat_at = datetime.datetime.utcnow() - LEASE_TIMEOUT - datetime.timedelta(seconds=1)
+    db.session.commit()
+
+    assert lease_render_jobs("worker-2") == []
+    assert job.status == "failed"
+    assert "timed out" in job.error
+    # the riff can be queued again
+    assert enqueue_render_job(riff_unrendered.id).id != job.id
@@ -0,0 +1,53 @@
+import os
+from unittest import mock
+
+os.environ.setdefault("LOCAL_RUN", "1")
+
+import render_new_riffs  # noqa: E402
+
+
+def job(number):
+    return {"id": f"job-{number}", "riff": {"id": f"riff-{number}", "name": f"Riff {number}"}}
+
+
+def test_render_results_are_stored_in_batches():
+    session = mock.MagicMock()
+    session.put.return_value = mock.MagicMock(status_code=204)
+    heartbeat = mock.MagicMock()
+    results = render_new_riffs.RenderResults(session, heartbeat)
+
+    with mock.patch.object(render_new_riffs, "LOCAL_RUN", False), mock.patch.object(
+        render_new_riffs, "UPDATE_BATCH_SIZE", 3
+    ):
+        for number in range(4):
+            results.add(job(number), [{"key_octave": "c", "width": 100}])
+        results.add(job(4), None)
+        results.flush()
+
+    updates = [call for call in session.put.call_args_list if call.args[0].endswith("/v1/riffs/rendered")]
+    assert [[item["id"] for item in call.kwargs["json"]] for call in updates] == [
+        ["riff-0", "riff-1", "riff-2"],
+        ["riff-3"],
+    ]
+    assert updates[0].kwargs["json"][0]["image_info"] == [{"key_octave": "c", "width": 100}]
+    completed = {call.args[0].split("/")[-2]: call.kwargs["json"]["success"] for call in session.put.call_args_list
+                 if call.args[0].endswith("/complete")}
+    assert completed == {"job-0": True, "job-1": True, "job-2": True, "job-3": True, "job-4": False}
+    assert sorted(id for call in heartbeat.release.call_args_list for id in call.args[0]) == [
+        f"job-{number}" for number in range(5)
+    ]
+
+
+def test_failed_update_fails_the_jobs():
+    session = mock.MagicMock()
+    session.put.return_value = mock.MagicMock(status_code=500)
+    results = render_new_riffs.RenderResults(session, mock.MagicMock())
+
+    with mock.patch.object(render_new_riffs, "LOCAL_RUN", False):
+        results.add(job(0), [])
+        results.add(job(1), [])
+        results.flush()
+
+    completed = [call.kwargs["json"]["success"] for call in session.put.call_args_list
+                 if call.args[0].endswith("/complete")]
+    assert completed == [False, False]
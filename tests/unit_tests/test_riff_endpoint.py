@@ -1,5 +1,9 @@
+import uuid
 from unittest import mock
 
+from database import db, RiffTag, Tag
+from sqlalchemy import event
+
 from tests.unit_tests.conftest import QUICK_TOKEN
 
 
@@ -36,6 +40,117 @@ def test_riffs_endpoint_with_auth(client, student_logged_in, riff, riff_unrender
             assert len(response.json) == 1
 
 
+def test_riffs_endpoint_with_cursor(client, student_logged_in, riff, riff_unrendered, riff_multi_chord):
+    headers = {"Quick-Authentication-Token": f"{student_logged_in.id}:{QUICK_TOKEN}"}
+    headers["Content-Type"] = "application/json"
+    url = '/v1/riffs/?range=[0,0]&sort=%5B%22name%22,%22ASC%22%5D'
+
+    # somehow check_quick_token() loses the request in test setup
+    with mock.patch('security.check_quick_token', return_value=True):
+        with mock.patch('flask_principal.Permission.can', return_value=True):
+            response = client.get(url, headers=headers, follow_redirects=True)
+            assert response.status_code == 200
+            assert response.headers["Content-Range"] == "items 0-0/2"
+            first = response.json[0]["name"]
+
+            response = client.get(f'{url}&cursor={response.headers["Next-Cursor"]}', headers=headers,
+                                  follow_redirects=True)
+            assert response.status_code == 200
+            assert len(response.json) == 1
+            assert response.json[0]["name"] > first
+
+            response = client.get(f'{url}&cursor={response.headers["Next-Cursor"]}', headers=headers,
+                                  follow_redirects=True)
+            assert response.json == []
+            assert "Next-Cursor" not in response.headers
+
+            response = client.get(f'{url}&cursor=invalid', headers=headers, follow_redirects=True)
+            assert response.status_code == 400
+
+            # datetime sort values
+            url = '/v1/riffs/?range=[0,0]&sort=%5B%22created_at%22,%22DESC%22%5D'
+            response = client.get(url, headers=headers, follow_redirects=True)
+            first = response.json[0]["id"]
+            response = client.get(f'{url}&cursor={response.headers["Next-Cursor"]}', headers=headers,
+                                  follow_redirects=True)
+            assert response.status_code == 200
+            assert [item["id"] for item in response.json] != [first]
+            assert len(response.json) == 1
+
+            response = client.get('/v1/riffs/?sort=%5B%22unknown%22,%22ASC%22%5D', headers=headers,
+                                  follow_redirects=True)
+            assert response.status_code == 400
+
+
+def test_riffs_endpoint_with_include(client, student_logged_in, riff, riff_multi_chord):
+    headers = {"Quick-Authentication-Token": f"{student_logged_in.id}:{QUICK_TOKEN}"}
+    headers["Content-Type"] = "application/json"
+    tags = [Tag(id=str(uuid.uuid4()), name=name) for name in ("Bebop", "Blues")]
+    db.session.add_all(tags)
+    for riff_with_tags in (riff, riff_multi_chord):
+        for tag in tags:
+            db.session.add(RiffTag(id=str(uuid.uuid4()), riff_id=riff_with_tags.id, tag_id=tag.id))
+    db.session.commit()
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    # somehow check_quick_token() loses the request in test setup
+    with mock.patch('security.check_quick_token', return_value=True):
+        with mock.patch('flask_principal.Permission.can', return_value=True):
+            # load the user and its roles before counting
+            client.get('/v1/riffs/?range=[0,0]', headers=headers, follow_redirects=True)
+            event.listen(db.engine, "before_cursor_execute", count_statement)
+            try:
+                response = client.get('/v1/riffs/?range=[0,0]&exact_count=true', headers=headers,
+                                      follow_redirects=True)
+                one_riff = len(statements)
+                statements.clear()
+                response = client.get('/v1/riffs/?range=[0,1]&exact_count=true', headers=headers,
+                                      follow_redirects=True)
+                # the tags are loaded for the whole page at once
+                assert len(statements) == one_riff
+            finally:
+                event.remove(db.engine, "before_cursor_execute", count_statement)
+            assert response.status_code == 200
+            assert [sorted(tag["name"] for tag in item["tags"]) for item in response.json] == [["Bebop", "Blues"]] * 2
+            assert "user" not in response.json[0]
+
+            response = client.get('/v1/riffs/?include=user', headers=headers, follow_redirects=True)
+            assert response.status_code == 200
+            assert "tags" not in response.json[0]
+            assert response.json[0]["user"] is None
+
+            response = client.get('/v1/riffs/?include=instruments', headers=headers, follow_redirects=True)
+            assert response.status_code == 400
+
+
+def test_riffs_endpoint_with_fields(client, student_logged_in, riff, riff_multi_chord):
+    headers = {"Quick-Authentication-Token": f"{student_logged_in.id}:{QUICK_TOKEN}"}
+    headers["Content-Type"] = "application/json"
+
+    # somehow check_quick_token() loses the request in test setup
+    with mock.patch('security.check_quick_token', return_value=True):
+        with mock.patch('flask_principal.Permission.can', return_value=True):
+            response = client.get('/v1/riffs', headers=headers, follow_redirects=True)
+            assert response.status_code == 200
+            assert "image_info" not in response.json[0]
+            assert "tags" in response.json[0]
+
+            url = '/v1/riffs/?fields=name,chord,image_info&sort=%5B%22created_at%22,%22DESC%22%5D&range=[0,0]'
+            response = client.get(url, headers=headers, follow_redirects=True)
+            assert response.status_code == 200
+            assert set(response.json[0]) == {"id", "name", "chord", "image_info"}
+            # the sort column is loaded for the cursor, even when it's not in the fields
+            response = client.get(f'{url}&cursor={response.headers["Next-Cursor"]}', headers=headers,
+                                  follow_redirects=True)
+            assert len(response.json) == 1
+
+            response = client.get('/v1/riffs/?fields=name,password', headers=headers, follow_redirects=True)
+            assert response.status_code == 400
+
+
 def test_riff_detail_endpoint_with_auth(client, student_logged_in, riff):
     headers = {"Quick-Authentication-Token": f"{student_logged_in.id}:{QUICK_TOKEN}"}
     headers["Content-Type"] = "application/json"
@@ -48,3 +163,31 @@ def test_riff_detail_endpoint_with_auth(client, student_logged_in, riff):
             response = client.get('/v1/riffs/1', headers=headers, follow_redirects=True)
             assert response.status_code == 404
             assert "riff not found" in response.json["message"]
+
+
+def test_riffs_rendered_bulk_endpoint(client, student_logged_in, riff, riff_unrendered):
+    headers = {"Quick-Authentication-Token": f"{student_logged_in.id}:{QUICK_TOKEN}"}
+    headers["Content-Type"] = "application/json"
+    image_info = [{"key_octave": "c", "width": 100, "height": 30, "staff_center": 20}]
+    payload = [
+        {"id": str(riff.id), "render_valid": True, "image_info": image_info},
+        {"id": str(riff_unrendered.id), "render_valid": True, "image_info": image_info},
+    ]
+
+    with mock.patch('security.check_quick_token', return_value=True):
+        with mock.patch('flask_principal.Permission.can', return_value=True):
+            response = client.put('/v1/riffs/rendered', json=payload, headers=headers, follow_redirects=True)
+            assert response.status_code == 204
+            # the endpoint updates the rows without the instances: reload it
+            db.session.refresh(riff_unrendered)
+            assert riff_unrendered.render_valid
+            assert riff_unrendered.image_info == image_info
+            assert riff_unrendered.render_date
+
+            response = client.put('/v1/riffs/rendered', json=payload + [{"id": str(uuid.uuid4())}],
+                                  headers=headers, follow_redirects=True)
+            assert response.status_code == 404
+
+            response = client.put('/v1/riffs/rendered', json={"id": str(riff.id)}, headers=headers,
+                                  follow_redirects=True)
+            assert response.status_code == 400
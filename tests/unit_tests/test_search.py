@@ -0,0 +1,67 @@
+import uuid
+from unittest import mock
+
+from database import db, RiffTag, Tag
+from full_text_search import chord_symbols, update_search_vectors
+
+from tests.unit_tests.conftest import QUICK_TOKEN
+
+
+def test_chord_symbols():
+    assert chord_symbols(["d2:m7 g:7 c1:maj7", "d2:m7 x1"]) == ["Dm7", "G7", "Cmaj7"]
+    assert chord_symbols([None, ""]) == []
+
+
+def test_search_endpoint(client, student_logged_in, riff, riff_multi_chord, riff_unrendered, exercise_1):
+    headers = {"Quick-Authentication-Token": f"{student_logged_in.id}:{QUICK_TOKEN}"}
+    headers["Content-Type"] = "application/json"
+    riff.is_public = True
+    riff_multi_chord.is_public = True
+    riff_unrendered.is_public = True
+    update_search_vectors(db.session, [riff.id, riff_multi_chord.id, riff_unrendered.id], [exercise_1.id])
+    db.session.commit()
+    user = mock.MagicMock(id=student_logged_in.id, roles=[])
+
+    # somehow check_quick_token() loses the request in test setup
+    with mock.patch('security.check_quick_token', return_value=True):
+        with mock.patch('flask_principal.Permission.can', return_value=True):
+            with mock.patch('flask_login.utils._get_user', return_value=user):
+                response = client.get('/v1/search/?q=bebop', headers=headers, follow_redirects=True)
+                assert response.status_code == 200
+                assert [(item["type"], item["id"]) for item in response.json] == [("riff", str(riff_multi_chord.id))]
+
+                # chord symbols of the riff chord info
+                response = client.get('/v1/search/?q=Dm7', headers=headers, follow_redirects=True)
+                assert [item["id"] for item in response.json] == [str(riff_multi_chord.id)]
+
+                # description and chords of the exercise items
+                response = client.get('/v1/search/?q=description', headers=headers, follow_redirects=True)
+                assert [item["id"] for item in response.json] == [str(exercise_1.id)]
+                response = client.get('/v1/search/?q=Cmaj9&type=exercise', headers=headers, follow_redirects=True)
+                assert [item["id"] for item in response.json] == [str(exercise_1.id)]
+
+                # the unrendered riff isn't found, equal ranks are ordered by type: riffs first
+                url = '/v1/search/?q=Cmaj9&range=[0,0]'
+                response = client.get(url, headers=headers, follow_redirects=True)
+                assert response.headers["Content-Range"] == "items 0-0/2"
+                assert [item["id"] for item in response.json] == [str(riff.id)]
+                response = client.get(f'{url}&cursor={response.headers["Next-Cursor"]}', headers=headers,
+                                      follow_redirects=True)
+                assert [item["id"] for item in response.json] == [str(exercise_1.id)]
+                response = client.get(f'{url}&cursor={response.headers["Next-Cursor"]}', headers=headers,
+                                      follow_redirects=True)
+                assert response.json == []
+
+                # the search vector follows renames and tags
+                riff_multi_chord.name = "Two five one lick"
+                tag = Tag(id=str(uuid.uuid4()), name="Parker")
+                db.session.add(tag)
+                db.session.add(RiffTag(id=str(uuid.uuid4()), riff_id=riff_multi_chord.id, tag_id=tag.id))
+                db.session.commit()
+                response = client.get('/v1/search/?q=bebop', headers=headers, follow_redirects=True)
+                assert response.json == []
+                response = client.get('/v1/search/?q=parker lick', headers=headers, follow_redirects=True)
+                assert [item["id"] for item in response.json] == [str(riff_multi_chord.id)]
+
+                response = client.get('/v1/search/?q=%20', headers=headers, follow_redirects=True)
+                assert response.status_code == 400
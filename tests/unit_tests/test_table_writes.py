@@ -0,0 +1,23 @@
+import uuid
+
+from database import db, Tag
+from table_writes import on_table_write
+
+
+def test_table_write_notifications(client, riff):
+    written = []
+
+    @on_table_write(Tag.__tablename__)
+    def collect(tables):
+        written.append(tables)
+
+    riff.name = "Renamed riff"
+    db.session.commit()
+    assert written == []
+
+    db.session.add(Tag(id=str(uuid.uuid4()), name="Bebop"))
+    db.session.flush()
+    assert written == [{"tags"}]
+    # again at the end of the transaction
+    db.session.commit()
+    assert written == [{"tags"}, {"tags"}]
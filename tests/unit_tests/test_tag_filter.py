@@ -0,0 +1,44 @@
+import uuid
+
+from database import db, Riff, RiffTag, Tag
+from tag_filter import tag_cache, tag_condition
+
+
+def add_tags(riff, *names):
+    for name in names:
+        tag = Tag.query.filter(Tag.name == name).first()
+        if not tag:
+            tag = Tag(id=str(uuid.uuid4()), name=name)
+            db.session.add(tag)
+        db.session.add(RiffTag(id=str(uuid.uuid4()), riff_id=riff.id, tag_id=tag.id))
+    db.session.commit()
+
+
+def tagged_riffs(names, match_all=False):
+    return sorted(riff.name for riff in Riff.query.filter(tag_condition(Riff, names, match_all)))
+
+
+def test_tag_condition(client, riff, riff_multi_chord, riff_major):
+    add_tags(riff, "Bebop", "Bebop scales", "Blues")
+    add_tags(riff_multi_chord, "Blues")
+    add_tags(riff_major, "Bebop scales")
+
+    assert tagged_riffs("bebop") == sorted([riff.name, riff_major.name])
+    assert tagged_riffs(["bebop", "blues"]) == sorted([riff.name, riff_multi_chord.name, riff_major.name])
+    assert tagged_riffs(["bebop", "blues"], match_all=True) == [riff.name]
+    assert tagged_riffs(["bebop", "modal"], match_all=True) == []
+    assert tagged_riffs("modal") == []
+    # a riff with two matching tags is counted once
+    assert Riff.query.filter(tag_condition(Riff, "bebop")).count() == 2
+
+
+def test_tag_cache_is_invalidated_on_tag_writes(client, riff):
+    add_tags(riff, "Bebop")
+    assert tagged_riffs("bebop") == [riff.name]
+    misses = tag_cache.stats()["misses"]
+    assert tagged_riffs("bebop") == [riff.name]
+    assert tag_cache.stats()["misses"] == misses
+
+    add_tags(riff, "Modal")
+    assert tagged_riffs("modal") == [riff.name]
+    assert tag_cache.stats()["misses"] == misses + 1
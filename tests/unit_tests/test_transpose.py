@@ -0,0 +1,61 @@
+import pytest
+from chords import ChordError
+from transpose import (
+    LETTERS,
+    PITCH_INTERVALS,
+    TRANSPOSITIONS,
+    TranspositionCache,
+    transpose_chord_info,
+    transpose_root,
+)
+
+
+def test_transpositions_table_is_complete():
+    assert len(TRANSPOSITIONS) == len(LETTERS) * 3 * len(PITCH_INTERVALS)
+
+
+def test_transpose_root_spelling():
+    assert transpose_root("c", "c") == "c"
+    assert transpose_root("c", "ees") == "eb"
+    assert transpose_root("e", "gis") == "b#"
+    assert transpose_root("bis", "gis") == "f###"
+    assert transpose_root("des", "aes") == "bbb"
+    assert transpose_root("ces", "ees") == "ebb"
+
+
+def test_transpose_root_invalid():
+    with pytest.raises(ChordError):
+        transpose_root("h", "c")
+    with pytest.raises(ChordError):
+        transpose_root("c", "dis")
+    # double accidentals can't be transposed to every pitch
+    with pytest.raises(ChordError):
+        transpose_root("cisis", "d")
+
+
+def test_transpose_chord_info_keeps_durations():
+    assert transpose_chord_info("d2.:m7 g4:7 c1:maj7", "d") == "e2.:m7 a4:7 d1:maj7"
+    assert transpose_chord_info("bes8 as1", "c") == "bes8 aes1"
+
+
+def test_transposition_cache():
+    cache = TranspositionCache(maxsize=2)
+    assert cache.transpose("c1:m7", "d") == "d1:m7"
+    assert cache.transpose("c1:m7", "d") == "d1:m7"
+    assert cache.transpose("C7", "d", 2) == "d1:7 d1:7"
+    assert cache.stats() == {"hits": 1, "misses": 2, "size": 2, "maxsize": 2}
+
+    # the least recently used result is evicted
+    cache.transpose("c1:m7", "d")
+    cache.transpose("g1", "d")
+    assert len(cache) == 2
+    cache.transpose("C7", "d", 2)
+    assert cache.stats()["misses"] == 4
+
+
+def test_transposition_cache_does_not_cache_errors():
+    cache = TranspositionCache()
+    for _ in range(2):
+        with pytest.raises(ChordError):
+            cache.transpose("h1", "d")
+    assert cache.stats() == {"hits": 0, "misses": 2, "size": 0, "maxsize": 4096}